@@ -0,0 +1,37 @@
+"""user appeals filter indexes
+
+Revision ID: 3e1c0f9d2b47
+Revises: a659b5b9ff07
+Create Date: 2026-10-18 11:03:54.118230
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3e1c0f9d2b47'
+down_revision = 'a659b5b9ff07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_user_appeals_status_created_at', 'user_appeals',
+                    ['status_id', 'is_hidden', 'created_at', 'id'], unique=False)
+    op.create_index('ix_user_appeals_theme_created_at', 'user_appeals',
+                    ['appeal_theme_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_user_appeals_creator_created_at', 'user_appeals',
+                    ['creator_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_user_appeals_executor_created_at', 'user_appeals',
+                    ['executor_id', 'status_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_user_appeals_deputy_created_at', 'user_appeals',
+                    ['deputy_id', 'created_at', 'id'], unique=False)
+    op.create_index(op.f('ix_appeal_themes_department_id'), 'appeal_themes', ['department_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_appeal_themes_department_id'), table_name='appeal_themes')
+    op.drop_index('ix_user_appeals_deputy_created_at', table_name='user_appeals')
+    op.drop_index('ix_user_appeals_executor_created_at', table_name='user_appeals')
+    op.drop_index('ix_user_appeals_creator_created_at', table_name='user_appeals')
+    op.drop_index('ix_user_appeals_theme_created_at', table_name='user_appeals')
+    op.drop_index('ix_user_appeals_status_created_at', table_name='user_appeals')
@@ -0,0 +1,25 @@
+"""attachment image variants
+
+Revision ID: 4f8b1d6c0a93
+Revises: 9c3e5a7f2d18
+Create Date: 2026-10-18 17:48:02.615377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '4f8b1d6c0a93'
+down_revision = '9c3e5a7f2d18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('attachments', sa.Column('thumbnail_link', sa.String(), nullable=True))
+    op.add_column('attachments', sa.Column('preview_link', sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('attachments', 'preview_link')
+    op.drop_column('attachments', 'thumbnail_link')
@@ -0,0 +1,49 @@
+"""appeal stat counters
+
+Revision ID: 5d9e27b4c813
+Revises: c4f81a6e3d02
+Create Date: 2026-10-18 15:58:42.906117
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5d9e27b4c813'
+down_revision = 'c4f81a6e3d02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('appeal_stat_counters',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('day', sa.Date(), nullable=False),
+                    sa.Column('status_id', sa.Integer(), nullable=False),
+                    sa.Column('appeal_theme_id', sa.Integer(), nullable=False),
+                    sa.Column('department_id', sa.Integer(), nullable=True),
+                    sa.Column('count', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['appeal_theme_id'], ['appeal_themes.id'], ondelete='CASCADE'),
+                    sa.ForeignKeyConstraint(['department_id'], ['departments.id'], ondelete='CASCADE'),
+                    sa.ForeignKeyConstraint(['status_id'], ['appeal_statuses.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('day', 'status_id', 'appeal_theme_id', name='uq_appeal_stat_counters_bucket')
+                    )
+    op.create_index(op.f('ix_appeal_stat_counters_id'), 'appeal_stat_counters', ['id'], unique=False)
+    op.create_index(op.f('ix_appeal_stat_counters_department_id'), 'appeal_stat_counters', ['department_id'],
+                    unique=False)
+    op.execute("""
+        INSERT INTO appeal_stat_counters (day, status_id, appeal_theme_id, department_id, count)
+        SELECT date(user_appeals.created_at), user_appeals.status_id, user_appeals.appeal_theme_id,
+               appeal_themes.department_id, count(user_appeals.id)
+        FROM user_appeals JOIN appeal_themes ON appeal_themes.id = user_appeals.appeal_theme_id
+        WHERE user_appeals.status_id IS NOT NULL AND user_appeals.created_at IS NOT NULL
+        GROUP BY date(user_appeals.created_at), user_appeals.status_id, user_appeals.appeal_theme_id,
+                 appeal_themes.department_id
+    """)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_appeal_stat_counters_department_id'), table_name='appeal_stat_counters')
+    op.drop_index(op.f('ix_appeal_stat_counters_id'), table_name='appeal_stat_counters')
+    op.drop_table('appeal_stat_counters')
@@ -0,0 +1,33 @@
+"""appeal users appeal employee unique
+
+Revision ID: 6e2c9b8d4f31
+Revises: d3a7e9c1b524
+Create Date: 2026-10-18 22:17:45.309127
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '6e2c9b8d4f31'
+down_revision = 'd3a7e9c1b524'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Duplicates left by earlier connects would block the unique index, the oldest connection is kept.
+    op.execute("""
+        DELETE FROM appeal_users duplicate
+        USING appeal_users kept
+        WHERE duplicate.appeal_id = kept.appeal_id
+          AND duplicate.employee_id = kept.employee_id
+          AND duplicate.id > kept.id
+    """)
+    op.create_unique_constraint('uq_appeal_users_appeal_employee', 'appeal_users', ['appeal_id', 'employee_id'])
+    # The unique index leads with appeal_id and covers what this one did.
+    op.drop_index('ix_appeal_users_appeal_id', table_name='appeal_users')
+
+
+def downgrade():
+    op.create_index('ix_appeal_users_appeal_id', 'appeal_users', ['appeal_id'], unique=False)
+    op.drop_constraint('uq_appeal_users_appeal_employee', 'appeal_users', type_='unique')
@@ -0,0 +1,26 @@
+"""user appeals locate gist index
+
+Revision ID: 7b2d5e8a19c4
+Revises: 3e1c0f9d2b47
+Create Date: 2026-10-18 12:20:07.583391
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '7b2d5e8a19c4'
+down_revision = '3e1c0f9d2b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_user_appeals_locate', 'user_appeals', ['locate'], unique=False, postgresql_using='gist')
+    op.create_index('idx_user_appeals_locate_geography', 'user_appeals', [sa.text('geography(locate)')],
+                    unique=False, postgresql_using='gist')
+
+
+def downgrade():
+    op.drop_index('idx_user_appeals_locate_geography', table_name='user_appeals')
+    op.drop_index('idx_user_appeals_locate', table_name='user_appeals')
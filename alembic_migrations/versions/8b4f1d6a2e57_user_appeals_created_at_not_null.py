@@ -0,0 +1,41 @@
+"""user appeals created at not null
+
+Revision ID: 8b4f1d6a2e57
+Revises: 6e2c9b8d4f31
+Create Date: 2026-10-18 23:41:08.512734
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '8b4f1d6a2e57'
+down_revision = '6e2c9b8d4f31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Appeals without created_at get their last update time, and are counted into the stat buckets that skipped them.
+    op.execute("""
+        WITH backfilled AS (
+            UPDATE user_appeals SET created_at = coalesce(updated_at, TIMESTAMP '1970-01-01')
+            WHERE created_at IS NULL
+            RETURNING id, created_at, status_id, appeal_theme_id
+        )
+        INSERT INTO appeal_stat_counters (day, status_id, appeal_theme_id, department_id, count)
+        SELECT date(backfilled.created_at), backfilled.status_id, backfilled.appeal_theme_id,
+               appeal_themes.department_id, count(backfilled.id)
+        FROM backfilled JOIN appeal_themes ON appeal_themes.id = backfilled.appeal_theme_id
+        WHERE backfilled.status_id IS NOT NULL
+        GROUP BY date(backfilled.created_at), backfilled.status_id, backfilled.appeal_theme_id,
+                 appeal_themes.department_id
+        ON CONFLICT ON CONSTRAINT uq_appeal_stat_counters_bucket
+        DO UPDATE SET count = appeal_stat_counters.count + excluded.count
+    """)
+    op.alter_column('user_appeals', 'created_at', existing_type=sa.DateTime(), nullable=False,
+                    server_default=sa.func.now())
+
+
+def downgrade():
+    op.alter_column('user_appeals', 'created_at', existing_type=sa.DateTime(), nullable=True, server_default=None)
@@ -0,0 +1,25 @@
+"""content addressed attachments
+
+Revision ID: 9c3e5a7f2d18
+Revises: e2a6c94f1b57
+Create Date: 2026-10-18 17:05:31.448120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '9c3e5a7f2d18'
+down_revision = 'e2a6c94f1b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('attachments', sa.Column('checksum', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_attachments_link'), 'attachments', ['link'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_attachments_link'), table_name='attachments')
+    op.drop_column('attachments', 'checksum')
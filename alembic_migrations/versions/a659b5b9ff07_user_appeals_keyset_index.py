@@ -0,0 +1,22 @@
+"""user appeals keyset index
+
+Revision ID: a659b5b9ff07
+Revises: fa4139854ead
+Create Date: 2026-10-18 10:12:31.402118
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'a659b5b9ff07'
+down_revision = 'fa4139854ead'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_user_appeals_created_at_id', 'user_appeals', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_appeals_created_at_id', table_name='user_appeals')
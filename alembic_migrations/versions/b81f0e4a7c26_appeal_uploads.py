@@ -0,0 +1,44 @@
+"""appeal uploads
+
+Revision ID: b81f0e4a7c26
+Revises: 4f8b1d6c0a93
+Create Date: 2026-10-18 19:21:40.117834
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b81f0e4a7c26'
+down_revision = '4f8b1d6c0a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('appeal_uploads',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('created_at', sa.DateTime(), nullable=True),
+                    sa.Column('updated_at', sa.DateTime(), nullable=True),
+                    sa.Column('deleted_at', sa.DateTime(), nullable=True),
+                    sa.Column('token', sa.String(length=36), nullable=False),
+                    sa.Column('creator_id', sa.Integer(), nullable=False),
+                    sa.Column('filename', sa.String(), nullable=False),
+                    sa.Column('size', sa.BigInteger(), nullable=False),
+                    sa.Column('offset', sa.BigInteger(), nullable=False),
+                    sa.Column('expires_at', sa.DateTime(), nullable=False),
+                    sa.ForeignKeyConstraint(['creator_id'], ['users.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index(op.f('ix_appeal_uploads_id'), 'appeal_uploads', ['id'], unique=False)
+    op.create_index(op.f('ix_appeal_uploads_token'), 'appeal_uploads', ['token'], unique=True)
+    op.create_index(op.f('ix_appeal_uploads_creator_id'), 'appeal_uploads', ['creator_id'], unique=False)
+    op.create_index(op.f('ix_appeal_uploads_expires_at'), 'appeal_uploads', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_appeal_uploads_expires_at'), table_name='appeal_uploads')
+    op.drop_index(op.f('ix_appeal_uploads_creator_id'), table_name='appeal_uploads')
+    op.drop_index(op.f('ix_appeal_uploads_token'), table_name='appeal_uploads')
+    op.drop_index(op.f('ix_appeal_uploads_id'), table_name='appeal_uploads')
+    op.drop_table('appeal_uploads')
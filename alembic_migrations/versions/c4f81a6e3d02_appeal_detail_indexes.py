@@ -0,0 +1,31 @@
+"""appeal detail indexes
+
+Revision ID: c4f81a6e3d02
+Revises: 7b2d5e8a19c4
+Create Date: 2026-10-18 14:41:19.270554
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'c4f81a6e3d02'
+down_revision = '7b2d5e8a19c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_appeal_history_appeal_created_at', 'appeal_history',
+                    ['appeal_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_appeal_chats_appeal_created_at', 'appeal_chats',
+                    ['appeal_id', 'created_at', 'id'], unique=False)
+    op.create_index(op.f('ix_appeal_users_appeal_id'), 'appeal_users', ['appeal_id'], unique=False)
+    op.create_index(op.f('ix_user_appeal_attachments_user_appeal_id'), 'user_appeal_attachments',
+                    ['user_appeal_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_user_appeal_attachments_user_appeal_id'), table_name='user_appeal_attachments')
+    op.drop_index(op.f('ix_appeal_users_appeal_id'), table_name='appeal_users')
+    op.drop_index('ix_appeal_chats_appeal_created_at', table_name='appeal_chats')
+    op.drop_index('ix_appeal_history_appeal_created_at', table_name='appeal_history')
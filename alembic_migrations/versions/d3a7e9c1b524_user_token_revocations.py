@@ -0,0 +1,35 @@
+"""user token revocations
+
+Revision ID: d3a7e9c1b524
+Revises: b81f0e4a7c26
+Create Date: 2026-10-18 21:04:12.530918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd3a7e9c1b524'
+down_revision = 'b81f0e4a7c26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_token_revocations',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('revoked_at', sa.DateTime(), nullable=False),
+                    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('user_id')
+                    )
+    op.create_index(op.f('ix_user_token_revocations_id'), 'user_token_revocations', ['id'], unique=False)
+    op.create_index(op.f('ix_user_token_revocations_revoked_at'), 'user_token_revocations', ['revoked_at'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_user_token_revocations_revoked_at'), table_name='user_token_revocations')
+    op.drop_index(op.f('ix_user_token_revocations_id'), table_name='user_token_revocations')
+    op.drop_table('user_token_revocations')
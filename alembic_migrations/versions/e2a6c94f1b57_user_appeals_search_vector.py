@@ -0,0 +1,34 @@
+"""user appeals search vector
+
+Revision ID: e2a6c94f1b57
+Revises: 5d9e27b4c813
+Create Date: 2026-10-18 16:12:47.903215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'e2a6c94f1b57'
+down_revision = '5d9e27b4c813'
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(problem_body, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(address, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(note, '')), 'C')"
+)
+
+
+def upgrade():
+    op.add_column('user_appeals', sa.Column('search_vector', postgresql.TSVECTOR(),
+                                            sa.Computed(SEARCH_VECTOR, persisted=True), nullable=True))
+    op.create_index('idx_user_appeals_search_vector', 'user_appeals', ['search_vector'],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('idx_user_appeals_search_vector', table_name='user_appeals')
+    op.drop_column('user_appeals', 'search_vector')
@@ -1,6 +1,6 @@
-from datetime import datetime
+from datetime import datetime, date
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 
 class UserAppealEntity(BaseModel):
@@ -24,3 +24,121 @@ class UserAppealEntity(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class UserAppealSearchEntity(UserAppealEntity):
+    rank: float
+
+
+class UserAppealLocatedEntity(UserAppealEntity):
+    locate: List[float]
+
+
+class AppealClusterEntity(BaseModel):
+    lat: float
+    lng: float
+    count: int
+    statuses: Optional[Dict[str, int]]
+
+
+class AttachmentEntity(BaseModel):
+    id: int
+    link: str
+    thumbnail_link: Optional[str]
+    preview_link: Optional[str]
+    meta: Optional[str]
+    name: Optional[str]
+
+    class Config:
+        orm_mode = True
+
+
+class AppealStatusEntity(BaseModel):
+    id: int
+    title: str
+    status_const: str
+
+    class Config:
+        orm_mode = True
+
+
+class AppealThemeEntity(BaseModel):
+    id: int
+    theme: Optional[str]
+    department_id: Optional[int]
+    is_hidden: Optional[bool]
+
+    class Config:
+        orm_mode = True
+
+
+class AppealHistoryEntity(BaseModel):
+    id: int
+    created_at: Optional[datetime]
+    type: Optional[str]
+    comment: str
+    creator_id: Optional[int]
+    connected_person_id: Optional[int]
+    meta: Optional[str]
+    is_private: Optional[bool]
+
+
+class AppealChatEntity(BaseModel):
+    id: int
+    created_at: Optional[datetime]
+    user_id: Optional[int]
+    creator_id: Optional[int]
+    message: str
+    is_public: Optional[bool]
+    parent: Optional[int]
+
+
+class AppealUserEntity(BaseModel):
+    id: int
+    created_at: Optional[datetime]
+    employee_id: Optional[int]
+    creator_id: Optional[int]
+    comment: Optional[str]
+    closed_date: Optional[datetime]
+    is_private: Optional[bool]
+
+
+class UserAppealDetailEntity(UserAppealEntity):
+    status: Optional[AppealStatusEntity]
+    appeal_theme: Optional[AppealThemeEntity]
+    attachments: List[AttachmentEntity] = []
+    history_count: int
+    history: List[AppealHistoryEntity]
+    chat_count: int
+    chats: List[AppealChatEntity]
+    users: List[AppealUserEntity]
+
+
+class AppealStatsEntity(BaseModel):
+    status: Optional[str]
+    appeal_theme_id: Optional[int]
+    department_id: Optional[int]
+    day: Optional[date]
+    count: int
+
+
+class AppealUploadEntity(BaseModel):
+    token: str
+    filename: str
+    size: int
+    offset: int
+    expires_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class AppealImportErrorEntity(BaseModel):
+    row: int
+    errors: Dict[str, str]
+
+
+class AppealImportEntity(BaseModel):
+    imported: int
+    appeal_ids: List[int]
+    errors: List[AppealImportErrorEntity]
@@ -0,0 +1,51 @@
+import logging
+
+from fastapi import APIRouter, Depends, Header, Request, Response
+from fastapi_utils.cbv import cbv
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from appeals.entities import AppealUploadEntity
+from appeals.repository.appeal_upload_repository import AppealUploadRepository
+from appeals.resourses import AppealUploadOutResource
+from appeals.services.appeal_upload_service import AppealUploadService
+from appeals.usecases.types import AppealUploadData
+from grazhdane.database import get_async_db
+from users.dependencies import get_authenticated_user
+from users.models import User
+
+appeal_uploads_router = APIRouter()
+
+
+def upload_headers(upload) -> dict:
+    return {"Upload-Offset": str(upload.offset), "Upload-Length": str(upload.size), "Cache-Control": "no-store"}
+
+
+@cbv(appeal_uploads_router)
+class AppealUploadHandler:
+    db: AsyncSession = Depends(get_async_db)
+    auth_user: User = Depends(get_authenticated_user)
+    logger = logging.getLogger(__name__)
+
+    @appeal_uploads_router.post("/", response_model=AppealUploadOutResource, status_code=201)
+    async def create(self, data: AppealUploadData, request: Request, response: Response):
+        upload = await AppealUploadService(db=self.db).create(user=self.auth_user, data=data)
+        response.headers.update(upload_headers(upload))
+        response.headers["Location"] = f"{request.url.path.rstrip('/')}/{upload.token}"
+        return AppealUploadOutResource(data=AppealUploadEntity.from_orm(upload))
+
+    @appeal_uploads_router.head("/{token}")
+    async def offset(self, token: str):
+        upload = await AppealUploadRepository(db=self.db).get_by_token(token=token, creator_id=self.auth_user.id)
+        return Response(status_code=200, headers=upload_headers(upload))
+
+    @appeal_uploads_router.patch("/{token}")
+    async def append(self, token: str, request: Request, upload_offset: int = Header(..., ge=0)):
+        upload = await AppealUploadService(db=self.db).append(token=token, user=self.auth_user,
+                                                              offset=upload_offset, chunks=request.stream())
+        return Response(status_code=204, headers=upload_headers(upload))
+
+    @appeal_uploads_router.delete("/{token}", status_code=204)
+    async def delete(self, token: str):
+        upload = await AppealUploadRepository(db=self.db).get_by_token(token=token, creator_id=self.auth_user.id)
+        await AppealUploadService(db=self.db).discard([upload])
+        return Response(status_code=204)
@@ -1,20 +1,36 @@
 import logging
-from fastapi import APIRouter, Depends, UploadFile, File
-from fastapi_pagination import paginate
+from fastapi import APIRouter, Depends, UploadFile, File, Query, Form, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from fastapi_utils.cbv import cbv
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from appeals.entities import UserAppealEntity
+from appeals.entities import (
+    UserAppealEntity, UserAppealLocatedEntity, UserAppealDetailEntity, UserAppealSearchEntity,
+)
+from appeals.jobs import make_attachment_variants
+from appeals.models import UserAppeal
+from appeals.repository.appeal_stat_repository import AppealStatRepository
 from appeals.repository.user_appeal_repository import UserAppealRepository
-from appeals.resourses import UserAppealOutResource
-from appeals.usecases.types import UserAppealData
-from appeals.usecases.usecases import CreateUserAppealUC, UpdateUserAppealUC
+from appeals.resourses import (
+    UserAppealOutResource, UserAppealLocatedListOutResource, AppealClusterListOutResource, UserAppealDetailOutResource,
+    AppealStatsListOutResource, AppealImportOutResource,
+)
+from appeals.services.appeal_cluster_service import AppealClusterService
+from appeals.services.appeal_export_service import AppealExportService
+from appeals.services.appeal_import_service import AppealImportService
+from appeals.services.appeal_upload_service import AppealUploadService
+from appeals.usecases.types import (
+    UserAppealData, UserAppealFilterData, NearAppealsData, BBoxAppealsData, ClusterAppealsData, ExportFormats,
+    AppealStatsData, AppealSearchData,
+)
+from appeals.usecases.usecases import CreateUserAppealUC, UpdateUserAppealUC, ImportUserAppealsUC
 from common.types import UploadedFileType
-from common.utils import JsonApiPage
+from common.utils import JsonApiCursorPage, CursorParams, RankCursor
 from grazhdane.database import get_async_db
-from users.dependencies import get_authenticated_user
-from users.models import User
+from postgis.point import Point
+from users.dependencies import get_authenticated_user, get_auth_dependency
+from users.models import User, UserRoles
 
 user_appeals_router = APIRouter()
 
@@ -24,30 +40,131 @@ class UserHandler:
     db: AsyncSession = Depends(get_async_db)
     logger = logging.getLogger(__name__)
 
-    @user_appeals_router.get("/", response_model=JsonApiPage[UserAppealEntity])
-    async def appeals_list(self):
-        appeals = await UserAppealRepository(db=self.db).get_all()
-        return paginate([UserAppealEntity.from_orm(appeal) for appeal in appeals])
+    @user_appeals_router.get("/", response_model=JsonApiCursorPage[UserAppealEntity])
+    async def appeals_list(self, params: CursorParams = Depends(), filters: UserAppealFilterData = Depends()):
+        page = await UserAppealRepository(db=self.db).get_projected_page(cursor=params.get_cursor(),
+                                                                         per_page=params.size,
+                                                                         filters=filters)
+        return JsonApiCursorPage.create(items=[row._asdict() for row in page.items],
+                                        params=params,
+                                        next_cursor=page.next_cursor,
+                                        prev_cursor=page.prev_cursor)
+
+    @user_appeals_router.get("/search", response_model=JsonApiCursorPage[UserAppealSearchEntity])
+    async def appeals_search(self,
+                             data: AppealSearchData = Depends(),
+                             params: CursorParams = Depends(),
+                             filters: UserAppealFilterData = Depends()):
+        page = await UserAppealRepository(db=self.db).search(data=data,
+                                                             cursor=params.get_cursor(cursor_type=RankCursor),
+                                                             per_page=params.size,
+                                                             filters=filters)
+        return JsonApiCursorPage.create(items=[row._asdict() for row in page.items],
+                                        params=params,
+                                        next_cursor=page.next_cursor,
+                                        prev_cursor=page.prev_cursor)
+
+    @staticmethod
+    def _located_entity(appeal: UserAppeal, locate_wkt: str) -> UserAppealLocatedEntity:
+        return UserAppealLocatedEntity(**UserAppealEntity.from_orm(appeal).dict(),
+                                       locate=Point.from_pair(locate_wkt).to_json())
+
+    @user_appeals_router.get("/near", response_model=UserAppealLocatedListOutResource)
+    async def appeals_near(self, data: NearAppealsData = Depends(), filters: UserAppealFilterData = Depends()):
+        appeals = await UserAppealRepository(db=self.db).get_near(data=data, filters=filters)
+        return UserAppealLocatedListOutResource(data=[self._located_entity(*row) for row in appeals])
+
+    @user_appeals_router.get("/bbox", response_model=UserAppealLocatedListOutResource)
+    async def appeals_in_bbox(self, data: BBoxAppealsData = Depends(), filters: UserAppealFilterData = Depends()):
+        appeals = await UserAppealRepository(db=self.db).get_in_bbox(data=data, filters=filters)
+        return UserAppealLocatedListOutResource(data=[self._located_entity(*row) for row in appeals])
+
+    @user_appeals_router.get("/clusters", response_model=AppealClusterListOutResource)
+    async def appeals_clusters(self, data: ClusterAppealsData = Depends()):
+        clusters = await AppealClusterService(db=self.db).get_clusters(data=data)
+        return AppealClusterListOutResource(data=clusters)
+
+    @user_appeals_router.get("/stats", response_model=AppealStatsListOutResource)
+    async def appeals_stats(self,
+                            data: AppealStatsData = Depends(AppealStatsData.as_query),
+                            auth_user=get_auth_dependency([UserRoles.ADMIN_ROLE, UserRoles.MODERATOR_ROLE,
+                                                           UserRoles.CITY_HEAD_ROLE, UserRoles.DEPARTMENT_HEAD_ROLE,
+                                                           UserRoles.CONTROL_ROLE], load_user=False)):
+        stats = await AppealStatRepository(db=self.db).get_stats(data=data)
+        return AppealStatsListOutResource(data=[row._asdict() for row in stats])
+
+    @user_appeals_router.get("/export")
+    async def appeals_export(self,
+                             export_format: ExportFormats = Query(ExportFormats.NDJSON, alias="format"),
+                             filters: UserAppealFilterData = Depends(),
+                             auth_user=get_auth_dependency([UserRoles.ADMIN_ROLE, UserRoles.MODERATOR_ROLE,
+                                                            UserRoles.CITY_HEAD_ROLE], load_user=False)):
+        return StreamingResponse(
+            AppealExportService(db=self.db).export(export_format=export_format, filters=filters),
+            media_type=AppealExportService.MEDIA_TYPES[export_format],
+            headers={"Content-Disposition": f"attachment; filename=appeals.{export_format.value}"},
+        )
+
+    @user_appeals_router.post("/import", response_model=AppealImportOutResource)
+    async def appeals_import(self,
+                             file: UploadFile = File(...),
+                             import_format: ExportFormats = Query(ExportFormats.CSV, alias="format"),
+                             auth_user: User = get_auth_dependency([UserRoles.ADMIN_ROLE, UserRoles.MODERATOR_ROLE])):
+        content = await file.read(AppealImportService.MAX_BYTES + 1)
+        result = await ImportUserAppealsUC(db=self.db, ctx_user=auth_user, content=content,
+                                           import_format=import_format).exec()
+        return AppealImportOutResource(data=result)
 
     @user_appeals_router.post("/", response_model=UserAppealOutResource)
     async def create(self,
+                     background_tasks: BackgroundTasks,
                      data: UserAppealData = Depends(UserAppealData.as_form),
-                     files: List[UploadFile] = File(...),
+                     files: Optional[List[UploadFile]] = File(None),
+                     uploads: Optional[List[str]] = Form(None),
                      auth_user: User = Depends(get_authenticated_user)):
-        prepared_files = [UploadedFileType(file=f.file, filename=f.filename) for f in files]
-        new_appeal = await CreateUserAppealUC(db=self.db, ctx_user=auth_user, data=data, files=prepared_files).exec()
+        prepared_files = [UploadedFileType(file=f.file, filename=f.filename) for f in files or []]
+        async with AppealUploadService(db=self.db).use(tokens=uploads or [], user=auth_user) as uploaded_files:
+            usecase = CreateUserAppealUC(db=self.db, ctx_user=auth_user, data=data,
+                                         files=prepared_files + uploaded_files)
+            new_appeal = await usecase.exec()
+        if usecase.variant_attachment_ids:
+            background_tasks.add_task(make_attachment_variants, usecase.variant_attachment_ids)
 
         return UserAppealOutResource(data=UserAppealEntity.from_orm(new_appeal))
 
     @user_appeals_router.put("/{appeal_id}", response_model=UserAppealOutResource)
     async def update(self,
                      appeal_id: int,
-                     files: Optional[List[UploadFile]],
+                     background_tasks: BackgroundTasks,
+                     files: Optional[List[UploadFile]] = File(None),
+                     uploads: Optional[List[str]] = Form(None),
                      data: UserAppealData = Depends(UserAppealData.as_form),
                      auth_user: User = Depends(get_authenticated_user)):
-        prepared_files = [UploadedFileType(file=f.file, filename=f.filename) for f in files]
+        prepared_files = [UploadedFileType(file=f.file, filename=f.filename) for f in files or []]
         user_appeal = await UserAppealRepository(db=self.db).get_by_id(pk=appeal_id, raise_exception=True)
-        usecase = UpdateUserAppealUC(db=self.db, data=data, files=prepared_files, user_appeal=user_appeal)
-        await usecase.exec()
+        async with AppealUploadService(db=self.db).use(tokens=uploads or [], user=auth_user) as uploaded_files:
+            usecase = UpdateUserAppealUC(db=self.db, data=data, files=prepared_files + uploaded_files,
+                                         user_appeal=user_appeal)
+            await usecase.exec()
+        if usecase.variant_attachment_ids:
+            background_tasks.add_task(make_attachment_variants, usecase.variant_attachment_ids)
 
         return UserAppealOutResource(data=UserAppealEntity.from_orm(user_appeal))
+
+    @user_appeals_router.get("/{appeal_id}", response_model=UserAppealDetailOutResource)
+    async def detail(self,
+                     appeal_id: int,
+                     latest: int = Query(10, ge=0, le=50),
+                     auth_user: User = Depends(get_authenticated_user)):
+        repository = UserAppealRepository(db=self.db)
+        appeal = await repository.get_by_id(pk=appeal_id, raise_exception=True,
+                                            loading_plan=repository.detail_loading_plan)
+        aggregates = await repository.get_detail_aggregates(pk=appeal_id, latest_count=latest)
+
+        return UserAppealDetailOutResource(data=UserAppealDetailEntity(
+            **UserAppealEntity.from_orm(appeal).dict(),
+            status=appeal.status,
+            appeal_theme=appeal.appeal_theme,
+            attachments=appeal.attachments,
+            **aggregates._asdict(),
+        ))
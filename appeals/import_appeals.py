@@ -0,0 +1,41 @@
+"""
+Imports dispatcher-entered appeals from a CSV (with a header) or NDJSON file.
+
+    python -m appeals.import_appeals appeals.csv --creator-id 1
+    python -m appeals.import_appeals appeals.ndjson --creator-id 1 --format ndjson
+
+Columns: appeal_theme_id, problem_body, address, lat, lng and optionally post_address, note, is_active.
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from appeals.entities import AppealImportEntity
+from appeals.usecases.types import ExportFormats
+from appeals.usecases.usecases import ImportUserAppealsUC
+from grazhdane.database import async_session
+from users.repository.user_repository import UserRepository
+
+
+async def import_appeals(path: str, creator_id: int, import_format: ExportFormats) -> AppealImportEntity:
+    with open(path, "rb") as f:
+        content = f.read()
+    async with async_session() as db:
+        creator = await UserRepository(db=db).get_by_id(pk=creator_id, raise_exception=True)
+        return await ImportUserAppealsUC(db=db, ctx_user=creator, content=content, import_format=import_format).exec()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Imports appeals entered by a dispatcher.")
+    parser.add_argument("path")
+    parser.add_argument("--creator-id", type=int, required=True, help="dispatcher the appeals are created by")
+    parser.add_argument("--format", choices=[f.value for f in ExportFormats],
+                        help="defaults to the file extension")
+    args = parser.parse_args()
+    import_format = ExportFormats(args.format or os.path.splitext(args.path)[1].lstrip(".").lower())
+
+    result = asyncio.run(import_appeals(path=args.path, creator_id=args.creator_id, import_format=import_format))
+    for error in result.errors:
+        print(json.dumps(error.dict(), ensure_ascii=False))
+    print(f"imported={result.imported} failed={len(result.errors)}")
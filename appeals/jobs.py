@@ -0,0 +1,27 @@
+import asyncio
+from typing import List
+
+from appeals.services.appeal_upload_service import AppealUploadService
+from appeals.services.user_appeal_service import UserAppealService
+from appeals.usecases.usecases import ReconcileAppealStatsUC
+from grazhdane.database import async_session
+
+
+async def reconcile_appeal_stats() -> bool:
+    async with async_session() as db:
+        return await ReconcileAppealStatsUC(db=db).exec()
+
+
+async def purge_expired_uploads() -> int:
+    async with async_session() as db:
+        return await AppealUploadService(db=db).purge_expired()
+
+
+async def make_attachment_variants(attachment_ids: List[int]) -> int:
+    async with async_session() as db:
+        return await UserAppealService(db=db).make_variants(attachment_ids=attachment_ids)
+
+
+if __name__ == "__main__":
+    # Run from one place (cron), not in every web worker: the rebuild blocks appeal writes while it aggregates.
+    print(f"reconciled={asyncio.run(reconcile_appeal_stats())}")
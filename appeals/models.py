@@ -1,14 +1,27 @@
 import enum
 
 from geoalchemy2 import Geometry
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Integer, SmallInteger, Enum
-from sqlalchemy.dialects.postgresql import ARRAY
-from sqlalchemy.orm import relationship
-
-from grazhdane.models import TimeStampedModel
+from sqlalchemy import (
+    Column, String, Boolean, DateTime, ForeignKey, Integer, SmallInteger, Enum, Index, func, Date, UniqueConstraint,
+    Computed, BigInteger,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
+
+from grazhdane.models import TimeStampedModel, BaseORMModel
 from users.models import User, Department, Deputy, Attachment
 
 
+SEARCH_CONFIG = 'russian'
+
+# Weighted so that matches in the problem text outrank matches in the address, and both outrank the note.
+USER_APPEAL_SEARCH_VECTOR = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(problem_body, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(address, '')), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(note, '')), 'C')"
+)
+
+
 class AppealStatuses(str, enum.Enum):
     MODERATION = 'MODERATION'
     CONSIDERATION = 'CONSIDERATION'
@@ -31,7 +44,7 @@ class AppealTheme(TimeStampedModel):
     __tablename__ = 'appeal_themes'
 
     theme = Column(String)
-    department_id = Column(Integer, ForeignKey(Department.id, ondelete="CASCADE"))
+    department_id = Column(Integer, ForeignKey(Department.id, ondelete="CASCADE"), index=True)
     department = relationship(Department)
     is_hidden = Column(Boolean, default=False)
 
@@ -39,7 +52,7 @@ class AppealTheme(TimeStampedModel):
 class UserAppealAttachment(Attachment):
     __tablename__ = 'user_appeal_attachments'
     id = Column(Integer, ForeignKey(Attachment.id), primary_key=True)
-    user_appeal_id = Column(Integer, ForeignKey("user_appeals.id"))
+    user_appeal_id = Column(Integer, ForeignKey("user_appeals.id"), index=True)
     user_appeal = relationship("UserAppeal", back_populates='attachments')
 
     __mapper_args__ = {
@@ -49,9 +62,21 @@ class UserAppealAttachment(Attachment):
 
 class UserAppeal(TimeStampedModel):
     __tablename__ = "user_appeals"
+    __table_args__ = (
+        Index('ix_user_appeals_created_at_id', 'created_at', 'id'),
+        Index('ix_user_appeals_status_created_at', 'status_id', 'is_hidden', 'created_at', 'id'),
+        Index('ix_user_appeals_theme_created_at', 'appeal_theme_id', 'created_at', 'id'),
+        Index('ix_user_appeals_creator_created_at', 'creator_id', 'created_at', 'id'),
+        Index('ix_user_appeals_executor_created_at', 'executor_id', 'status_id', 'created_at', 'id'),
+        Index('ix_user_appeals_deputy_created_at', 'deputy_id', 'created_at', 'id'),
+        Index('idx_user_appeals_locate', 'locate', postgresql_using='gist'),
+        Index('idx_user_appeals_search_vector', 'search_vector', postgresql_using='gin'),
+    )
 
     attachments = relationship(UserAppealAttachment, back_populates="user_appeal")
 
+    # Keyset pages and their cursors order by created_at, so it is never NULL here.
+    created_at = Column(DateTime, nullable=False, default=func.now(), server_default=func.now())
     creator_id = Column(Integer, ForeignKey(User.id, ondelete="CASCADE"))
     creator = relationship(User, foreign_keys=[creator_id])
 
@@ -77,11 +102,19 @@ class UserAppeal(TimeStampedModel):
     is_hidden = Column(Boolean, default=False)
     expired_at = Column(DateTime)
     users_voted = Column(ARRAY(Integer))
-    locate = Column(Geometry('POINT'))
+    locate = Column(Geometry('POINT', spatial_index=False))
+    search_vector = deferred(Column(TSVECTOR, Computed(USER_APPEAL_SEARCH_VECTOR, persisted=True)))
+
+
+Index('idx_user_appeals_locate_geography', func.geography(UserAppeal.locate), postgresql_using='gist')
 
 
 class AppealUser(TimeStampedModel):
     __tablename__ = 'appeal_users'
+    __table_args__ = (
+        # Also serves lookups by `appeal_id` alone.
+        UniqueConstraint('appeal_id', 'employee_id', name='uq_appeal_users_appeal_employee'),
+    )
 
     appeal_id = Column(Integer, ForeignKey(UserAppeal.id, ondelete="CASCADE"), nullable=False)
     appeal = relationship(UserAppeal)
@@ -129,6 +162,9 @@ class AppealHistoryTypes(str, enum.Enum):
 
 class AppealHistory(TimeStampedModel):
     __tablename__ = 'appeal_history'
+    __table_args__ = (
+        Index('ix_appeal_history_appeal_created_at', 'appeal_id', 'created_at', 'id'),
+    )
 
     appeal_id = Column(Integer, ForeignKey(UserAppeal.id, ondelete="CASCADE"), nullable=False)
     appeal = relationship(UserAppeal)
@@ -150,6 +186,9 @@ class AppealHistory(TimeStampedModel):
 
 class AppealChat(TimeStampedModel):
     __tablename__ = 'appeal_chats'
+    __table_args__ = (
+        Index('ix_appeal_chats_appeal_created_at', 'appeal_id', 'created_at', 'id'),
+    )
 
     user_id = Column(Integer, ForeignKey(User.id, ondelete="CASCADE"))
     user = relationship(User, foreign_keys=[user_id])
@@ -165,3 +204,33 @@ class AppealChat(TimeStampedModel):
 
     parent = Column(Integer)
     is_hidden = Column(Boolean, default=False)
+
+
+class AppealStatCounter(BaseORMModel):
+    """Number of appeals created on `day` which are currently in `status_id` with `appeal_theme_id`."""
+    __tablename__ = 'appeal_stat_counters'
+    __table_args__ = (
+        UniqueConstraint('day', 'status_id', 'appeal_theme_id', name='uq_appeal_stat_counters_bucket'),
+    )
+
+    day = Column(Date, nullable=False)
+    status_id = Column(Integer, ForeignKey(AppealStatus.id, ondelete="CASCADE"), nullable=False)
+    appeal_theme_id = Column(Integer, ForeignKey(AppealTheme.id, ondelete="CASCADE"), nullable=False)
+    department_id = Column(Integer, ForeignKey(Department.id, ondelete="CASCADE"), index=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class AppealUpload(TimeStampedModel):
+    """Resumable upload of a large attachment, sent in chunks before the appeal referencing it is saved."""
+    __tablename__ = 'appeal_uploads'
+
+    token = Column(String(36), nullable=False, unique=True, index=True)
+    creator_id = Column(Integer, ForeignKey(User.id, ondelete="CASCADE"), nullable=False, index=True)
+    filename = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    offset = Column(BigInteger, nullable=False, default=0)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    @property
+    def is_complete(self) -> bool:
+        return self.offset == self.size
@@ -1,17 +1,85 @@
-from sqlalchemy import delete
+from typing import List, Iterable, Set, Dict, Optional
+
+from sqlalchemy import delete, select, update
 
 from appeals.models import UserAppealAttachment
 from common.repository import BaseRepository
+from users.models import Attachment
 
 
 class IAppealAttachmentRepository(BaseRepository):
-    async def delete_by_appeal_id(self, appeal_id: int) -> int:
+    async def delete_by_appeal_id(self, appeal_id: int) -> List[str]:
+        raise NotImplementedError
+
+    async def get_ids_by_appeal_id(self, appeal_id: int) -> List[int]:
+        raise NotImplementedError
+
+    async def delete_except(self, appeal_id: int, keep_ids: Iterable[int]) -> List[str]:
+        raise NotImplementedError
+
+    async def get_referenced_links(self, links: Iterable[str]) -> Set[str]:
+        raise NotImplementedError
+
+    async def get_links(self, attachment_ids: Iterable[int]) -> Dict[int, str]:
+        raise NotImplementedError
+
+    async def set_variant_links(self, attachment_id: int, link: str,
+                                thumbnail_link: Optional[str], preview_link: Optional[str]) -> bool:
         raise NotImplementedError
 
 
 class AppealAttachmentRepository(IAppealAttachmentRepository):
     model = UserAppealAttachment
 
-    async def delete_by_appeal_id(self, appeal_id: int) -> int:
-        query = await self.exec_query(delete(self.model).where(UserAppealAttachment.user_appeal_id == appeal_id))
+    async def _delete_returning_links(self, *where) -> List[str]:
+        """Deletes both the `user_appeal_attachments` and the parent `attachments` rows, returns their links."""
+        table = UserAppealAttachment.__table__
+        query = await self.exec_query(delete(table).where(*where).returning(table.c.id))
+        attachment_ids = query.scalars().fetchall()
+        if not attachment_ids:
+            return []
+
+        query = await self.exec_query(delete(Attachment.__table__)
+                                      .where(Attachment.__table__.c.id.in_(attachment_ids))
+                                      .returning(Attachment.__table__.c.link))
         return query.scalars().fetchall()
+
+    async def delete_by_appeal_id(self, appeal_id: int) -> List[str]:
+        return await self._delete_returning_links(UserAppealAttachment.__table__.c.user_appeal_id == appeal_id)
+
+    async def get_ids_by_appeal_id(self, appeal_id: int) -> List[int]:
+        query = await self.exec_query(select(UserAppealAttachment.id)
+                                      .where(UserAppealAttachment.user_appeal_id == appeal_id))
+        return query.scalars().fetchall()
+
+    async def delete_except(self, appeal_id: int, keep_ids: Iterable[int]) -> List[str]:
+        table = UserAppealAttachment.__table__
+        return await self._delete_returning_links(table.c.user_appeal_id == appeal_id,
+                                                  table.c.id.notin_(list(keep_ids)))
+
+    async def get_referenced_links(self, links: Iterable[str]) -> Set[str]:
+        """Links of `links` still used by any attachment, whatever its owner."""
+        links = set(links)
+        if not links:
+            return set()
+
+        query = await self.exec_query(select(Attachment.link).where(Attachment.link.in_(links)).distinct())
+        return set(query.scalars().fetchall())
+
+    async def get_links(self, attachment_ids: Iterable[int]) -> Dict[int, str]:
+        attachment_ids = list(attachment_ids)
+        if not attachment_ids:
+            return {}
+
+        query = await self.exec_query(select(Attachment.id, Attachment.link).where(Attachment.id.in_(attachment_ids)))
+        return {row.id: row.link for row in query}
+
+    async def set_variant_links(self, attachment_id: int, link: str,
+                                thumbnail_link: Optional[str], preview_link: Optional[str]) -> bool:
+        """Links the image variants, `False` when the attachment is gone or points to another file by now."""
+        table = Attachment.__table__
+        query = await self.exec_query(update(table)
+                                      .where(table.c.id == attachment_id, table.c.link == link)
+                                      .values(thumbnail_link=thumbnail_link, preview_link=preview_link)
+                                      .returning(table.c.id))
+        return query.scalars().first() is not None
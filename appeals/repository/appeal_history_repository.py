@@ -1,6 +1,7 @@
-from typing import Optional
+from typing import Optional, List
 
 from fastapi import HTTPException
+from sqlalchemy import insert
 
 from appeals.models import AppealHistory, UserAppeal, AppealHistoryTypes
 from common.repository import BaseRepository
@@ -12,6 +13,9 @@ class IAppealHistoryRepository(BaseRepository):
     async def create_moderation_message(self, appeal: UserAppeal) -> AppealHistory:
         raise NotImplementedError
 
+    async def create_moderation_messages(self, appeal_ids: List[int], creator_id: int) -> None:
+        raise NotImplementedError
+
     async def get_by_id(self, pk: int, raise_exception: bool = False) -> Optional[AppealHistory]:
         raise NotImplementedError
 
@@ -23,17 +27,30 @@ class AppealHistoryRepository(IAppealHistoryRepository):
     model = AppealHistory
 
     async def create_moderation_message(self, appeal: UserAppeal) -> AppealHistory:
-        comment = f"Сообщение № {appeal.id} было отправлено на модерацию"
         history = AppealHistory()
         history.appeal = appeal
         history.creator = appeal.creator
-        history.comment = comment
+        history.comment = self._moderation_comment(appeal_id=appeal.id)
         history.type = AppealHistoryTypes.APPEAL_MODERATION
 
         self.db.add(history)
         await self.db.flush()
         return history
 
+    async def create_moderation_messages(self, appeal_ids: List[int], creator_id: int) -> None:
+        if not appeal_ids:
+            return
+        await self.exec_query(insert(AppealHistory).values([{
+            "appeal_id": appeal_id,
+            "creator_id": creator_id,
+            "comment": self._moderation_comment(appeal_id=appeal_id),
+            "type": AppealHistoryTypes.APPEAL_MODERATION,
+        } for appeal_id in appeal_ids]))
+
+    @staticmethod
+    def _moderation_comment(appeal_id: int) -> str:
+        return f"Сообщение № {appeal_id} было отправлено на модерацию"
+
     async def get_by_id(self, pk: int, raise_exception: bool = False) -> Optional[AppealHistory]:
         query = await self.exec_query(self.select(self.model).where(self.model.id == pk))
         history = query.scalars().first()
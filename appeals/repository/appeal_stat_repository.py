@@ -0,0 +1,120 @@
+from abc import abstractmethod
+from typing import Protocol, List
+
+from sqlalchemy import func, delete, text, cast, Integer
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row
+from sqlalchemy.sql import Select
+
+from appeals.models import AppealStatCounter, UserAppeal, AppealTheme, AppealStatus
+from appeals.usecases.types import AppealStatsData, StatsDimensions
+from common.repository import BaseRepository
+
+
+class IAppealStatRepository(Protocol):
+    @abstractmethod
+    async def add_appeal(self, appeal_id: int) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def remove_appeal(self, appeal_id: int) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_appeals(self, appeal_ids: List[int]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def rebuild(self) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_stats(self, data: AppealStatsData) -> List[Row]:
+        raise NotImplementedError
+
+
+class AppealStatRepository(BaseRepository, IAppealStatRepository):
+    model = AppealStatCounter
+
+    def _select_buckets(self, count_column) -> Select:
+        day = func.date(UserAppeal.created_at)
+        return self.select(day, UserAppeal.status_id, UserAppeal.appeal_theme_id, AppealTheme.department_id,
+                           count_column) \
+            .join(UserAppeal.appeal_theme) \
+            .where(UserAppeal.status_id.isnot(None))
+
+    async def _add_buckets(self, buckets: Select) -> None:
+        insert_query = insert(AppealStatCounter).from_select(
+            ["day", "status_id", "appeal_theme_id", "department_id", "count"], buckets)
+        await self.exec_query(insert_query.on_conflict_do_update(
+            constraint="uq_appeal_stat_counters_bucket",
+            set_={
+                "count": AppealStatCounter.count + insert_query.excluded.count,
+                "department_id": insert_query.excluded.department_id,
+            },
+        ))
+
+    async def _shift(self, appeal_id: int, delta: int) -> None:
+        """Moves the appeal into (delta=1) or out of (delta=-1) the bucket matching its current database row."""
+        buckets = self._select_buckets(cast(delta, Integer)) \
+            .where(UserAppeal.id == appeal_id)
+        await self._add_buckets(buckets)
+
+    async def add_appeal(self, appeal_id: int) -> None:
+        await self._shift(appeal_id=appeal_id, delta=1)
+
+    async def remove_appeal(self, appeal_id: int) -> None:
+        await self._shift(appeal_id=appeal_id, delta=-1)
+
+    async def add_appeals(self, appeal_ids: List[int]) -> None:
+        """Like `add_appeal` for many appeals, grouped first since a statement can not update a bucket twice."""
+        if not appeal_ids:
+            return
+        buckets = self._select_buckets(func.count(UserAppeal.id)) \
+            .where(UserAppeal.id.in_(appeal_ids)) \
+            .group_by(func.date(UserAppeal.created_at), UserAppeal.status_id, UserAppeal.appeal_theme_id,
+                      AppealTheme.department_id)
+        await self._add_buckets(buckets)
+
+    async def rebuild(self) -> bool:
+        """
+        Recomputes every bucket from `user_appeals`, concurrent shifts wait until the transaction ends.
+        Returns `False` without touching anything when another rebuild is running.
+        """
+        query = await self.db.execute(text("SELECT pg_try_advisory_xact_lock(hashtext(:name))"),
+                                      {"name": AppealStatCounter.__tablename__})
+        if not query.scalar():
+            return False
+        await self.exec_query(text(f"LOCK TABLE {AppealStatCounter.__tablename__} IN SHARE ROW EXCLUSIVE MODE"))
+        await self.exec_query(delete(AppealStatCounter))
+        buckets = self._select_buckets(func.count(UserAppeal.id)) \
+            .group_by(func.date(UserAppeal.created_at), UserAppeal.status_id, UserAppeal.appeal_theme_id,
+                      AppealTheme.department_id)
+        await self.exec_query(insert(AppealStatCounter).from_select(
+            ["day", "status_id", "appeal_theme_id", "department_id", "count"], buckets))
+        return True
+
+    async def get_stats(self, data: AppealStatsData) -> List[Row]:
+        dimensions = {
+            StatsDimensions.STATUS: AppealStatus.status_const,
+            StatsDimensions.THEME: AppealStatCounter.appeal_theme_id,
+            StatsDimensions.DEPARTMENT: AppealStatCounter.department_id,
+            StatsDimensions.DAY: AppealStatCounter.day,
+        }
+        columns = [dimensions[dimension].label(dimension.value) for dimension in dict.fromkeys(data.group_by)]
+        select_query = self.select(*columns, func.sum(AppealStatCounter.count).label("count")) \
+            .select_from(AppealStatCounter)
+        if StatsDimensions.STATUS in data.group_by:
+            select_query = select_query.join(AppealStatus, AppealStatus.id == AppealStatCounter.status_id)
+        if data.department_id is not None:
+            select_query = select_query.where(AppealStatCounter.department_id == data.department_id)
+        if data.date_from:
+            select_query = select_query.where(AppealStatCounter.day >= data.date_from)
+        if data.date_to:
+            select_query = select_query.where(AppealStatCounter.day <= data.date_to)
+
+        select_query = select_query.group_by(*columns) \
+            .having(func.sum(AppealStatCounter.count) > 0) \
+            .order_by(*columns)
+        query = await self.exec_query(select_query)
+        return query.fetchall()
@@ -0,0 +1,75 @@
+from abc import abstractmethod
+from datetime import datetime
+from typing import Protocol, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, update
+
+from appeals.models import AppealUpload
+from common.errors import ValidationError
+from common.repository import BaseRepository
+
+
+class IAppealUploadRepository(Protocol):
+    @abstractmethod
+    async def get_by_token(self, token: str, creator_id: int) -> AppealUpload:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def advance_offset(self, token: str, offset: int, new_offset: int) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_completed(self, tokens: List[str], creator_id: int, for_update: bool = False) -> List[AppealUpload]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_expired(self, now: Optional[datetime] = None) -> List[str]:
+        raise NotImplementedError
+
+
+class AppealUploadRepository(BaseRepository, IAppealUploadRepository):
+    model = AppealUpload
+
+    async def get_by_token(self, token: str, creator_id: int) -> AppealUpload:
+        """The upload as it is in the database now, even when this session loaded it before."""
+        query = await self.exec_query(self.select(self.model)
+                                      .where(AppealUpload.token == token,
+                                             AppealUpload.creator_id == creator_id,
+                                             AppealUpload.expires_at > datetime.utcnow())
+                                      .execution_options(populate_existing=True))
+        upload = query.scalars().first()
+        if not upload:
+            raise HTTPException(status_code=404, detail=f"Undefined upload {token}")
+        return upload
+
+    async def advance_offset(self, token: str, offset: int, new_offset: int) -> bool:
+        """Moves the offset from `offset` to `new_offset`, `False` when it is not at `offset` any more."""
+        query = await self.exec_query(update(AppealUpload)
+                                      .where(AppealUpload.token == token, AppealUpload.offset == offset)
+                                      .values(offset=new_offset)
+                                      .returning(AppealUpload.id))
+        return query.scalars().first() is not None
+
+    async def get_completed(self, tokens: List[str], creator_id: int, for_update: bool = False) -> List[AppealUpload]:
+        """Finished uploads of `creator_id` in the order of `tokens`, any unknown or unfinished one is an error."""
+        if not tokens:
+            return []
+
+        select_query = self.select(self.model).where(AppealUpload.token.in_(tokens),
+                                                     AppealUpload.creator_id == creator_id,
+                                                     AppealUpload.expires_at > datetime.utcnow())
+        if for_update:
+            select_query = select_query.order_by(AppealUpload.id).with_for_update()
+        query = await self.exec_query(select_query)
+        uploads = {upload.token: upload for upload in query.scalars().fetchall()}
+        missing = [token for token in tokens if token not in uploads or not uploads[token].is_complete]
+        if missing:
+            raise ValidationError(detail={"uploads": f"Unknown or unfinished uploads: {', '.join(missing)}"})
+        return [uploads[token] for token in tokens]
+
+    async def delete_expired(self, now: Optional[datetime] = None) -> List[str]:
+        query = await self.exec_query(delete(AppealUpload)
+                                      .where(AppealUpload.expires_at <= (now or datetime.utcnow()))
+                                      .returning(AppealUpload.token))
+        return query.scalars().fetchall()
@@ -2,21 +2,21 @@ from abc import abstractmethod
 from typing import Protocol, List, Optional
 
 from fastapi import HTTPException
-from sqlalchemy import select, delete
-from sqlalchemy.engine import ChunkedIteratorResult
-from sqlalchemy.sql import Select, Delete
+from sqlalchemy import select, delete, exists, literal, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import Delete
 
-from appeals.models import AppealUser
+from appeals.models import AppealUser, UserAppeal, AppealStatus, AppealStatuses
 from common.repository import BaseRepository
 
 
 class IAppealUserRepository(Protocol):
     @abstractmethod
-    async def get_user_appeals_ids(self, user_id: int) -> List[int]:
+    async def connect_user_to_all_appeals(self, creator_id: int, user_id: int, statuses: List[AppealStatuses]) -> int:
         raise NotImplementedError
 
     @abstractmethod
-    async def connect_user_to_appeals(self, creator_id: int, user_id: int, exists_appeals_ids: List[int]) -> None:
+    async def create_for_appeals(self, appeal_ids: List[int]) -> None:
         raise NotImplementedError
 
     @abstractmethod
@@ -35,28 +35,26 @@ class IAppealUserRepository(Protocol):
 class AppealUserRepository(BaseRepository, IAppealUserRepository):
     model = AppealUser
 
-    async def get_user_appeals_ids(self, user_id: int) -> List[int]:
-        select_query: Select = select(self.model.appeal_id)
-        query: ChunkedIteratorResult = await self.db.execute(select_query.where(AppealUser.employee_id == user_id))
-        return query.fetchall()
-
-    async def connect_user_to_appeals(self, creator_id: int, user_id: int, exists_appeals_ids: List[int]) -> None:
-        new_connections = []
-        for appeal_id in exists_appeals_ids:
-            new_connection: AppealUser = AppealUser()
-            new_connection.appeal_id = appeal_id
-            new_connection.employee_id = user_id
-            new_connection.creator_id = creator_id
-            new_connection.is_private = False
-
-            new_connections.append(new_connection)
-            if len(new_connections) == 30:
-                self.db.add_all(new_connections)
-                await self.db.flush()
-                new_connections = []
-        else:
-            self.db.add_all(new_connections)
-            await self.db.flush()
+    async def connect_user_to_all_appeals(self, creator_id: int, user_id: int, statuses: List[AppealStatuses]) -> int:
+        """
+        Connects the user to every appeal in `statuses` it is not connected to yet, in one `INSERT ... SELECT`.
+        `uq_appeal_users_appeal_employee` makes concurrent runs skip the rows the other one inserted.
+        Returns the number of new connections.
+        """
+        already_connected = exists().where(AppealUser.appeal_id == UserAppeal.id, AppealUser.employee_id == user_id)
+        appeals = select(UserAppeal.id, literal(user_id), literal(creator_id), literal(False), func.now(), func.now()) \
+            .join(UserAppeal.status) \
+            .where(AppealStatus.status_const.in_(statuses), ~already_connected)
+        insert_query = insert(AppealUser).from_select(
+            ["appeal_id", "employee_id", "creator_id", "is_private", "created_at", "updated_at"], appeals)
+        query = await self.exec_query(insert_query.on_conflict_do_nothing(
+            index_elements=[AppealUser.appeal_id, AppealUser.employee_id]))
+        return query.rowcount
+
+    async def create_for_appeals(self, appeal_ids: List[int]) -> None:
+        """The empty `appeal_users` row every new appeal gets, for many appeals in one statement."""
+        if appeal_ids:
+            await self.exec_query(insert(AppealUser).values([{"appeal_id": appeal_id} for appeal_id in appeal_ids]))
 
     async def disconnect_from_appeals(self, user_id: int) -> int:
         delete_query: Delete = delete(AppealUser)
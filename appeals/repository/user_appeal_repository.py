@@ -1,61 +1,280 @@
-from typing import List, Protocol, Optional
+from typing import List, Protocol, Optional, Tuple, AsyncIterator
 
 from fastapi import HTTPException
-from sqlalchemy import func
+from sqlalchemy import func, text, select, JSON, literal_column, insert
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import subqueryload
-from sqlalchemy.sql import Select, Subquery
+from sqlalchemy.orm.strategy_options import Load
+from sqlalchemy.sql import Select
 
-from appeals.models import UserAppeal, AppealStatus, AppealStatuses
-from common.repository import BaseRepository
+from appeals.entities import UserAppealEntity
+from appeals.models import (
+    UserAppeal, AppealStatus, AppealTheme, AppealHistory, AppealChat, AppealUser, SEARCH_CONFIG,
+)
+from appeals.usecases.types import (
+    UserAppealFilterData, NearAppealsData, BBoxAppealsData, BBoxData, AppealSearchData,
+)
+from common.repository import BaseRepository, LoadingPlan, LoadStrategies
+from common.types import KeysetPageType
+from common.utils import KeysetCursor, RankCursor
+from postgis.point import Point
 
 
 class IUserAppealRepository(Protocol):
     async def get_all(self, ) -> List[UserAppeal]:
         raise NotImplementedError
 
-    async def get_all_ids_for_connect_employee(self, exclude_appeals_ids: List[int]) -> List[int]:
+    async def get_page(self, cursor: Optional[KeysetCursor],
+                       per_page: int,
+                       filters: Optional[UserAppealFilterData] = None) -> KeysetPageType:
+        raise NotImplementedError
+
+    async def get_projected_page(self, cursor: Optional[KeysetCursor],
+                                 per_page: int,
+                                 filters: Optional[UserAppealFilterData] = None) -> KeysetPageType:
+        raise NotImplementedError
+
+    def stream_projected(self, filters: Optional[UserAppealFilterData] = None,
+                         size: int = 1000) -> AsyncIterator[List[Row]]:
+        raise NotImplementedError
+
+    async def search(self, data: AppealSearchData,
+                     cursor: Optional[RankCursor],
+                     per_page: int,
+                     filters: Optional[UserAppealFilterData] = None) -> KeysetPageType:
+        raise NotImplementedError
+
+    async def get_near(self, data: NearAppealsData,
+                       filters: Optional[UserAppealFilterData] = None) -> List[Tuple[UserAppeal, str]]:
+        raise NotImplementedError
+
+    async def get_in_bbox(self, data: BBoxAppealsData,
+                          filters: Optional[UserAppealFilterData] = None) -> List[Tuple[UserAppeal, str]]:
+        raise NotImplementedError
+
+    async def get_cluster_cells(self, data: BBoxData, cell_lat: float, cell_lng: float) -> List[Row]:
+        raise NotImplementedError
+
+    async def get_location(self, pk: int) -> Optional[Point]:
+        raise NotImplementedError
+
+    async def get_detail_aggregates(self, pk: int, latest_count: int) -> Row:
         raise NotImplementedError
 
     async def get_count_all(self) -> int:
         raise NotImplementedError
 
+    async def bulk_create(self, values: List[dict]) -> List[int]:
+        raise NotImplementedError
+
     async def get_by_id(self, pk: int,
                         raise_exception: bool = False,
-                        fetch_relations: bool = False) -> Optional[UserAppeal]:
+                        fetch_relations: bool = False,
+                        loading_plan: Optional[LoadingPlan] = None) -> Optional[UserAppeal]:
         raise NotImplementedError
 
 
 class UserAppealRepository(BaseRepository, IUserAppealRepository):
     model = UserAppeal
+    relations_loading_plan: LoadingPlan = {
+        "attachments": LoadStrategies.SELECTIN,
+        "creator": LoadStrategies.JOINED,
+        "appeal_theme": LoadStrategies.JOINED,
+        "status": LoadStrategies.JOINED,
+        "executor": LoadStrategies.JOINED,
+        "deputy": LoadStrategies.JOINED,
+    }
+    detail_loading_plan: LoadingPlan = {
+        "status": LoadStrategies.JOINED,
+        "appeal_theme": LoadStrategies.JOINED,
+        "attachments": LoadStrategies.SELECTIN,
+        "*": LoadStrategies.RAISE,
+    }
 
     def __init__(self, db: AsyncSession):
         super().__init__(db=db)
 
-    async def get_all_ids_for_connect_employee(self, exclude_appeals_ids: List[int]) -> List[int]:
-        query = await self.exec_query(
-            self.select(UserAppeal.id)
-                .join(UserAppeal.status)
-                .where(UserAppeal.id.notin_(exclude_appeals_ids),
-                       AppealStatus.status_const.in_([AppealStatuses.MODERATION, AppealStatuses.CONSIDERATION])))
-        return query.scalars().fetchall()
-
     async def get_all(self) -> List[UserAppeal]:
         query = await self.exec_query(self.select(UserAppeal))
         return query.scalars().fetchall()
 
+    def apply_filters(self, query: Select, filters: Optional[UserAppealFilterData]) -> Select:
+        if not filters:
+            return query
+
+        if filters.status:
+            query = query.join(UserAppeal.status).where(AppealStatus.status_const == filters.status)
+        if filters.department_id is not None:
+            query = query.join(UserAppeal.appeal_theme).where(AppealTheme.department_id == filters.department_id)
+
+        columns = {
+            UserAppeal.appeal_theme_id: filters.appeal_theme_id,
+            UserAppeal.creator_id: filters.creator_id,
+            UserAppeal.executor_id: filters.executor_id,
+            UserAppeal.deputy_id: filters.deputy_id,
+            UserAppeal.is_hidden: filters.is_hidden,
+            UserAppeal.is_active: filters.is_active,
+        }
+        for column, value in columns.items():
+            if value is not None:
+                query = query.where(column == value)
+
+        if filters.created_from:
+            query = query.where(UserAppeal.created_at >= filters.created_from)
+        if filters.created_to:
+            query = query.where(UserAppeal.created_at <= filters.created_to)
+        return query
+
+    async def get_page(self, cursor: Optional[KeysetCursor],
+                       per_page: int,
+                       filters: Optional[UserAppealFilterData] = None) -> KeysetPageType:
+        query = self.apply_filters(self.select(UserAppeal), filters=filters)
+        return await self.paginate_keyset(query, cursor=cursor, per_page=per_page)
+
+    async def get_projected_page(self, cursor: Optional[KeysetCursor],
+                                 per_page: int,
+                                 filters: Optional[UserAppealFilterData] = None) -> KeysetPageType:
+        query = self.apply_filters(self.select_projection(UserAppealEntity, UserAppeal.created_at), filters=filters)
+        return await self.paginate_keyset(query, cursor=cursor, per_page=per_page, scalars=False)
+
+    def stream_projected(self, filters: Optional[UserAppealFilterData] = None,
+                         size: int = 1000) -> AsyncIterator[List[Row]]:
+        query = self.apply_filters(self.select_projection(UserAppealEntity, UserAppeal.created_at), filters=filters)
+        return self.stream_partitions(query.order_by(UserAppeal.id), size=size)
+
+    async def search(self, data: AppealSearchData,
+                     cursor: Optional[RankCursor],
+                     per_page: int,
+                     filters: Optional[UserAppealFilterData] = None) -> KeysetPageType:
+        """
+        Full text search over the generated `search_vector` column, most relevant first.
+        The GIN index narrows the matches, only they are ranked and paginated by `(rank, id)`.
+        """
+        ts_query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), data.q)
+        rank = func.ts_rank_cd(UserAppeal.search_vector, ts_query)
+        query = self.apply_filters(self.select_projection(UserAppealEntity, rank.label('rank')), filters=filters) \
+            .where(UserAppeal.search_vector.op('@@')(ts_query))
+        return await self.paginate_keyset(query, cursor=cursor, per_page=per_page, scalars=False,
+                                          keys=[rank, UserAppeal.id], cursor_type=RankCursor)
+
+    def select_located(self) -> Select:
+        return self.select(UserAppeal, func.ST_AsText(UserAppeal.locate)).where(UserAppeal.locate.isnot(None))
+
+    async def get_near(self, data: NearAppealsData,
+                       filters: Optional[UserAppealFilterData] = None) -> List[Tuple[UserAppeal, str]]:
+        location = func.geography(UserAppeal.locate)
+        center = func.ST_GeogFromText(data.center.to_wkt())
+        select_query = self.apply_filters(self.select_located(), filters=filters) \
+            .where(func.ST_DWithin(location, center, data.radius)) \
+            .order_by(func.ST_Distance(location, center)) \
+            .limit(data.limit)
+        query = await self.exec_query(select_query)
+        return query.fetchall()
+
+    async def get_in_bbox(self, data: BBoxAppealsData,
+                          filters: Optional[UserAppealFilterData] = None) -> List[Tuple[UserAppeal, str]]:
+        bbox = func.ST_MakeBox2D(func.ST_GeomFromText(data.south_west.to_wkt()),
+                                 func.ST_GeomFromText(data.north_east.to_wkt()))
+        select_query = self.apply_filters(self.select_located(), filters=filters) \
+            .where(UserAppeal.locate.intersects(bbox)) \
+            .limit(data.limit)
+        query = await self.exec_query(select_query)
+        return query.fetchall()
+
+    async def get_cluster_cells(self, data: BBoxData, cell_lat: float, cell_lng: float) -> List[Row]:
+        """
+        Counts appeals per `cell_lat x cell_lng` grid cell and status inside the bbox.
+        Cells are numbered from the (-90, -180) corner so the same cell has the same index for any bbox.
+        """
+        lng, lat = func.ST_X(UserAppeal.locate), func.ST_Y(UserAppeal.locate)
+        cell_x = func.floor((lng + 180) / cell_lng).label("cell_x")
+        cell_y = func.floor((lat + 90) / cell_lat).label("cell_y")
+        bbox = func.ST_MakeBox2D(func.ST_GeomFromText(data.south_west.to_wkt()),
+                                 func.ST_GeomFromText(data.north_east.to_wkt()))
+        select_query = self.select(cell_x, cell_y, AppealStatus.status_const,
+                                   func.count(UserAppeal.id).label("count"),
+                                   func.avg(lat).label("lat"),
+                                   func.avg(lng).label("lng")) \
+            .outerjoin(UserAppeal.status) \
+            .where(UserAppeal.locate.intersects(bbox)) \
+            .group_by(cell_x, cell_y, AppealStatus.status_const)
+        query = await self.exec_query(select_query)
+        return query.fetchall()
+
+    async def get_location(self, pk: int) -> Optional[Point]:
+        query = await self.exec_query(self.select(func.ST_AsText(UserAppeal.locate)).where(UserAppeal.id == pk))
+        locate_wkt = query.scalar()
+        return Point.from_pair(locate_wkt) if locate_wkt else None
+
+    @staticmethod
+    def _latest_json(select_query: Select, order_by: List, limit: Optional[int]):
+        latest = select_query.order_by(*[column.desc() for column in order_by]).limit(limit).subquery()
+        ordering = [latest.c[column.key].desc() for column in order_by]
+        aggregate = func.json_agg(aggregate_order_by(latest.table_valued(), *ordering))
+        return select(func.coalesce(aggregate, text("'[]'::json"), type_=JSON)).select_from(latest).scalar_subquery()
+
+    @staticmethod
+    def _count(model, *where):
+        return select(func.count(model.id)).where(*where).scalar_subquery()
+
+    async def get_detail_aggregates(self, pk: int, latest_count: int) -> Row:
+        """
+        History, chat and connected users of an appeal in one statement: counts plus the latest
+        `latest_count` history and chat entries aggregated into JSON arrays on the database side.
+        """
+        history_where = [AppealHistory.appeal_id == pk]
+        chat_where = [AppealChat.appeal_id == pk, AppealChat.is_hidden.isnot(True)]
+        history = select(AppealHistory.id, AppealHistory.created_at, AppealHistory.type, AppealHistory.comment,
+                         AppealHistory.creator_id, AppealHistory.connected_person_id, AppealHistory.meta,
+                         AppealHistory.is_private).where(*history_where)
+        chats = select(AppealChat.id, AppealChat.created_at, AppealChat.user_id, AppealChat.creator_id,
+                       AppealChat.message, AppealChat.is_public, AppealChat.parent).where(*chat_where)
+        users = select(AppealUser.id, AppealUser.created_at, AppealUser.employee_id, AppealUser.creator_id,
+                       AppealUser.comment, AppealUser.closed_date, AppealUser.is_private) \
+            .where(AppealUser.appeal_id == pk)
+
+        query = await self.exec_query(self.select(
+            self._count(AppealHistory, *history_where).label("history_count"),
+            self._latest_json(history, order_by=[AppealHistory.created_at, AppealHistory.id],
+                              limit=latest_count).label("history"),
+            self._count(AppealChat, *chat_where).label("chat_count"),
+            self._latest_json(chats, order_by=[AppealChat.created_at, AppealChat.id],
+                              limit=latest_count).label("chats"),
+            self._latest_json(users, order_by=[AppealUser.created_at, AppealUser.id], limit=None).label("users"),
+        ))
+        return query.one()
+
     async def get_count_all(self) -> int:
         query = await self.exec_query(func.count(UserAppeal.id))
         return query.scalar()
 
-    def get_relations(self) -> List[Subquery]:
-        return [subqueryload(UserAppeal.attachments)]
+    async def bulk_create(self, values: List[dict]) -> List[int]:
+        """
+        One multi-row `INSERT`, returns the ids in the order of `values`. `RETURNING` does not promise any order,
+        so the ids are drawn from the sequence first and given to the rows explicitly.
+        """
+        if not values:
+            return []
+        sequence = func.pg_get_serial_sequence(UserAppeal.__tablename__, UserAppeal.id.key)
+        query = await self.exec_query(select(func.nextval(sequence))
+                                      .select_from(func.generate_series(1, len(values))))
+        appeal_ids = query.scalars().fetchall()
+        await self.exec_query(insert(UserAppeal).values([{**row, "id": appeal_id}
+                                                         for row, appeal_id in zip(values, appeal_ids)]))
+        return appeal_ids
+
+    def get_relations(self) -> List[Load]:
+        return self.loader_options(self.relations_loading_plan)
 
     async def get_by_id(self, pk: int,
                         raise_exception: bool = False,
-                        fetch_relations: bool = False) -> Optional[UserAppeal]:
+                        fetch_relations: bool = False,
+                        loading_plan: Optional[LoadingPlan] = None) -> Optional[UserAppeal]:
         select_query: Select = self.select(UserAppeal).where(UserAppeal.id == pk)
-        if fetch_relations:
+        if loading_plan is not None:
+            select_query = select_query.options(*self.loader_options(loading_plan))
+        elif fetch_relations:
             select_query = select_query.options(*self.get_relations())
         query = await self.exec_query(select_query)
         user_appeal = query.scalars().first()
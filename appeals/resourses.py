@@ -1,7 +1,36 @@
+from typing import List
+
 from pydantic import BaseModel
 
-from appeals.entities import UserAppealEntity
+from appeals.entities import (
+    UserAppealEntity, UserAppealLocatedEntity, AppealClusterEntity, UserAppealDetailEntity, AppealStatsEntity,
+    AppealUploadEntity, AppealImportEntity,
+)
 
 
 class UserAppealOutResource(BaseModel):
     data: UserAppealEntity
+
+
+class UserAppealLocatedListOutResource(BaseModel):
+    data: List[UserAppealLocatedEntity]
+
+
+class AppealClusterListOutResource(BaseModel):
+    data: List[AppealClusterEntity]
+
+
+class UserAppealDetailOutResource(BaseModel):
+    data: UserAppealDetailEntity
+
+
+class AppealStatsListOutResource(BaseModel):
+    data: List[AppealStatsEntity]
+
+
+class AppealUploadOutResource(BaseModel):
+    data: AppealUploadEntity
+
+
+class AppealImportOutResource(BaseModel):
+    data: AppealImportEntity
@@ -0,0 +1,126 @@
+import os
+from collections import defaultdict
+from typing import List, Tuple, Dict
+
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from appeals.entities import AppealClusterEntity
+from appeals.repository.user_appeal_repository import IUserAppealRepository, UserAppealRepository
+from appeals.usecases.types import BBoxData, ClusterAppealsData
+from common.cache import TTLCache
+from common.errors import ValidationError
+from common.service import BaseService
+from postgis.point import Point
+
+GRID_SIZE = 8
+MAX_ZOOM = 18
+MAX_TILES = 256
+
+# Per process: `invalidate_point` only reaches the worker that handled the write, the others serve their tiles
+# until the TTL expires. Keep it as short as the staleness acceptable on the map.
+appeal_clusters_cache = TTLCache(maxsize=8192, ttl=int(os.environ.get("APPEAL_CLUSTERS_CACHE_TTL", 60)))
+
+Tile = Tuple[int, int]
+
+
+class ClusterGrid:
+    """
+    Splits the world into `2 ** zoom` x `2 ** zoom` lat/lng tiles and every tile into GRID_SIZE x GRID_SIZE cells.
+    Tiles are the caching unit, cells are the clustering unit.
+    """
+
+    def __init__(self, zoom: int):
+        self.zoom = zoom
+        self.tiles_count = 2 ** zoom
+        self.tile_lat = 180 / self.tiles_count
+        self.tile_lng = 360 / self.tiles_count
+        self.cell_lat = self.tile_lat / GRID_SIZE
+        self.cell_lng = self.tile_lng / GRID_SIZE
+
+    def tile_of(self, lat: float, lng: float) -> Tile:
+        return self._index(lng + 180, self.tile_lng), self._index(lat + 90, self.tile_lat)
+
+    def tile_of_cell(self, cell_x: float, cell_y: float) -> Tile:
+        last_cell = self.tiles_count * GRID_SIZE - 1
+        return min(int(cell_x), last_cell) // GRID_SIZE, min(int(cell_y), last_cell) // GRID_SIZE
+
+    def tiles_in(self, data: BBoxData) -> List[Tile]:
+        min_x, min_y = self.tile_of(lat=data.min_lat, lng=data.min_lng)
+        max_x, max_y = self.tile_of(lat=data.max_lat, lng=data.max_lng)
+        return [(x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+    def tiles_bbox(self, tiles: List[Tile]) -> BBoxData:
+        xs = [x for x, _ in tiles]
+        ys = [y for _, y in tiles]
+        return BBoxData(min_lat=min(ys) * self.tile_lat - 90,
+                        min_lng=min(xs) * self.tile_lng - 180,
+                        max_lat=(max(ys) + 1) * self.tile_lat - 90,
+                        max_lng=(max(xs) + 1) * self.tile_lng - 180)
+
+    def _index(self, offset: float, size: float) -> int:
+        return min(max(int(offset // size), 0), self.tiles_count - 1)
+
+
+class AppealClusterService(BaseService):
+    user_appeal_repos: IUserAppealRepository
+
+    def __init__(self, db: AsyncSession, cache: TTLCache = appeal_clusters_cache):
+        super().__init__(db)
+        self.cache = cache
+        self.user_appeal_repos = UserAppealRepository(db=self.db)
+
+    async def get_clusters(self, data: ClusterAppealsData) -> List[AppealClusterEntity]:
+        grid = ClusterGrid(zoom=data.zoom)
+        tiles = grid.tiles_in(data)
+        if len(tiles) > MAX_TILES:
+            raise ValidationError(detail={"zoom": f"Bbox covers more than {MAX_TILES} tiles on this zoom"})
+
+        clusters: Dict[Tile, List[AppealClusterEntity]] = {}
+        missing_tiles = []
+        for tile in tiles:
+            tile_clusters = self.cache.get((grid.zoom, *tile))
+            if tile_clusters is None:
+                missing_tiles.append(tile)
+            else:
+                clusters[tile] = tile_clusters
+
+        if missing_tiles:
+            clusters.update(await self._load_tiles(grid=grid, tiles=missing_tiles))
+
+        result = [cluster for tile in tiles for cluster in clusters[tile]]
+        if not data.with_statuses:
+            result = [cluster.copy(update={"statuses": None}) for cluster in result]
+        return result
+
+    def invalidate_point(self, point: Point):
+        for zoom in range(MAX_ZOOM + 1):
+            self.cache.delete((zoom, *ClusterGrid(zoom=zoom).tile_of(lat=point.lat, lng=point.lng)))
+
+    async def _load_tiles(self, grid: ClusterGrid, tiles: List[Tile]) -> Dict[Tile, List[AppealClusterEntity]]:
+        rows = await self.user_appeal_repos.get_cluster_cells(data=grid.tiles_bbox(tiles),
+                                                              cell_lat=grid.cell_lat,
+                                                              cell_lng=grid.cell_lng)
+        cells: Dict[Tuple[float, float], List[Row]] = defaultdict(list)
+        for row in rows:
+            cells[(row.cell_x, row.cell_y)].append(row)
+
+        loaded: Dict[Tile, List[AppealClusterEntity]] = {tile: [] for tile in tiles}
+        for (cell_x, cell_y), cell_rows in cells.items():
+            tile = grid.tile_of_cell(cell_x=cell_x, cell_y=cell_y)
+            if tile in loaded:
+                loaded[tile].append(self._build_cluster(cell_rows))
+
+        for tile, tile_clusters in loaded.items():
+            self.cache.set((grid.zoom, *tile), tile_clusters)
+        return loaded
+
+    @staticmethod
+    def _build_cluster(rows: List[Row]) -> AppealClusterEntity:
+        count = sum(row.count for row in rows)
+        return AppealClusterEntity(
+            lat=sum(row.lat * row.count for row in rows) / count,
+            lng=sum(row.lng * row.count for row in rows) / count,
+            count=count,
+            statuses={row.status_const.value: row.count for row in rows if row.status_const},
+        )
@@ -0,0 +1,61 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Any
+
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from appeals.repository.user_appeal_repository import IUserAppealRepository, UserAppealRepository
+from appeals.usecases.types import ExportFormats, UserAppealFilterData
+from common.service import BaseService
+
+
+class AppealExportService(BaseService):
+    PARTITION_SIZE = 1000
+    MEDIA_TYPES = {
+        ExportFormats.NDJSON: "application/x-ndjson",
+        ExportFormats.CSV: "text/csv",
+    }
+
+    user_appeal_repos: IUserAppealRepository
+
+    def __init__(self, db: AsyncSession):
+        super().__init__(db)
+        self.user_appeal_repos = UserAppealRepository(db=self.db)
+
+    async def export(self, export_format: ExportFormats,
+                     filters: Optional[UserAppealFilterData] = None) -> AsyncIterator[str]:
+        """Yields one encoded chunk per server-side cursor partition, memory use does not depend on table size."""
+        is_first = True
+        async for partition in self.user_appeal_repos.stream_projected(filters=filters, size=self.PARTITION_SIZE):
+            if export_format == ExportFormats.CSV:
+                yield self._to_csv(partition, with_header=is_first)
+            else:
+                yield self._to_ndjson(partition)
+            is_first = False
+
+    def _to_ndjson(self, rows: List[Row]) -> str:
+        return "".join(json.dumps(row._asdict(), default=self._json_default, ensure_ascii=False) + "\n" for row in rows)
+
+    def _to_csv(self, rows: List[Row], with_header: bool) -> str:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if with_header:
+            writer.writerow(rows[0].keys())
+        for row in rows:
+            writer.writerow([json.dumps(value) if isinstance(value, list) else self._serialize(value) for value in row])
+        return buffer.getvalue()
+
+    @staticmethod
+    def _serialize(value: Any) -> Any:
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    @staticmethod
+    def _json_default(value: Any) -> str:
+        if isinstance(value, datetime):
+            return value.isoformat()
+        raise TypeError(f"{type(value).__name__} is not JSON serializable")
@@ -0,0 +1,63 @@
+import csv
+import io
+import json
+from typing import List, Tuple, Iterator, Dict, Any, Union
+
+import pydantic
+
+from appeals.entities import AppealImportErrorEntity
+from appeals.usecases.types import ExportFormats, AppealImportRowData
+from common.errors import ValidationError
+from common.storage import MB
+
+ParsedRows = Tuple[List[Tuple[int, AppealImportRowData]], List[AppealImportErrorEntity]]
+
+
+class AppealImportService:
+    """Parses a CSV (with a header) or NDJSON import into valid rows and per-row errors, rows are numbered from 1."""
+    MAX_ROWS = 20_000
+    MAX_BYTES = 20 * MB
+
+    def parse(self, content: bytes, import_format: ExportFormats) -> ParsedRows:
+        """`content` longer than `MAX_BYTES` is rejected before decoding, read at most `MAX_BYTES + 1` of the file."""
+        if len(content) > self.MAX_BYTES:
+            raise ValidationError(detail={"file": f"Import is limited to {self.MAX_BYTES // MB} MB"})
+        try:
+            text = content.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise ValidationError(detail={"file": "File must be UTF-8 encoded"})
+
+        records = self._csv_records(text) if import_format == ExportFormats.CSV else self._ndjson_records(text)
+        rows, errors = [], []
+        for row_number, record in enumerate(records, start=1):
+            if row_number > self.MAX_ROWS:
+                raise ValidationError(detail={"file": f"Import is limited to {self.MAX_ROWS} rows"})
+            if isinstance(record, str):
+                errors.append(AppealImportErrorEntity(row=row_number, errors={"row": record}))
+                continue
+            try:
+                rows.append((row_number, AppealImportRowData(**record)))
+            except pydantic.ValidationError as e:
+                errors.append(AppealImportErrorEntity(row=row_number, errors={
+                    ".".join(map(str, error["loc"])): error["msg"] for error in e.errors()
+                }))
+
+        return rows, errors
+
+    @staticmethod
+    def _csv_records(text: str) -> Iterator[Dict[str, Any]]:
+        for record in csv.DictReader(io.StringIO(text)):
+            yield {key: value or None for key, value in record.items() if key}
+
+    @staticmethod
+    def _ndjson_records(text: str) -> Iterator[Union[Dict[str, Any], str]]:
+        """Yields the decoded objects, or the error message for a line which is not one."""
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield f"Invalid JSON: {e}"
+                continue
+            yield record if isinstance(record, dict) else "Row must be a JSON object"
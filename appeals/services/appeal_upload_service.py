@@ -0,0 +1,144 @@
+import fcntl
+import os
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import List, AsyncIterator
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from appeals.models import AppealUpload
+from appeals.repository.appeal_upload_repository import IAppealUploadRepository, AppealUploadRepository
+from appeals.usecases.types import AppealUploadData
+from common.errors import ValidationError
+from common.service import BaseService, FileFormatService
+from common.storage import MB
+from common.types import UploadedFileType
+from grazhdane import config
+from users.models import User
+
+
+class AppealUploadService(BaseService):
+    """
+    tus-like resumable uploads. The client declares the file, sends it in chunks each starting at the current
+    offset and, once complete, references the upload token instead of sending the file with the appeal.
+    Chunks are appended to `UPLOADS_ROOT/<token>`, a retry only resends what the server did not get.
+    """
+    TTL = timedelta(hours=24)
+    upload_repos: IAppealUploadRepository
+
+    def __init__(self, db: AsyncSession):
+        super().__init__(db)
+        self.upload_repos = AppealUploadRepository(db=self.db)
+
+    @staticmethod
+    def path_of(upload: AppealUpload) -> str:
+        return os.path.join(config.UPLOADS_ROOT, upload.token)
+
+    async def create(self, user: User, data: AppealUploadData) -> AppealUpload:
+        file_service = FileFormatService()
+        max_size = file_service.get_max_size(file_service.get_file_type(data.filename.split(".")[-1]))
+        if data.size > max_size:
+            raise ValidationError(detail={"size": f"{data.filename} exceeds {max_size // MB} MB"})
+
+        upload = AppealUpload(token=str(uuid.uuid4()), creator_id=user.id, filename=data.filename, size=data.size,
+                              offset=0, expires_at=datetime.utcnow() + self.TTL)
+        await run_in_threadpool(os.makedirs, config.UPLOADS_ROOT, exist_ok=True)
+        async with aiofiles.open(self.path_of(upload), mode='wb'):
+            pass
+
+        self.db.add(upload)
+        await self.db.commit()
+        return upload
+
+    async def append(self, token: str, user: User, offset: int, chunks: AsyncIterator[bytes]) -> AppealUpload:
+        """
+        Appends a chunk at `offset`, which must be the offset the server has. The chunk is written with no
+        transaction open, under an exclusive lock of the upload file: a concurrent append of the same upload gets
+        a 409. The offset is then advanced only from the value the write started at, bytes received before
+        a dropped connection are kept and counted.
+        """
+        upload = await self.upload_repos.get_by_token(token=token, creator_id=user.id)
+        await self.db.commit()
+
+        async with aiofiles.open(self.path_of(upload), mode='r+b') as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise HTTPException(status_code=409, detail="Another chunk of the upload is being written")
+
+            # The offset may have moved before the lock was taken.
+            upload = await self.upload_repos.get_by_token(token=token, creator_id=user.id)
+            await self.db.commit()
+            if offset != upload.offset:
+                raise HTTPException(status_code=409, detail=f"Upload offset is {upload.offset}",
+                                    headers={"Upload-Offset": str(upload.offset)})
+
+            start_offset = upload.offset
+            advanced = True
+            try:
+                # Bytes written past the committed offset by an interrupted request are dropped.
+                await f.truncate(start_offset)
+                await f.seek(start_offset)
+                async for chunk in chunks:
+                    if upload.offset + len(chunk) > upload.size:
+                        raise HTTPException(status_code=413, detail="Chunk exceeds the declared upload size")
+                    await f.write(chunk)
+                    upload.offset += len(chunk)
+            finally:
+                if upload.offset != start_offset:
+                    await f.flush()
+                    advanced = await self.upload_repos.advance_offset(token=token, offset=start_offset,
+                                                                      new_offset=upload.offset)
+                    await self.db.commit()
+        if not advanced:
+            raise HTTPException(status_code=404, detail=f"Undefined upload {token}")
+        return upload
+
+    async def discard(self, uploads: List[AppealUpload]):
+        for upload in uploads:
+            await self.db.delete(upload)
+        await self.db.commit()
+        await self.remove_files([upload.token for upload in uploads])
+
+    @staticmethod
+    async def remove_files(tokens: List[str]):
+        for token in tokens:
+            try:
+                await aiofiles.os.remove(os.path.join(config.UPLOADS_ROOT, token))
+            except FileNotFoundError:
+                pass
+
+    @asynccontextmanager
+    async def use(self, tokens: List[str], user: User) -> AsyncIterator[List[UploadedFileType]]:
+        """
+        Finished uploads as `UploadedFileType`, for the appeal use cases to store like inline files.
+        The upload rows are locked and deleted in the transaction the block commits, so a concurrent appeal
+        waits and then finds them gone instead of using them too. When the block fails the deletion is rolled
+        back with it and the appeal can be retried with the uploads, their files are removed only on success.
+        """
+        uploads = await self.upload_repos.get_completed(tokens=tokens, creator_id=user.id, for_update=True)
+        files = []
+        try:
+            for upload in uploads:
+                file = await run_in_threadpool(open, self.path_of(upload), 'rb')
+                files.append(UploadedFileType(filename=upload.filename, file=file))
+            for upload in uploads:
+                await self.db.delete(upload)
+            await self.db.flush()
+            yield files
+        finally:
+            for uploaded_file in files:
+                await run_in_threadpool(uploaded_file.file.close)
+
+        await self.remove_files([upload.token for upload in uploads])
+
+    async def purge_expired(self) -> int:
+        tokens = await self.upload_repos.delete_expired()
+        await self.db.commit()
+        await self.remove_files(tokens)
+        return len(tokens)
@@ -1,24 +1,158 @@
-from typing import List
+import asyncio
+import logging
+import os
+from typing import List, Optional, Type, Iterable, Dict
+
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from appeals.models import UserAppeal, UserAppealAttachment
-from common.service import BaseService, AttachmentStorage
+from appeals.repository.appeal_attachment_repository import IAppealAttachmentRepository, AppealAttachmentRepository
+from common.images import make_variants, variant_name, IMAGE_VARIANTS, THUMBNAIL_VARIANT, PREVIEW_VARIANT
+from common.service import BaseService, AttachmentStorage, ContentAddressedStorage, FileFormatService
+from common.storage import StorageBackend, get_storage_backend
 from common.types import UploadedFileType
+from users.repository.attachment_repository import IAttachmentRepository, AttachmentRepository
+
+logger = logging.getLogger(__name__)
 
 
 class UserAppealService(BaseService):
-    async def store_appeal_attachments(self, user_appeal: UserAppeal, files: List[UploadedFileType]):
-        file_attachments = []
-        for file in files:
-            attachments_storage = AttachmentStorage(file=file.file, filename=file.filename,
-                                                    dir_name='appeals')
-            link = await attachments_storage.store()
+    STORE_CONCURRENCY = int(os.environ.get("ATTACHMENTS_STORE_CONCURRENCY", 4))
+    CONTENT_ADDRESSED = os.environ.get("ATTACHMENTS_CONTENT_ADDRESSED", "true").lower() in ("1", "true")
+    appeal_attachment_repos: IAppealAttachmentRepository
+    attachment_repos: IAttachmentRepository
+
+    def __init__(self, db: AsyncSession, store_concurrency: Optional[int] = None):
+        super().__init__(db)
+        self.store_concurrency = store_concurrency or self.STORE_CONCURRENCY
+        self.appeal_attachment_repos = AppealAttachmentRepository(db=self.db)
+        self.attachment_repos = AttachmentRepository(db=self.db)
+
+    @property
+    def storage_class(self) -> Type[AttachmentStorage]:
+        return ContentAddressedStorage if self.CONTENT_ADDRESSED else AttachmentStorage
+
+    async def _store_files(self, storages: List[AttachmentStorage]) -> List[str]:
+        """
+        Writes the files concurrently, at most `store_concurrency` at a time.
+        Every write is awaited before failing, so files already written can be removed and none are left behind.
+        """
+        semaphore = asyncio.Semaphore(self.store_concurrency)
+
+        async def hash_blob(storage: ContentAddressedStorage) -> List[str]:
+            async with semaphore:
+                name = await storage.hash()
+            return [storage.backend.url(name)] + [storage.backend.url(variant_name(name, variant))
+                                                  for variant in IMAGE_VARIANTS]
+
+        async def store(storage: AttachmentStorage) -> str:
+            async with semaphore:
+                return await storage.store()
+
+        blobs = [storage for storage in storages if isinstance(storage, ContentAddressedStorage)]
+        if blobs:
+            # A blob may already exist and be reused. Locked until commit, so `release` and the storage GC
+            # wait for the attachment rows instead of deleting the blob or its variants under them.
+            links = await asyncio.gather(*[hash_blob(storage) for storage in blobs])
+            await self.attachment_repos.lock_links(link for blob_links in links for link in blob_links)
+
+        results = await asyncio.gather(*[store(storage) for storage in storages], return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            await asyncio.gather(*[storage.remove() for storage in storages], return_exceptions=True)
+            raise errors[0]
 
+        return results
+
+    async def _render_variants(self, link: str, backend: StorageBackend,
+                               semaphore: asyncio.Semaphore) -> Optional[Dict[str, bytes]]:
+        """The variants of the image at `link` it does not have yet, `None` when it can not be rendered."""
+        name = backend.name_of(link)
+        if not name:
+            return None
+        async with semaphore:
+            missing = [variant for variant in IMAGE_VARIANTS if not await backend.exists(variant_name(name, variant))]
+            if not missing:
+                return {}
+            rendered = await make_variants(await backend.read(name), variants=missing)
+        return rendered or None
+
+    async def make_variants(self, attachment_ids: Iterable[int], backend: Optional[StorageBackend] = None) -> int:
+        """
+        Renders thumbnails and previews of image attachments and links them, returns the number linked.
+        Runs after the commit creating the attachments, see `appeals.jobs.make_attachment_variants`.
+        At most `store_concurrency` originals are read and rendered at once, no transaction is open meanwhile.
+        Every attachment is then linked in a short transaction of its own, holding the locks of its links like
+        `_store_files`, so `release` and the storage GC do not delete the variants before they are linked.
+        An attachment deleted meanwhile, or whose image fails to render, keeps no variants.
+        """
+        backend = backend or get_storage_backend()
+        links = await self.appeal_attachment_repos.get_links(attachment_ids)
+        await self.db.commit()
+
+        semaphore = asyncio.Semaphore(self.store_concurrency)
+        results = await asyncio.gather(*[self._render_variants(link, backend=backend, semaphore=semaphore)
+                                         for link in links.values()], return_exceptions=True)
+
+        linked = 0
+        for (attachment_id, link), rendered in zip(links.items(), results):
+            if isinstance(rendered, BaseException):
+                logger.warning("Could not render the variants of attachment %s: %s", attachment_id, rendered)
+                continue
+            if rendered is None:
+                continue
+
+            names = {variant: variant_name(backend.name_of(link), variant) for variant in IMAGE_VARIANTS}
+            try:
+                await self.attachment_repos.lock_links([link] + [backend.url(name) for name in names.values()])
+                if await self.appeal_attachment_repos.set_variant_links(
+                        attachment_id=attachment_id, link=link,
+                        thumbnail_link=backend.url(names[THUMBNAIL_VARIANT]),
+                        preview_link=backend.url(names[PREVIEW_VARIANT])):
+                    for variant, content in rendered.items():
+                        await backend.save(names[variant], content)
+                    # Variants found earlier may have been collected as garbage before the lock was taken.
+                    if all([await backend.exists(name) for name in names.values()]):
+                        await self.db.commit()
+                        linked += 1
+                        continue
+                await self.db.rollback()
+            except Exception as e:
+                await self.db.rollback()
+                logger.warning("Could not store the variants of attachment %s: %s", attachment_id, e)
+        return linked
+
+    async def store_appeal_attachments(self, user_appeal: UserAppeal, files: List[UploadedFileType]) -> List[int]:
+        """Stores the files and adds their attachments, returns the ids of the images to pass to `make_variants`."""
+        storages = [self.storage_class(file=file.file, filename=file.filename, dir_name='appeals') for file in files]
+        links = await self._store_files(storages)
+
+        file_attachments = []
+        for attachments_storage, link in zip(storages, links):
             new_attachment = UserAppealAttachment()
             new_attachment.user_appeal = user_appeal
             new_attachment.link = link
+            new_attachment.checksum = attachments_storage.checksum
             new_attachment.meta = attachments_storage.file_type
             new_attachment.creator = user_appeal.creator
             new_attachment.name = attachments_storage.filename
             file_attachments.append(new_attachment)
         self.db.add_all(file_attachments)
         await self.db.flush()
+        return [attachment.id for attachment, storage in zip(file_attachments, storages)
+                if storage.file_type == FileFormatService.IMAGE_FORMAT]
+
+    async def release_files(self, links: Iterable[str], backend: Optional[StorageBackend] = None) -> int:
+        """
+        Removes the files of deleted attachments once nothing links to them, call after commit.
+        Runs in its own transaction: the links are locked before the check, so an upload reusing a blob and not
+        committed yet is waited for, and the transaction is committed once the files are gone.
+        """
+        links = set(links)
+        if not links:
+            return 0
+        await self.attachment_repos.lock_links(links)
+        referenced_links = await self.appeal_attachment_repos.get_referenced_links(links)
+        removed = await AttachmentStorage.release(links, referenced_links=referenced_links, backend=backend)
+        await self.db.commit()
+        return removed
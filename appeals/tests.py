@@ -1,18 +1,55 @@
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
 import os
 import pytest
 import random
+import socket
+import uuid
+from PIL import Image
 from faker import Faker
+from httpx import AsyncClient
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from appeals.models import AppealHistoryTypes
+from appeals.entities import UserAppealEntity
+from appeals.models import AppealHistoryTypes, AppealHistory, AppealStatus, AppealStatuses, UserAppeal
+from appeals.repository.appeal_attachment_repository import AppealAttachmentRepository
 from appeals.repository.appeal_history_repository import AppealHistoryRepository
+from appeals.repository.appeal_stat_repository import AppealStatRepository
+from appeals.repository.appeal_status_repository import AppealStatusRepository
 from appeals.repository.appeal_user_repository import AppealUserRepository
 from appeals.repository.user_appeal_repository import UserAppealRepository
 from appeals.seeds import AppealThemeSeeder, UserAppealSeeder
-from appeals.usecases.types import UserAppealData, MoveAppealToWorkData
-from appeals.usecases.usecases import CreateUserAppealUC, MoveAppealToWorkUC
+from appeals.services.appeal_cluster_service import AppealClusterService
+from appeals.services.appeal_export_service import AppealExportService
+from appeals.services.appeal_import_service import AppealImportService
+from appeals.services.appeal_upload_service import AppealUploadService
+from appeals.services.user_appeal_service import UserAppealService
+from appeals.usecases.types import (
+    UserAppealData, MoveAppealToWorkData, UserAppealFilterData, NearAppealsData, BBoxAppealsData,
+    ClusterAppealsData, ExportFormats, AppealStatsData, StatsDimensions, AppealSearchData, AppealUploadData,
+)
+from appeals.usecases.usecases import (
+    CreateUserAppealUC, UpdateUserAppealUC, MoveAppealToWorkUC, ReconcileAppealStatsUC,
+)
+from common.cache import TTLCache
+from conftest import authorize_client
+from common.errors import ValidationError
+from common import images
+from common.images import IMAGE_VARIANTS, THUMBNAIL_VARIANT, PREVIEW_VARIANT, variant_name, make_variants
+from common.repository import LoadStrategies
+from common.service import AttachmentStorage, FileFormatService, ContentAddressedStorage
+from common import storage as storage_module
+from common.storage import LocalStorageBackend, S3StorageBackend, get_storage_backend
 from common.types import UploadedFileType
 from grazhdane import config
+from grazhdane.database import async_session
+from postgis.point import Point
+from users.models import Attachment
 from users.seeds import UserSeeder
 
 pytestmark = pytest.mark.asyncio
@@ -57,6 +94,326 @@ async def test_create_user_appeal_uc(db: AsyncSession):
         assert len(appeal_users) == 1
 
 
+async def test_attachment_storage_chunked_store(monkeypatch, tmp_path):
+    backend = LocalStorageBackend(root=str(tmp_path))
+    monkeypatch.setattr(AttachmentStorage, "CHUNK_SIZE", 1024)
+    path = os.path.join(config.MEDIA_ROOT, 'testfile.jpeg')
+    with open(path, mode='rb') as f:
+        content = f.read()
+        f.seek(0)
+        storage = AttachmentStorage(file=f, filename="testfile.jpeg", dir_name='appeals', backend=backend)
+        link = await storage.store()
+
+    with open(backend.local_path(backend.name_of(link)), mode='rb') as f:
+        assert f.read() == content
+    assert storage.size == len(content)
+    assert storage.checksum == hashlib.sha256(content).hexdigest()
+
+    monkeypatch.setitem(FileFormatService.MAX_SIZES, FileFormatService.IMAGE_FORMAT, len(content) - 1)
+    with open(path, mode='rb') as f, pytest.raises(ValidationError):
+        await AttachmentStorage(file=f, filename="testfile.jpeg", dir_name='appeals', backend=backend).store()
+    assert os.listdir(tmp_path / 'appeals') == [storage.name.split('/')[-1]]
+
+
+async def test_appeal_attachments_concurrent_store_cleanup(monkeypatch, tmp_path):
+    backend = LocalStorageBackend(root=str(tmp_path))
+    monkeypatch.setitem(FileFormatService.MAX_SIZES, FileFormatService.DOCUMENT_FORMAT, 1)
+
+    files = [(f"file_{i}.jpeg", io.BytesIO(b"image")) for i in range(5)] + [("file.pdf", io.BytesIO(b"document"))]
+    storages = [AttachmentStorage(file=f, filename=filename, dir_name='appeals', backend=backend)
+                for filename, f in files]
+
+    with pytest.raises(ValidationError):
+        await UserAppealService(db=None, store_concurrency=2)._store_files(storages)
+    assert os.listdir(tmp_path / 'appeals') == []
+
+
+async def test_content_addressed_storage_dedup(tmp_path):
+    backend = LocalStorageBackend(root=str(tmp_path))
+    with open(os.path.join(config.MEDIA_ROOT, 'testfile.jpeg'), mode='rb') as f:
+        first = ContentAddressedStorage(file=f, filename="testfile.jpeg", backend=backend)
+        link = await first.store()
+        f.seek(0)
+        second = ContentAddressedStorage(file=f, filename="copy.jpeg", backend=backend)
+        assert await second.store() == link
+
+    path = backend.local_path(first.name)
+    assert first.checksum == second.checksum
+    assert os.path.basename(path).startswith(first.checksum)
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+
+    assert await ContentAddressedStorage.release([link], referenced_links={link}, backend=backend) == 0
+    assert os.path.exists(path)
+    assert await ContentAddressedStorage.release([link], referenced_links=set(), backend=backend) == 1
+    assert not os.path.exists(path)
+
+
+async def test_release_waits_for_blob_reuse(db: AsyncSession, tmp_path):
+    backend = LocalStorageBackend(root=str(tmp_path), base_url=f"/cas-{uuid.uuid4().hex}/")
+    content = uuid.uuid4().bytes
+    orphan = ContentAddressedStorage(file=io.BytesIO(content), filename="orphan.pdf", backend=backend)
+    link = await orphan.store()
+    user = await UserSeeder(db=db).seed()
+    db.add(user)
+    await db.commit()
+
+    async with async_session() as uploading, async_session() as releasing:
+        storage = ContentAddressedStorage(file=io.BytesIO(content), filename="upload.pdf", backend=backend)
+        assert await UserAppealService(db=uploading)._store_files([storage]) == [link]
+
+        release = asyncio.create_task(UserAppealService(db=releasing).release_files([link], backend=backend))
+        await asyncio.sleep(0.5)
+        assert not release.done()
+
+        uploading.add(Attachment(link=link, checksum=storage.checksum, creator_id=user.id))
+        await uploading.commit()
+        assert await release == 0
+    assert await backend.exists(orphan.name)
+
+
+async def test_appeal_attachment_image_variants(db: AsyncSession, monkeypatch, tmp_path):
+    backend = LocalStorageBackend(root=str(tmp_path), base_url=f"/variants-{uuid.uuid4().hex}/")
+    monkeypatch.setattr(storage_module, "_backend", backend)
+    user = await UserSeeder(db=db).seed()
+    appeal_theme = await AppealThemeSeeder(db=db).random_or_seed()
+    db.add_all([user, appeal_theme])
+    await db.commit()
+
+    data = UserAppealData(appeal_theme_id=appeal_theme.id, problem_body="problem", address="address",
+                          locate=(55.75, 37.61), is_active=True)
+    with open(os.path.join(config.MEDIA_ROOT, 'testfile.jpeg'), mode='rb') as f:
+        usecase = CreateUserAppealUC(db=db, ctx_user=user, data=data, files=[
+            UploadedFileType(filename="testfile.jpeg", file=f),
+            UploadedFileType(filename="testfile.pdf", file=io.BytesIO(b"document")),
+        ])
+        await usecase.exec()
+    attachment_id, = usecase.variant_attachment_ids
+
+    async with async_session() as session:
+        assert await UserAppealService(db=session).make_variants([attachment_id]) == 1
+        attachment = await session.get(Attachment, attachment_id)
+    name = backend.name_of(attachment.link)
+    assert attachment.thumbnail_link == backend.url(variant_name(name, THUMBNAIL_VARIANT))
+    assert attachment.preview_link == backend.url(variant_name(name, PREVIEW_VARIANT))
+    for variant, size in IMAGE_VARIANTS.items():
+        with Image.open(backend.local_path(variant_name(name, variant))) as image:
+            assert image.width <= size[0] and image.height <= size[1]
+
+    await ContentAddressedStorage.release([attachment.link], referenced_links=set(), backend=backend)
+    assert not any(os.path.exists(backend.local_path(variant_name(name, variant))) for variant in IMAGE_VARIANTS)
+
+
+async def test_image_variants_survive_broken_pool():
+    with open(os.path.join(config.MEDIA_ROOT, 'testfile.jpeg'), mode='rb') as f:
+        data = f.read()
+    assert await make_variants(data)
+
+    executor = images.get_executor()
+    for process in list(executor._processes.values()):
+        process.kill()
+    assert await make_variants(data) == {}
+    assert images.get_executor() is not executor
+    assert set(await make_variants(data)) == set(IMAGE_VARIANTS)
+
+
+async def test_s3_storage_backend_single_client(monkeypatch):
+    created = []
+
+    class Session:
+        @contextlib.asynccontextmanager
+        async def create_client(self, *args, **kwargs):
+            await asyncio.sleep(0.01)
+            created.append(object())
+            yield created[-1]
+
+    monkeypatch.setattr(storage_module, "get_session", Session)
+    backend = S3StorageBackend(bucket="grazhdane")
+    clients = await asyncio.gather(*[backend._get_client() for _ in range(4)])
+    assert len(created) == 1
+    assert all(client is created[0] for client in clients)
+    await backend.close()
+
+
+async def test_s3_storage_backend_multipart(monkeypatch):
+    moto_server = pytest.importorskip("moto.server")
+    with socket.socket() as free_socket:
+        free_socket.bind(("127.0.0.1", 0))
+        host, port = free_socket.getsockname()
+    server = moto_server.ThreadedMotoServer(ip_address=host, port=port, verbose=False)
+    server.start()
+    try:
+        backend = S3StorageBackend(bucket="grazhdane", endpoint_url=f"http://{host}:{port}", region="us-east-1",
+                                   access_key="testing", secret_key="testing")
+        monkeypatch.setattr(S3StorageBackend, "PART_SIZE", 5 * 1024 * 1024)
+        client = await backend._get_client()
+        await client.create_bucket(Bucket="grazhdane")
+
+        chunks = [os.urandom(1024 * 1024) for _ in range(11)]
+
+        async def content():
+            for chunk in chunks:
+                yield chunk
+
+        assert await backend.save("appeals/video.mp4", content()) == 11 * 1024 * 1024
+        stored = await client.get_object(Bucket="grazhdane", Key="appeals/video.mp4")
+        assert await stored["Body"].read() == b"".join(chunks)
+        assert stored["ETag"].strip('"').endswith("-3")
+
+        await backend.save("avatars/small.png", b"avatar")
+        assert await backend.exists("avatars/small.png")
+        assert await backend.read("avatars/small.png") == b"avatar"
+        assert backend.name_of(backend.url("avatars/small.png")) == "avatars/small.png"
+        await backend.delete("avatars/small.png")
+        assert not await backend.exists("avatars/small.png")
+        await backend.close()
+    finally:
+        server.stop()
+
+
+async def test_storage_download(async_client: AsyncClient):
+    backend = get_storage_backend()
+    content = os.urandom(4096)
+    name = f"appeals/{uuid.uuid4()}.mp4"
+    await backend.save(name, content)
+    link = backend.url(name)
+    try:
+        response = await async_client.get(link)
+        assert response.status_code == 200
+        assert response.content == content
+        assert response.headers["accept-ranges"] == "bytes"
+        assert "immutable" in response.headers["cache-control"]
+        etag = response.headers["etag"]
+
+        response = await async_client.get(link, headers={"Range": "bytes=100-199"})
+        assert response.status_code == 206
+        assert response.content == content[100:200]
+        assert response.headers["content-range"] == f"bytes 100-199/{len(content)}"
+
+        response = await async_client.get(link, headers={"Range": "bytes=-10", "If-Range": etag})
+        assert response.status_code == 206 and response.content == content[-10:]
+
+        response = await async_client.get(link, headers={"If-None-Match": etag})
+        assert response.status_code == 304 and not response.content
+
+        response = await async_client.get(link, headers={"Range": f"bytes={len(content)}-"})
+        assert response.status_code == 416
+
+        assert (await async_client.get(config.STORAGE_URL + "../testfile.jpeg")).status_code == 404
+    finally:
+        await backend.delete(name)
+
+
+async def test_resumable_upload_attached_to_appeal(db: AsyncSession, async_client: AsyncClient):
+    user = await UserSeeder(db=db).seed()
+    appeal_theme = await AppealThemeSeeder(db=db).random_or_seed()
+    db.add_all([user, appeal_theme])
+    await db.commit()
+    authorize_client(db=db, client=async_client, user=user)
+
+    with open(os.path.join(config.MEDIA_ROOT, 'testfile.jpeg'), mode='rb') as f:
+        content = f.read()
+    response = await async_client.post("/appeals/uploads/", json={"filename": "video.jpeg", "size": len(content)})
+    assert response.status_code == 201
+    location = response.headers["location"]
+    token = response.json()["data"]["token"]
+
+    half = len(content) // 2
+    response = await async_client.patch(location, content=content[:half], headers={"Upload-Offset": "0"})
+    assert response.status_code == 204 and response.headers["upload-offset"] == str(half)
+
+    response = await async_client.patch(location, content=content[half:], headers={"Upload-Offset": "0"})
+    assert response.status_code == 409
+
+    response = await async_client.head(location)
+    assert response.headers["upload-offset"] == str(half)
+
+    response = await async_client.patch(location, content=content[half:], headers={"Upload-Offset": str(half)})
+    assert response.headers["upload-offset"] == str(len(content))
+
+    faker = Faker()
+    response = await async_client.post("/appeals/", data={
+        "appeal_theme_id": appeal_theme.id,
+        "address": faker.address(),
+        "locate": "55.75,37.61",
+        "is_active": True,
+        "problem_body": faker.sentence(),
+        "uploads": [token],
+    })
+    assert response.status_code == 200
+    appeal = await UserAppealRepository(db=db).get_by_id(pk=response.json()["data"]["id"], fetch_relations=True)
+    assert [attachment.checksum for attachment in appeal.attachments] == [hashlib.sha256(content).hexdigest()]
+    assert (await async_client.head(location)).status_code == 404
+
+
+async def test_resumable_upload_used_once(db: AsyncSession):
+    user = await UserSeeder(db=db).seed()
+    db.add(user)
+    await db.commit()
+
+    async def chunks():
+        yield b"document"
+
+    service = AppealUploadService(db=db)
+    upload = await service.create(user=user, data=AppealUploadData(filename="file.pdf", size=8))
+    assert (await service.append(token=upload.token, user=user, offset=0, chunks=chunks())).is_complete
+
+    async def use_again(session: AsyncSession):
+        async with AppealUploadService(db=session).use(tokens=[upload.token], user=user):
+            pass
+
+    async with async_session() as first, async_session() as second:
+        async with AppealUploadService(db=first).use(tokens=[upload.token], user=user) as files:
+            assert len(files) == 1
+            second_use = asyncio.create_task(use_again(second))
+            await asyncio.sleep(0.5)
+            assert not second_use.done()
+            await first.commit()
+        with pytest.raises(ValidationError):
+            await second_use
+
+
+async def test_update_user_appeal_attachments_diff(db: AsyncSession, monkeypatch):
+    user = await UserSeeder(db=db).seed()
+    appeal_theme = await AppealThemeSeeder(db=db).random_or_seed()
+    db.add_all([user, appeal_theme])
+    await db.commit()
+
+    faker = Faker()
+    data = UserAppealData(appeal_theme_id=appeal_theme.id, problem_body=faker.sentence(), address=faker.address(),
+                          locate=faker.latlng(), is_active=True)
+    with open(os.path.join(config.MEDIA_ROOT, 'testfile.jpeg'), mode='rb') as f:
+        files = [UploadedFileType(filename="testfile.jpeg", file=f),
+                 UploadedFileType(filename=f"{uuid.uuid4()}.pdf", file=io.BytesIO(os.urandom(64)))]
+        appeal = await CreateUserAppealUC(db=db, ctx_user=user, data=data, files=files).exec()
+
+    repository = UserAppealRepository(db=db)
+    appeal = await repository.get_by_id(pk=appeal.id, fetch_relations=True)
+    kept, dropped = sorted(appeal.attachments, key=lambda attachment: attachment.meta != "image")
+    backend = get_storage_backend()
+
+    data.attachment_ids = [kept.id]
+    await UpdateUserAppealUC(db=db, user_appeal=appeal, data=data, files=[]).exec()
+    assert await AppealAttachmentRepository(db=db).get_ids_by_appeal_id(appeal_id=appeal.id) == [kept.id]
+    assert not await backend.exists(backend.name_of(dropped.link))
+
+    async def no_file_io(*args, **kwargs):
+        raise AssertionError("text only edit touched storage")
+
+    for method in ("save", "exists", "delete"):
+        monkeypatch.setattr(type(backend), method, no_file_io)
+    data.problem_body = faker.sentence()
+    await UpdateUserAppealUC(db=db, user_appeal=appeal, data=data, files=[]).exec()
+    assert await AppealAttachmentRepository(db=db).get_ids_by_appeal_id(appeal_id=appeal.id) == [kept.id]
+    monkeypatch.undo()
+
+    # Without `attachment_ids` the files sent replace all attachments, as before the diff.
+    data.attachment_ids = None
+    files = [UploadedFileType(filename=f"{uuid.uuid4()}.pdf", file=io.BytesIO(os.urandom(64)))]
+    await UpdateUserAppealUC(db=db, user_appeal=appeal, data=data, files=files).exec()
+    attachment_ids = await AppealAttachmentRepository(db=db).get_ids_by_appeal_id(appeal_id=appeal.id)
+    assert len(attachment_ids) == 1 and kept.id not in attachment_ids
+
+
 async def test_move_appeal_to_work_uc(db: AsyncSession):
     appeal = await UserAppealSeeder(db).random_or_seed()
     appeal_theme = await AppealThemeSeeder(db).random_or_seed()
@@ -74,3 +431,251 @@ async def test_move_appeal_to_work_uc(db: AsyncSession):
     await usecase.exec()
 
     assert False
+
+
+async def test_user_appeals_keyset_page(db: AsyncSession):
+    appeals = [await UserAppealSeeder(db).seed() for _ in range(3)]
+    db.add_all(appeals)
+    await db.commit()
+
+    repository = UserAppealRepository(db=db)
+    first_page = await repository.get_page(cursor=None, per_page=2)
+    assert len(first_page.items) == 2
+    assert first_page.next_cursor
+    assert first_page.prev_cursor is None
+
+    second_page = await repository.get_page(cursor=first_page.next_cursor, per_page=2)
+    assert not {appeal.id for appeal in first_page.items} & {appeal.id for appeal in second_page.items}
+    assert second_page.prev_cursor
+
+    prev_page = await repository.get_page(cursor=second_page.prev_cursor, per_page=2)
+    assert [appeal.id for appeal in prev_page.items] == [appeal.id for appeal in first_page.items]
+
+
+async def test_user_appeals_created_at_not_null(db: AsyncSession):
+    appeal = await UserAppealSeeder(db).seed()
+    db.add(appeal)
+    await db.commit()
+
+    page = await UserAppealRepository(db=db).get_page(cursor=None, per_page=1)
+    assert page.items[0].created_at is not None
+
+    with pytest.raises(IntegrityError):
+        await db.execute(update(UserAppeal).where(UserAppeal.id == appeal.id).values(created_at=None))
+    await db.rollback()
+
+
+async def test_user_appeals_filtered_page(db: AsyncSession):
+    appeal = await UserAppealSeeder(db).seed()
+    other_appeal = await UserAppealSeeder(db).seed()
+    db.add_all([appeal, other_appeal])
+    await db.commit()
+
+    filters = UserAppealFilterData(creator_id=appeal.creator_id, status=appeal.status.status_const, is_hidden=False)
+    page = await UserAppealRepository(db=db).get_page(cursor=None, per_page=10, filters=filters)
+
+    assert [item.id for item in page.items] == [appeal.id]
+
+
+async def test_user_appeals_search(db: AsyncSession):
+    body_match, address_match, other = [await UserAppealSeeder(db).seed() for _ in range(3)]
+    body_match.problem_body, body_match.address, body_match.note = "Яма на дороге", "Ленина 1", None
+    address_match.problem_body, address_match.address, address_match.note = "Не горит фонарь", "Дорога к школе", None
+    other.problem_body, other.address, other.note = "Сломана скамейка", "Парк", None
+    db.add_all([body_match, address_match, other])
+    await db.commit()
+
+    repository = UserAppealRepository(db=db)
+    data = AppealSearchData(q="дорога")
+    page = await repository.search(data=data, cursor=None, per_page=10)
+    assert [row.id for row in page.items] == [body_match.id, address_match.id]
+    assert page.items[0].rank > page.items[1].rank
+
+    first_page = await repository.search(data=data, cursor=None, per_page=1)
+    second_page = await repository.search(data=data, cursor=first_page.next_cursor, per_page=1)
+    assert [row.id for row in second_page.items] == [address_match.id]
+    assert second_page.next_cursor is None
+
+
+async def test_user_appeals_geo_search(db: AsyncSession):
+    appeal = await UserAppealSeeder(db).seed()
+    appeal.locate = Point(lat=55.7539, lng=37.6208).to_wkt()
+    db.add(appeal)
+    await db.commit()
+
+    repository = UserAppealRepository(db=db)
+    filters = UserAppealFilterData(creator_id=appeal.creator_id)
+
+    near = await repository.get_near(data=NearAppealsData(lat=55.7540, lng=37.6210, radius=100), filters=filters)
+    assert [row[0].id for row in near] == [appeal.id]
+
+    far = await repository.get_near(data=NearAppealsData(lat=59.9386, lng=30.3141, radius=100), filters=filters)
+    assert not far
+
+    bbox = BBoxAppealsData(min_lat=55.70, min_lng=37.50, max_lat=55.80, max_lng=37.70)
+    in_bbox = await repository.get_in_bbox(data=bbox, filters=filters)
+    assert [row[0].id for row in in_bbox] == [appeal.id]
+
+
+async def test_appeal_clusters(db: AsyncSession):
+    appeal = await UserAppealSeeder(db).seed()
+    appeal.locate = Point(lat=-33.8688, lng=151.2093).to_wkt()
+    db.add(appeal)
+    await db.commit()
+
+    cache = TTLCache(maxsize=100, ttl=60)
+    service = AppealClusterService(db=db, cache=cache)
+    data = ClusterAppealsData(min_lat=-34, min_lng=151, max_lat=-33.5, max_lng=151.5, zoom=12, with_statuses=True)
+
+    clusters = await service.get_clusters(data=data)
+    assert sum(cluster.count for cluster in clusters) >= 1
+    assert any(appeal.status.status_const.value in cluster.statuses for cluster in clusters)
+
+    hits = cache.hits
+    await service.get_clusters(data=data)
+    assert cache.hits > hits
+
+    cached = len(cache)
+    service.invalidate_point(Point(lat=-33.8688, lng=151.2093))
+    assert len(cache) < cached
+
+    misses = cache.misses
+    await service.get_clusters(data=data)
+    assert cache.misses > misses
+
+
+async def test_user_appeals_projected_page(db: AsyncSession):
+    appeals = [await UserAppealSeeder(db).seed() for _ in range(2)]
+    db.add_all(appeals)
+    await db.commit()
+
+    repository = UserAppealRepository(db=db)
+    orm_page = await repository.get_page(cursor=None, per_page=2)
+    projected_page = await repository.get_projected_page(cursor=None, per_page=2)
+
+    assert [UserAppealEntity(**row._asdict()) for row in projected_page.items] == \
+           [UserAppealEntity.from_orm(appeal) for appeal in orm_page.items]
+    assert projected_page.next_cursor == orm_page.next_cursor
+
+
+async def test_appeals_export(db: AsyncSession):
+    appeal = await UserAppealSeeder(db).seed()
+    db.add(appeal)
+    await db.commit()
+
+    filters = UserAppealFilterData(creator_id=appeal.creator_id)
+    service = AppealExportService(db=db)
+
+    ndjson = "".join([chunk async for chunk in service.export(export_format=ExportFormats.NDJSON, filters=filters)])
+    assert [json.loads(line)["id"] for line in ndjson.splitlines()] == [appeal.id]
+
+    csv = "".join([chunk async for chunk in service.export(export_format=ExportFormats.CSV, filters=filters)])
+    header, row = csv.splitlines()
+    assert header.startswith("id,")
+    assert row.startswith(f"{appeal.id},")
+
+
+async def test_user_appeal_loading_plan(db: AsyncSession):
+    appeal = await UserAppealSeeder(db).seed()
+    db.add(appeal)
+    await db.commit()
+    db.expunge_all()
+
+    loading_plan = {"status": LoadStrategies.JOINED, "appeal_theme.department": LoadStrategies.SELECTIN,
+                    "*": LoadStrategies.RAISE}
+    db_appeal = await UserAppealRepository(db=db).get_by_id(pk=appeal.id, loading_plan=loading_plan)
+
+    assert db_appeal.status.id == appeal.status_id
+    department = db_appeal.appeal_theme.department
+    assert (department.id if department else None) == db_appeal.appeal_theme.department_id
+    with pytest.raises(InvalidRequestError):
+        assert db_appeal.creator
+
+
+async def test_user_appeal_detail_aggregates(db: AsyncSession):
+    appeal = await UserAppealSeeder(db).seed()
+    history = [AppealHistory(appeal=appeal, comment=f"comment {i}", type=AppealHistoryTypes.NEW_MESSAGE)
+               for i in range(3)]
+    db.add(appeal)
+    db.add_all(history)
+    await db.commit()
+
+    aggregates = await UserAppealRepository(db=db).get_detail_aggregates(pk=appeal.id, latest_count=2)
+
+    assert aggregates.history_count == 3
+    assert [item["id"] for item in aggregates.history] == [history[2].id, history[1].id]
+    assert aggregates.chat_count == 0
+    assert aggregates.chats == []
+
+
+async def test_appeal_stats(db: AsyncSession):
+    appeal = await UserAppealSeeder(db).seed()
+    db.add(appeal)
+    await db.commit()
+    await ReconcileAppealStatsUC(db=db).exec()
+
+    repository = AppealStatRepository(db=db)
+    data = AppealStatsData(group_by=[StatsDimensions.THEME, StatsDimensions.STATUS])
+    bucket = (appeal.appeal_theme_id, appeal.status.status_const)
+
+    stats = {(row.appeal_theme_id, row.status): row.count for row in await repository.get_stats(data=data)}
+    assert stats[bucket] >= 1
+
+    await repository.remove_appeal(appeal_id=appeal.id)
+    await db.commit()
+    updated_stats = {(row.appeal_theme_id, row.status): row.count for row in await repository.get_stats(data=data)}
+    assert updated_stats.get(bucket, 0) == stats[bucket] - 1
+
+    assert await ReconcileAppealStatsUC(db=db).exec()
+    reconciled_stats = {(row.appeal_theme_id, row.status): row.count for row in await repository.get_stats(data=data)}
+    assert reconciled_stats == stats
+
+    async with async_session() as running, async_session() as skipped:
+        assert await AppealStatRepository(db=running).rebuild()
+        assert not await ReconcileAppealStatsUC(db=skipped).exec()
+        await running.rollback()
+
+
+async def test_appeals_import_size_limit(monkeypatch):
+    content = b'{"appeal_theme_id": 1}\n' * 4
+    monkeypatch.setattr(AppealImportService, "MAX_BYTES", len(content) - 1)
+    with pytest.raises(ValidationError):
+        AppealImportService().parse(content=content, import_format=ExportFormats.NDJSON)
+
+    monkeypatch.setattr(AppealImportService, "MAX_BYTES", len(content))
+    rows, errors = AppealImportService().parse(content=content, import_format=ExportFormats.NDJSON)
+    assert not rows and len(errors) == 4
+
+
+async def test_appeals_import(db: AsyncSession, async_client: AsyncClient):
+    user = await UserSeeder(db=db).seed_admin()
+    appeal_theme = await AppealThemeSeeder(db=db).random_or_seed()
+    db.add_all([user, appeal_theme])
+    if not await AppealStatusRepository(db=db).get_by_const_name(const_name=AppealStatuses.MODERATION):
+        db.add(AppealStatus(title=AppealStatuses.MODERATION, status_const=AppealStatuses.MODERATION))
+    await db.commit()
+    authorize_client(db=db, client=async_client, user=user)
+
+    faker = Faker()
+    rows = [{"appeal_theme_id": appeal_theme.id, "problem_body": faker.sentence(), "address": faker.address(),
+             "lat": 55.75, "lng": 37.61} for _ in range(3)]
+    rows.insert(1, {"appeal_theme_id": -1, "problem_body": "x", "address": "y", "lat": 1, "lng": 1})
+    rows.insert(3, {"appeal_theme_id": appeal_theme.id, "address": "y", "lat": 91, "lng": 1})
+    content = "\n".join(json.dumps(row) for row in rows) + "\nnot json\n"
+
+    response = await async_client.post("/appeals/import", params={"format": "ndjson"},
+                                       files={"file": ("appeals.ndjson", content.encode(), "application/x-ndjson")})
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["imported"] == 3
+    assert [error["row"] for error in data["errors"]] == [2, 4, 6]
+    assert set(data["errors"][1]["errors"]) == {"problem_body", "lat"}
+
+    appeal = await UserAppealRepository(db=db).get_by_id(pk=data["appeal_ids"][0], fetch_relations=True)
+    assert appeal.problem_body == rows[0]["problem_body"]
+    assert appeal.dispatcher_create == user.id
+    assert appeal.status.status_const == AppealStatuses.MODERATION
+    for appeal_id in data["appeal_ids"]:
+        assert await AppealHistoryRepository(db=db).get_by_appeal_type(
+            appeal_id=appeal_id, history_type=AppealHistoryTypes.APPEAL_MODERATION)
+        assert len(await AppealUserRepository(db=db).get_by_appeal_id(appeal_id=appeal_id)) == 1
@@ -1,9 +1,13 @@
-from fastapi import Form
-from pydantic import BaseModel, constr, validator
+import enum
+from datetime import datetime, date
+from fastapi import Form, Query
+from pydantic import BaseModel, constr, validator, confloat, conint
 from typing import List, Union, Optional
 
+from appeals.models import AppealStatuses
 from common.errors import ValidationError
 from common.types import UploadedFileType
+from postgis.point import Point
 
 
 class UserAppealData(BaseModel):
@@ -12,6 +16,8 @@ class UserAppealData(BaseModel):
     address: str
     locate: List[Union[float, int]]
     is_active: Optional[bool]
+    # Attachments kept on update, the others are removed. `None` keeps them all, unless files are sent.
+    attachment_ids: Optional[List[int]]
 
     @classmethod
     def as_form(cls,
@@ -19,7 +25,8 @@ class UserAppealData(BaseModel):
                 address: str = Form(...),
                 locate: str = Form(...),
                 is_active: Optional[bool] = Form(...),
-                problem_body: constr(max_length=700) = Form(...)):
+                problem_body: constr(max_length=700) = Form(...),
+                attachment_ids: Optional[List[int]] = Form(None)):
         locate = list(map(float, locate.split(",")))
         return cls(
             appeal_theme_id=appeal_theme_id,
@@ -27,6 +34,7 @@ class UserAppealData(BaseModel):
             address=address,
             locate=locate,
             is_active=is_active,
+            attachment_ids=attachment_ids,
         )
 
     @validator("locate")
@@ -42,3 +50,121 @@ class MoveAppealToWorkData(BaseModel):
     appeal_theme_id: int
     deputy_id: Optional[int]
     is_active: Optional[bool]
+
+
+class UserAppealFilterData(BaseModel):
+    status: Optional[AppealStatuses]
+    appeal_theme_id: Optional[int]
+    department_id: Optional[int]
+    creator_id: Optional[int]
+    executor_id: Optional[int]
+    deputy_id: Optional[int]
+    is_hidden: Optional[bool]
+    is_active: Optional[bool]
+    created_from: Optional[datetime]
+    created_to: Optional[datetime]
+
+    @validator("created_to")
+    def validate_created_range(cls, created_to: Optional[datetime], values: dict):
+        created_from = values.get("created_from")
+        if created_to and created_from and created_to < created_from:
+            raise ValidationError(detail={"created_to": "created_to must be after created_from"})
+        return created_to
+
+
+class AppealUploadData(BaseModel):
+    filename: constr(strip_whitespace=True, min_length=1, max_length=255)
+    size: conint(gt=0)
+
+
+class AppealSearchData(BaseModel):
+    q: constr(strip_whitespace=True, min_length=2, max_length=256)
+
+
+class NearAppealsData(BaseModel):
+    lat: confloat(ge=-90, le=90)
+    lng: confloat(ge=-180, le=180)
+    radius: confloat(gt=0, le=50000)
+    limit: conint(ge=1, le=5000) = 1000
+
+    @property
+    def center(self) -> Point:
+        return Point(lat=self.lat, lng=self.lng)
+
+
+class BBoxData(BaseModel):
+    min_lat: confloat(ge=-90, le=90)
+    min_lng: confloat(ge=-180, le=180)
+    max_lat: confloat(ge=-90, le=90)
+    max_lng: confloat(ge=-180, le=180)
+
+    @validator("max_lat")
+    def validate_max_lat(cls, max_lat: float, values: dict):
+        if "min_lat" in values and max_lat < values["min_lat"]:
+            raise ValidationError(detail={"max_lat": "max_lat must be greater than min_lat"})
+        return max_lat
+
+    @validator("max_lng")
+    def validate_max_lng(cls, max_lng: float, values: dict):
+        if "min_lng" in values and max_lng < values["min_lng"]:
+            raise ValidationError(detail={"max_lng": "max_lng must be greater than min_lng"})
+        return max_lng
+
+    @property
+    def south_west(self) -> Point:
+        return Point(lat=self.min_lat, lng=self.min_lng)
+
+    @property
+    def north_east(self) -> Point:
+        return Point(lat=self.max_lat, lng=self.max_lng)
+
+
+class BBoxAppealsData(BBoxData):
+    limit: conint(ge=1, le=5000) = 1000
+
+
+class ClusterAppealsData(BBoxData):
+    zoom: conint(ge=0, le=18)
+    with_statuses: bool = False
+
+
+class ExportFormats(str, enum.Enum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+
+
+class AppealImportRowData(BaseModel):
+    appeal_theme_id: int
+    problem_body: constr(strip_whitespace=True, min_length=1, max_length=700)
+    address: constr(strip_whitespace=True, min_length=1)
+    post_address: Optional[str]
+    note: Optional[str]
+    lat: confloat(ge=-90, le=90)
+    lng: confloat(ge=-180, le=180)
+    is_active: bool = False
+
+    @property
+    def locate(self) -> Point:
+        return Point(lat=self.lat, lng=self.lng)
+
+
+class StatsDimensions(str, enum.Enum):
+    STATUS = 'status'
+    THEME = 'appeal_theme_id'
+    DEPARTMENT = 'department_id'
+    DAY = 'day'
+
+
+class AppealStatsData(BaseModel):
+    group_by: List[StatsDimensions]
+    department_id: Optional[int]
+    date_from: Optional[date]
+    date_to: Optional[date]
+
+    @classmethod
+    def as_query(cls,
+                 group_by: List[StatsDimensions] = Query([StatsDimensions.STATUS]),
+                 department_id: Optional[int] = Query(None),
+                 date_from: Optional[date] = Query(None),
+                 date_to: Optional[date] = Query(None)):
+        return cls(group_by=group_by, department_id=department_id, date_from=date_from, date_to=date_to)
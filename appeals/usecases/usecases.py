@@ -1,14 +1,20 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 
 from appeals.models import AppealStatuses, UserAppeal, AppealUser, AppealTheme
 from appeals.repository.appeal_attachment_repository import IAppealAttachmentRepository, AppealAttachmentRepository
 from appeals.repository.appeal_history_repository import IAppealHistoryRepository, AppealHistoryRepository
+from appeals.repository.appeal_stat_repository import IAppealStatRepository, AppealStatRepository
 from appeals.repository.appeal_status_repository import IAppealStatusRepository, AppealStatusRepository
 from appeals.repository.appeal_theme_repository import IAppealThemeRepository, AppealThemeRepository
+from appeals.repository.appeal_user_repository import IAppealUserRepository, AppealUserRepository
 from appeals.repository.user_appeal_repository import IUserAppealRepository, UserAppealRepository
+from appeals.entities import AppealImportEntity, AppealImportErrorEntity
+from appeals.services.appeal_cluster_service import AppealClusterService
+from appeals.services.appeal_import_service import AppealImportService
 from appeals.services.user_appeal_service import UserAppealService
-from appeals.usecases.types import UserAppealData, MoveAppealToWorkData
+from appeals.usecases.types import UserAppealData, MoveAppealToWorkData, AppealImportRowData, ExportFormats
+from common.errors import ValidationError
 from common.types import UploadedFileType
 from common.usecases import BaseUseCase
 from postgis.point import Point
@@ -17,20 +23,27 @@ from users.repository.user_repository import IUserRepository, UserRepository
 
 
 class CreateUserAppealUC(BaseUseCase):
+    """After `exec`, `variant_attachment_ids` are the image attachments to render variants of in the background."""
+    variant_attachment_ids: List[int]
     status_repos: IAppealStatusRepository
     appeal_theme_repos: IAppealThemeRepository
     appeal_history_repos: IAppealHistoryRepository
+    appeal_stat_repos: IAppealStatRepository
     user_appeal_service: UserAppealService
+    appeal_cluster_service: AppealClusterService
 
     def __init__(self, db: AsyncSession, ctx_user: User, data: UserAppealData, files: List[UploadedFileType]):
         super().__init__(db)
         self.data = data
         self.files = files
         self.ctx_user = ctx_user
+        self.variant_attachment_ids = []
         self.status_repos = AppealStatusRepository(db=self.db)
         self.appeal_theme_repos = AppealThemeRepository(db=self.db)
         self.appeal_history_repos = AppealHistoryRepository(db=self.db)
+        self.appeal_stat_repos = AppealStatRepository(db=self.db)
         self.user_appeal_service = UserAppealService(db=self.db)
+        self.appeal_cluster_service = AppealClusterService(db=self.db)
 
     async def _create_appeal(self) -> UserAppeal:
         status = await self.status_repos.get_by_const_name(const_name=AppealStatuses.MODERATION)
@@ -53,7 +66,8 @@ class CreateUserAppealUC(BaseUseCase):
 
     async def _store_attachments(self, appeal: UserAppeal):
         if self.files:
-            await self.user_appeal_service.store_appeal_attachments(user_appeal=appeal, files=self.files)
+            self.variant_attachment_ids = await self.user_appeal_service.store_appeal_attachments(
+                user_appeal=appeal, files=self.files)
 
     async def _create_appeal_user(self, appeal: UserAppeal) -> AppealUser:
         appeal_user = AppealUser()
@@ -69,74 +83,236 @@ class CreateUserAppealUC(BaseUseCase):
             await self._store_attachments(appeal=new_appeal)
             await self.appeal_history_repos.create_moderation_message(appeal=new_appeal)
             await self._create_appeal_user(appeal=new_appeal)
+            await self.appeal_stat_repos.add_appeal(appeal_id=new_appeal.id)
         except Exception as e:
             await self.db.rollback()
             raise e
 
         await self.db.commit()
+        lat, lng = self.data.locate
+        self.appeal_cluster_service.invalidate_point(Point(lat=lat, lng=lng))
         return new_appeal
 
 
+class ImportUserAppealsUC(BaseUseCase):
+    """
+    Creates the appeals entered by a dispatcher from a CSV or NDJSON file. Does what `CreateUserAppealUC` does for
+    every valid row, but with themes and the status resolved once and every table filled by multi-row inserts in a
+    single transaction. Invalid rows are skipped and reported.
+    """
+    BATCH_SIZE = 1000
+
+    status_repos: IAppealStatusRepository
+    appeal_theme_repos: IAppealThemeRepository
+    user_appeal_repos: IUserAppealRepository
+    appeal_history_repos: IAppealHistoryRepository
+    appeal_user_repos: IAppealUserRepository
+    appeal_stat_repos: IAppealStatRepository
+    appeal_cluster_service: AppealClusterService
+
+    def __init__(self, db: AsyncSession, ctx_user: User, content: bytes, import_format: ExportFormats):
+        super().__init__(db)
+        self.ctx_user = ctx_user
+        self.content = content
+        self.import_format = import_format
+        self.status_repos = AppealStatusRepository(db=self.db)
+        self.appeal_theme_repos = AppealThemeRepository(db=self.db)
+        self.user_appeal_repos = UserAppealRepository(db=self.db)
+        self.appeal_history_repos = AppealHistoryRepository(db=self.db)
+        self.appeal_user_repos = AppealUserRepository(db=self.db)
+        self.appeal_stat_repos = AppealStatRepository(db=self.db)
+        self.appeal_cluster_service = AppealClusterService(db=self.db)
+
+    def _appeal_values(self, row: AppealImportRowData, status_id: int) -> dict:
+        return {
+            "creator_id": self.ctx_user.id,
+            "dispatcher_create": self.ctx_user.id,
+            "appeal_theme_id": row.appeal_theme_id,
+            "status_id": status_id,
+            "problem_body": row.problem_body,
+            "address": row.address,
+            "post_address": row.post_address,
+            "note": row.note,
+            "is_active": row.is_active,
+            "is_hidden": False,
+            "rate": 0,
+            "locate": row.locate.to_wkt(),
+        }
+
+    async def _insert(self, rows: List[AppealImportRowData], status_id: int) -> List[int]:
+        appeal_ids = []
+        for offset in range(0, len(rows), self.BATCH_SIZE):
+            batch_ids = await self.user_appeal_repos.bulk_create(values=[
+                self._appeal_values(row, status_id=status_id) for row in rows[offset:offset + self.BATCH_SIZE]
+            ])
+            await self.appeal_history_repos.create_moderation_messages(appeal_ids=batch_ids,
+                                                                       creator_id=self.ctx_user.id)
+            await self.appeal_user_repos.create_for_appeals(appeal_ids=batch_ids)
+            appeal_ids.extend(batch_ids)
+
+        await self.appeal_stat_repos.add_appeals(appeal_ids=appeal_ids)
+        return appeal_ids
+
+    async def exec(self) -> AppealImportEntity:
+        parsed_rows, errors = AppealImportService().parse(content=self.content, import_format=self.import_format)
+        theme_ids = {theme.id for theme in await self.appeal_theme_repos.get_all()}
+        status = await self.status_repos.get_by_const_name(const_name=AppealStatuses.MODERATION, raise_exception=True)
+
+        rows = []
+        for row_number, row in parsed_rows:
+            if row.appeal_theme_id in theme_ids:
+                rows.append(row)
+            else:
+                errors.append(AppealImportErrorEntity(row=row_number, errors={
+                    "appeal_theme_id": f"Undefined appeal_theme with pk={row.appeal_theme_id}",
+                }))
+
+        try:
+            appeal_ids = await self._insert(rows, status_id=status.id)
+        except Exception as e:
+            await self.db.rollback()
+            raise e
+
+        await self.db.commit()
+        for row in rows:
+            self.appeal_cluster_service.invalidate_point(row.locate)
+        return AppealImportEntity(imported=len(appeal_ids), appeal_ids=appeal_ids,
+                                  errors=sorted(errors, key=lambda error: error.row))
+
+
 class UpdateUserAppealUC(BaseUseCase):
+    """After `exec`, `variant_attachment_ids` are the image attachments to render variants of in the background."""
+    variant_attachment_ids: List[int]
+    _old_location: Optional[Point] = None
+    _released_links: List[str] = []
     appeal_attachment_repos: IAppealAttachmentRepository
     appeal_theme_repos: IAppealThemeRepository
+    appeal_stat_repos: IAppealStatRepository
+    user_appeal_repos: IUserAppealRepository
     user_appeal_service: UserAppealService
+    appeal_cluster_service: AppealClusterService
 
     def __init__(self, db: AsyncSession, user_appeal: UserAppeal, data: UserAppealData, files: List[UploadedFileType]):
         super().__init__(db)
         self.user_appeal = user_appeal
         self.data = data
         self.files = files
+        self.variant_attachment_ids = []
 
         self.appeal_attachment_repos = AppealAttachmentRepository(db=self.db)
         self.appeal_theme_repos = AppealThemeRepository(db=self.db)
+        self.appeal_stat_repos = AppealStatRepository(db=self.db)
+        self.user_appeal_repos = UserAppealRepository(db=self.db)
         self.user_appeal_service = UserAppealService(db=self.db)
+        self.appeal_cluster_service = AppealClusterService(db=self.db)
 
-    async def _recreate_attachments(self):
-        if not self.files:
-            return
+    async def _update_attachments(self):
+        """
+        Removes the attachments missing from `data.attachment_ids` and stores only the new files.
+        Files of removed attachments are released after commit, an edit without attachment changes touches no files.
+        Files sent without `attachment_ids` replace all attachments: clients unaware of it re-send every file.
+        """
+        keep_ids = self.data.attachment_ids
+        if keep_ids is None and self.files:
+            keep_ids = []
+        if keep_ids is not None:
+            existing_ids = await self.appeal_attachment_repos.get_ids_by_appeal_id(appeal_id=self.user_appeal.id)
+            unknown_ids = set(keep_ids) - set(existing_ids)
+            if unknown_ids:
+                raise ValidationError(detail={"attachment_ids": f"Unknown attachments {sorted(unknown_ids)}"})
+            if set(existing_ids) - set(keep_ids):
+                self._released_links = await self.appeal_attachment_repos.delete_except(
+                    appeal_id=self.user_appeal.id, keep_ids=keep_ids,
+                )
 
-        await self.appeal_attachment_repos.delete_by_appeal_id(appeal_id=self.user_appeal.id)
-        await self.user_appeal_service.store_appeal_attachments(user_appeal=self.user_appeal, files=self.files)
+        if self.files:
+            self.variant_attachment_ids = await self.user_appeal_service.store_appeal_attachments(
+                user_appeal=self.user_appeal, files=self.files)
 
     async def _process_update(self):
         appeal_theme = await self.appeal_theme_repos.get_by_id(pk=self.data.appeal_theme_id, raise_exception=True)
+        await self.appeal_stat_repos.remove_appeal(appeal_id=self.user_appeal.id)
 
         self.user_appeal.appeal_theme = appeal_theme
         self.user_appeal.problem_body = self.data.problem_body
         self.user_appeal.address = self.data.address
         self.user_appeal.is_active = self.data.is_active
+
+        self._old_location = await self.user_appeal_repos.get_location(pk=self.user_appeal.id)
+        lat, lng = self.data.locate
+        self.user_appeal.locate = Point(lat=lat, lng=lng).to_wkt()
         await self.db.flush()
+        await self.appeal_stat_repos.add_appeal(appeal_id=self.user_appeal.id)
+
+    def _invalidate_clusters(self):
+        lat, lng = self.data.locate
+        self.appeal_cluster_service.invalidate_point(Point(lat=lat, lng=lng))
+        if self._old_location:
+            self.appeal_cluster_service.invalidate_point(self._old_location)
 
     async def exec(self):
-        await self._recreate_attachments()
+        await self._update_attachments()
         await self._process_update()
         await self.db.commit()
+        self._invalidate_clusters()
+        await self.user_appeal_service.release_files(self._released_links)
 
 
 class MoveAppealToWorkUC(BaseUseCase):
     _appeal_theme: AppealTheme = None
     _department: Department = None
+    _location: Optional[Point] = None
     appeal_theme_repos: IAppealThemeRepository
+    appeal_stat_repos: IAppealStatRepository
     user_repos: IUserRepository
     appeal_repos: IUserAppealRepository
+    appeal_cluster_service: AppealClusterService
 
     def __init__(self, db: AsyncSession, data: MoveAppealToWorkData):
         super().__init__(db)
         self.data = data
         self.appeal_theme_repos = AppealThemeRepository(db=db)
+        self.appeal_stat_repos = AppealStatRepository(db=db)
         self.user_repos = UserRepository(db=db)
         self.appeal_repos = UserAppealRepository(db=db)
+        self.appeal_cluster_service = AppealClusterService(db=db)
 
     async def _process_update(self):
         appeal_theme = await self.appeal_theme_repos.get_by_id(pk=self.data.appeal_theme_id, raise_exception=True)
         dept_director = await self.user_repos.get_department_director(department_id=appeal_theme.department_id)
         user_appeal = await self.appeal_repos.get_by_id(pk=self.data.appeal_id, raise_exception=True)
+        await self.appeal_stat_repos.remove_appeal(appeal_id=user_appeal.id)
         user_appeal.executor = dept_director
         user_appeal.appeal_theme = appeal_theme
         user_appeal.is_active = self.data.is_active
         user_appeal.note = self.data.note
+        await self.db.flush()
+        await self.appeal_stat_repos.add_appeal(appeal_id=user_appeal.id)
+        self._location = await self.appeal_repos.get_location(pk=user_appeal.id)
         # ['deputyId', 'appealThemeId', 'isActive', 'note']
 
     async def exec(self):
         await self._process_update()
+        await self.db.commit()
+        # Cached tiles carry a status breakdown, every status change drops the tiles of the appeal.
+        if self._location:
+            self.appeal_cluster_service.invalidate_point(self._location)
+
+
+class ReconcileAppealStatsUC(BaseUseCase):
+    appeal_stat_repos: IAppealStatRepository
+
+    def __init__(self, db: AsyncSession):
+        super().__init__(db)
+        self.appeal_stat_repos = AppealStatRepository(db=self.db)
+
+    async def exec(self) -> bool:
+        """`False` when another reconcile was running and this one did nothing."""
+        try:
+            rebuilt = await self.appeal_stat_repos.rebuild()
+        except Exception as e:
+            await self.db.rollback()
+            raise e
+
+        await self.db.commit()
+        return rebuilt
@@ -0,0 +1,44 @@
+"""
+Measures peak RSS of a streaming appeals export.
+
+    python -m benchmarks.appeals_export
+
+Needs the database from `.env`. Rows are inserted inside a transaction that is rolled back at the end.
+"""
+import asyncio
+import resource
+import time
+
+from appeals.services.appeal_export_service import AppealExportService
+from appeals.usecases.types import ExportFormats
+from benchmarks.appeals_list_projection import seed_appeals
+from grazhdane.database import async_session
+
+ROWS = 1_000_000
+
+
+def peak_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def main():
+    async with async_session() as db:
+        try:
+            await seed_appeals(db, ROWS)
+            await db.flush()
+            db.expunge_all()
+            baseline = peak_rss_mib()
+
+            for export_format in ExportFormats:
+                started = time.perf_counter()
+                exported_bytes = 0
+                async for chunk in AppealExportService(db=db).export(export_format=export_format):
+                    exported_bytes += len(chunk)
+                print(f"{export_format.value:>7}: {exported_bytes / 2 ** 20:.1f} MiB in "
+                      f"{time.perf_counter() - started:.1f} s, peak RSS growth {peak_rss_mib() - baseline:.1f} MiB")
+        finally:
+            await db.rollback()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
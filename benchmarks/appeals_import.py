@@ -0,0 +1,64 @@
+"""
+Measures the bulk appeals import against creating the same appeals one by one with `CreateUserAppealUC`.
+
+    python -m benchmarks.appeals_import
+
+Needs the database from `.env`. Every run is rolled back at the end.
+"""
+import asyncio
+import json
+import time
+from unittest import mock
+
+from faker import Faker
+
+from appeals.models import AppealStatus, AppealStatuses
+from appeals.seeds import AppealThemeSeeder
+from appeals.usecases.types import ExportFormats, UserAppealData
+from appeals.usecases.usecases import ImportUserAppealsUC, CreateUserAppealUC
+from grazhdane.database import async_session
+from users.seeds import UserSeeder
+
+ROWS = 10_000
+ONE_BY_ONE_ROWS = 500
+
+
+def make_rows(theme_id: int, count: int):
+    faker = Faker()
+    return [{"appeal_theme_id": theme_id, "problem_body": faker.sentence(), "address": faker.street_address(),
+             "lat": float(faker.latitude()), "lng": float(faker.longitude())} for _ in range(count)]
+
+
+async def main():
+    async with async_session() as db:
+        user = await UserSeeder(db).seed()
+        theme = await AppealThemeSeeder(db).random_or_seed()
+        db.add_all([user, theme, AppealStatus(title=AppealStatuses.MODERATION, status_const=AppealStatuses.MODERATION)])
+        await db.flush()
+        rows = make_rows(theme.id, ROWS)
+
+        # Both paths commit, the outer transaction is kept open so everything is rolled back at the end.
+        with mock.patch.object(db, "commit", db.flush):
+            try:
+                content = "\n".join(json.dumps(row) for row in rows).encode()
+                started = time.perf_counter()
+                result = await ImportUserAppealsUC(db=db, ctx_user=user, content=content,
+                                                   import_format=ExportFormats.NDJSON).exec()
+                elapsed = time.perf_counter() - started
+                print(f"   bulk import: {result.imported} appeals in {elapsed:.2f} s "
+                      f"({result.imported / elapsed:.0f} appeals/s)")
+
+                started = time.perf_counter()
+                for row in rows[:ONE_BY_ONE_ROWS]:
+                    data = UserAppealData(appeal_theme_id=row["appeal_theme_id"], problem_body=row["problem_body"],
+                                          address=row["address"], locate=[row["lat"], row["lng"]], is_active=False)
+                    await CreateUserAppealUC(db=db, ctx_user=user, data=data, files=[]).exec()
+                elapsed = time.perf_counter() - started
+                print(f"one by one UC: {ONE_BY_ONE_ROWS} appeals in {elapsed:.2f} s "
+                      f"({ONE_BY_ONE_ROWS / elapsed:.0f} appeals/s)")
+            finally:
+                await db.rollback()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
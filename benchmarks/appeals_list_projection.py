@@ -0,0 +1,91 @@
+"""
+Compares latency and memory of the appeals list built through ORM hydration and through column projection.
+
+    python -m benchmarks.appeals_list_projection
+
+Needs the database from `.env`. Rows are inserted inside a transaction that is rolled back at the end.
+"""
+import asyncio
+import time
+import tracemalloc
+from typing import Callable, Awaitable, List
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from appeals.entities import UserAppealEntity
+from appeals.models import UserAppeal
+from appeals.repository.user_appeal_repository import UserAppealRepository
+from appeals.seeds import UserAppealSeeder
+from grazhdane.database import async_session
+
+SIZES = [100, 10_000, 100_000]
+INSERT_BATCH = 5_000
+ROUNDS = 3
+
+
+async def seed_appeals(db: AsyncSession, count: int):
+    template = await UserAppealSeeder(db).seed()
+    db.add(template)
+    await db.flush()
+
+    row = {
+        "creator_id": template.creator_id,
+        "appeal_theme_id": template.appeal_theme_id,
+        "status_id": template.status_id,
+        "problem_body": template.problem_body,
+        "address": template.address,
+        "note": template.note,
+        "is_active": True,
+        "is_hidden": False,
+        "rate": 0,
+        "users_voted": [],
+    }
+    for offset in range(0, count, INSERT_BATCH):
+        await db.execute(insert(UserAppeal), [row] * min(INSERT_BATCH, count - offset))
+
+
+async def orm_list(db: AsyncSession, size: int) -> List[dict]:
+    repository = UserAppealRepository(db=db)
+    query = await repository.exec_query(repository.select(UserAppeal).limit(size))
+    appeals = query.scalars().fetchall()
+    result = [UserAppealEntity.from_orm(appeal).dict() for appeal in appeals]
+    db.expunge_all()
+    return result
+
+
+async def projection_list(db: AsyncSession, size: int) -> List[dict]:
+    repository = UserAppealRepository(db=db)
+    query = await repository.exec_query(repository.select_projection(UserAppealEntity).limit(size))
+    return [UserAppealEntity(**row._asdict()).dict() for row in query.fetchall()]
+
+
+async def measure(db: AsyncSession, fn: Callable[[AsyncSession, int], Awaitable[List[dict]]], size: int):
+    timings = []
+    peak = 0
+    for _ in range(ROUNDS):
+        tracemalloc.start()
+        started = time.perf_counter()
+        await fn(db, size)
+        timings.append(time.perf_counter() - started)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return min(timings), peak
+
+
+async def main():
+    async with async_session() as db:
+        try:
+            await seed_appeals(db, max(SIZES))
+
+            print(f"{'rows':>8} {'path':>11} {'best, ms':>10} {'peak, MiB':>10}")
+            for size in SIZES:
+                for name, fn in (("orm", orm_list), ("projection", projection_list)):
+                    elapsed, peak = await measure(db, fn, size)
+                    print(f"{size:>8} {name:>11} {elapsed * 1000:>10.1f} {peak / 2 ** 20:>10.1f}")
+        finally:
+            await db.rollback()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+"""
+Latency of an unrelated endpoint while a storm of logins verifies bcrypt passwords, with the hash run inline on
+the event loop (as before) and in the bounded executor of `users.passwords`.
+
+    python -m benchmarks.password_hashing
+
+Does not need the database: only the password check of a login is run, the probe requests `/openapi.json`.
+"""
+import asyncio
+import statistics
+import time
+
+from httpx import AsyncClient
+
+from grazhdane.app import app
+from users.passwords import pwd_context, verify_password, shutdown_executor
+
+LOGINS = 40
+PROBE_INTERVAL = 0.01
+
+
+async def inline_verify(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+async def run_storm(verify, hashed_password: str) -> None:
+    client = AsyncClient(app=app, base_url="http://benchmark")
+    await client.get("/openapi.json")
+    latencies = []
+
+    async def probe(done: asyncio.Event):
+        while not done.is_set():
+            started = time.perf_counter()
+            await client.get("/openapi.json")
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(PROBE_INTERVAL)
+
+    done = asyncio.Event()
+    prober = asyncio.create_task(probe(done))
+    started = time.perf_counter()
+    await asyncio.gather(*(verify("password", hashed_password) for _ in range(LOGINS)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await prober
+    await client.aclose()
+
+    latencies.sort()
+    print(f"{verify.__name__:>15}: {LOGINS} logins in {elapsed:.2f} s, probe requests {len(latencies)}, "
+          f"p50 {statistics.median(latencies) * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+
+
+async def main():
+    hashed_password = pwd_context.hash("password")
+    for verify in (inline_verify, verify_password):
+        await run_storm(verify, hashed_password)
+    shutdown_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,52 @@
+import os
+import posixpath
+import stat
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse
+from fastapi_utils.cbv import cbv
+from starlette.concurrency import run_in_threadpool
+
+from common.images import IMAGE_VARIANTS
+from common.responses import RangeFileResponse
+from common.service import ContentAddressedStorage
+from common.storage import get_storage_backend
+
+storage_router = APIRouter()
+
+
+def storage_etag(name: str, stat_result: os.stat_result) -> str:
+    """
+    Strong ETag of a stored file. Stored names are never reused (uuid or sha256 named) and files are
+    renamed into place once complete, so a blob digest or the size and mtime identify the bytes.
+    """
+    if name.startswith(ContentAddressedStorage.DIR_NAME + "/"):
+        stem = posixpath.splitext(posixpath.basename(name))[0]
+        checksum, _, variant = stem.partition("_")
+        if len(checksum) == 64 and (not variant or variant in IMAGE_VARIANTS):
+            return f'"{stem}"'
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+@cbv(storage_router)
+class StorageHandler:
+    @storage_router.api_route("/{name:path}", methods=["GET", "HEAD"], include_in_schema=False)
+    async def download(self, name: str, request: Request):
+        name = posixpath.normpath(name)
+        if name.startswith(("..", "/")) or name.endswith(".part"):
+            raise HTTPException(status_code=404, detail="File not found")
+
+        backend = get_storage_backend()
+        path = backend.local_path(name)
+        if path is None:
+            return RedirectResponse(backend.url(name), status_code=307)
+
+        try:
+            stat_result = await run_in_threadpool(os.stat, path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found")
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise HTTPException(status_code=404, detail="File not found")
+
+        return RangeFileResponse(path, stat_result=stat_result, request_headers=request.headers,
+                                 etag=storage_etag(name, stat_result), method=request.method)
@@ -0,0 +1,84 @@
+import asyncio
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple, Iterable
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_VARIANT = "thumbnail"
+PREVIEW_VARIANT = "preview"
+
+IMAGE_VARIANTS: Dict[str, Tuple[int, int]] = {
+    THUMBNAIL_VARIANT: (256, 256),
+    PREVIEW_VARIANT: (1280, 1280),
+}
+VARIANT_EXT = "jpg"
+VARIANT_QUALITY = 82
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def variant_name(name: str, variant: str) -> str:
+    """`cas/ab/abcd.png` -> `cas/ab/abcd_thumbnail.jpg`, works the same for paths and links."""
+    return f"{os.path.splitext(name)[0]}_{variant}.{VARIANT_EXT}"
+
+
+def render_variants(data: bytes, variants: Iterable[str]) -> Dict[str, bytes]:
+    """Renders the requested `IMAGE_VARIANTS` of the image in `data` as JPEG. Runs in a worker process."""
+    rendered = {}
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("RGB", max(IMAGE_VARIANTS.values()))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        for variant in sorted(variants, key=IMAGE_VARIANTS.get, reverse=True):
+            image.thumbnail(IMAGE_VARIANTS[variant], Image.LANCZOS)
+            output = io.BytesIO()
+            image.save(output, "JPEG", quality=VARIANT_QUALITY, optimize=True, progressive=True)
+            rendered[variant] = output.getvalue()
+
+    return rendered
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=int(os.environ.get("IMAGE_WORKERS", 2)))
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    """Drops a broken pool, the next `get_executor` starts a new one. Other renders may have dropped it already."""
+    global _executor
+    if _executor is executor:
+        _executor = None
+    executor.shutdown(wait=False)
+
+
+async def make_variants(data: bytes, variants: Iterable[str] = tuple(IMAGE_VARIANTS)) -> Dict[str, bytes]:
+    """
+    Renders the variants in the process pool, an image Pillow can not read just gets none.
+    A worker dying (e.g. killed for memory on a huge image) breaks the pool: it is replaced and the image gets
+    no variants, since rendering it again would likely kill the new worker too.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    try:
+        return await loop.run_in_executor(executor, render_variants, data, list(variants))
+    except BrokenProcessPool as e:
+        logger.error("Image worker died, restarting the pool: %s", e)
+        _discard_executor(executor)
+        return {}
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning("Could not render image variants: %s", e)
+        return {}
@@ -0,0 +1,98 @@
+import logging
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Optional, Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+from starlette.types import ASGIApp, Scope, Receive, Send
+
+logger = logging.getLogger(__name__)
+
+
+class RequestQueries:
+    def __init__(self):
+        self.statements: Counter = Counter()
+
+    @property
+    def total(self) -> int:
+        return sum(self.statements.values())
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+
+_current_queries: ContextVar[Optional[RequestQueries]] = ContextVar("current_queries", default=None)
+
+
+class QueryCounter:
+    """
+    Development helper counting SQL statements per request.
+    The same statement executed `n_plus_one_threshold` or more times within one request is reported as N+1.
+    Totals per route are kept in `routes` and logged by `log_summary`, e.g. on shutdown.
+    """
+
+    def __init__(self, n_plus_one_threshold: int = 5, max_queries: int = 20):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.max_queries = max_queries
+        self.routes: Dict[str, Dict[str, int]] = defaultdict(lambda: {"requests": 0, "queries": 0, "max_queries": 0,
+                                                                      "n_plus_one": 0})
+
+    def install(self, engine: Engine):
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    @staticmethod
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        queries = _current_queries.get()
+        if queries is not None:
+            queries.statements[statement] += 1
+
+    def track(self, route: str, queries: RequestQueries):
+        stats = self.routes[route]
+        stats["requests"] += 1
+        stats["queries"] += queries.total
+        stats["max_queries"] = max(stats["max_queries"], queries.total)
+
+        repeated = queries.repeated(self.n_plus_one_threshold)
+        if repeated:
+            stats["n_plus_one"] += 1
+            for statement, count in repeated.items():
+                logger.warning("Possible N+1 on %s: statement executed %s times: %s", route, count, statement)
+        if queries.total > self.max_queries:
+            logger.warning("%s executed %s SQL statements", route, queries.total)
+
+    def log_summary(self):
+        """The routes seen so far, those with the most statements per request first."""
+        for route, stats in sorted(self.routes.items(), key=lambda item: item[1]["queries"] / item[1]["requests"],
+                                   reverse=True):
+            logger.info("%s: %s requests, %.1f statements per request, at most %s, %s with possible N+1",
+                        route, stats["requests"], stats["queries"] / stats["requests"], stats["max_queries"],
+                        stats["n_plus_one"])
+
+
+class QueryCounterMiddleware:
+    def __init__(self, app: ASGIApp, counter: QueryCounter):
+        self.app = app
+        self.counter = counter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = _current_queries.set(queries)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_queries.reset(token)
+            self.counter.track(route=f"{scope['method']} {self._route_path(scope)}", queries=queries)
+
+    @staticmethod
+    def _route_path(scope: Scope) -> str:
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return scope["path"]
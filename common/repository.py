@@ -1,11 +1,42 @@
+import enum
 from abc import ABC
-from typing import Union
+from typing import Union, Optional, Type, AsyncIterator, List, Dict
 
-from sqlalchemy import select
-from sqlalchemy.engine import ChunkedIteratorResult
+from pydantic import BaseModel
+from sqlalchemy import select, tuple_
+from sqlalchemy.engine import ChunkedIteratorResult, Row
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, joinedload, subqueryload, raiseload, noload
+from sqlalchemy.orm.strategy_options import Load
 from sqlalchemy.sql import Select, Delete
 
+from common.types import KeysetPageType
+from common.utils import KeysetCursor, BaseKeysetCursor
+
+
+class LoadStrategies(str, enum.Enum):
+    SELECTIN = 'selectin'
+    JOINED = 'joined'
+    SUBQUERY = 'subquery'
+    RAISE = 'raise'
+    NOLOAD = 'noload'
+
+
+LOADERS = {
+    LoadStrategies.SELECTIN: selectinload,
+    LoadStrategies.JOINED: joinedload,
+    LoadStrategies.SUBQUERY: subqueryload,
+    LoadStrategies.RAISE: raiseload,
+    LoadStrategies.NOLOAD: noload,
+}
+
+# Relationship path -> strategy, e.g. {"appeal_theme.department": LoadStrategies.JOINED, "*": LoadStrategies.RAISE}.
+# "*" applies to every relationship of `model` that the plan does not mention. The parents of a dotted path are
+# loaded too: with their own entry when the plan has one, otherwise like the path (`SELECTIN` if it does not load).
+LoadingPlan = Dict[str, LoadStrategies]
+
+EAGER_STRATEGIES = (LoadStrategies.SELECTIN, LoadStrategies.JOINED, LoadStrategies.SUBQUERY)
+
 
 class BaseRepository(ABC):
     db: AsyncSession
@@ -13,8 +44,87 @@ class BaseRepository(ABC):
     def __init__(self, db: AsyncSession):
         self.db = db
 
+    def loader_options(self, plan: LoadingPlan) -> List[Load]:
+        options = []
+        for path, strategy in plan.items():
+            strategy = LoadStrategies(strategy)
+            loader = LOADERS[strategy]
+            if path == "*":
+                options.append(loader("*"))
+                continue
+
+            entity, option = self.model, None
+            *parents, name = path.split(".")
+            for depth, parent in enumerate(parents, start=1):
+                # `defaultload` would leave the parent to "*", which may be `RAISE`.
+                parent_strategy = LoadStrategies(plan.get(".".join(parents[:depth]),
+                                                          strategy if strategy in EAGER_STRATEGIES
+                                                          else LoadStrategies.SELECTIN))
+                parent_loader = LOADERS[parent_strategy]
+                attribute = getattr(entity, parent)
+                option = getattr(option, parent_loader.__name__)(attribute) if option else parent_loader(attribute)
+                entity = attribute.property.mapper.class_
+            attribute = getattr(entity, name)
+            options.append(getattr(option, loader.__name__)(attribute) if option else loader(attribute))
+        return options
+
     async def exec_query(self, query: Union[Select, Delete]) -> ChunkedIteratorResult:
         return await self.db.execute(query)
 
     def select(self, *args) -> Select:
         return select(*args)
+
+    async def stream_partitions(self, query: Select, size: int = 1000) -> AsyncIterator[List[Row]]:
+        """Reads `query` through a server-side cursor, holding at most `size` rows in memory."""
+        result = await self.db.stream(query)
+        async for partition in result.partitions(size):
+            yield partition
+
+    def select_projection(self, entity: Type[BaseModel], *extra_columns) -> Select:
+        """
+        Selects only the `self.model` columns declared by `entity`.
+        Rows come back as plain tuples, skipping ORM identity map and instance construction.
+        """
+        table_columns = self.model.__table__.columns
+        columns = [table_columns[name] for name in entity.__fields__ if name in table_columns]
+        return select(*columns, *extra_columns)
+
+    async def paginate_keyset(self, query: Select,
+                              cursor: Optional[BaseKeysetCursor],
+                              per_page: int,
+                              scalars: bool = True,
+                              keys: Optional[List] = None,
+                              cursor_type: Type[BaseKeysetCursor] = KeysetCursor) -> KeysetPageType:
+        """
+        Descending keyset pagination of `query`, by default newest first over `(created_at, id)` of `self.model`.
+        Only `per_page + 1` rows are fetched, the extra one tells whether there is a page after this one.
+        Projected queries pass `scalars=False` and must select columns named as `cursor_type.key_fields`.
+        """
+        keys = keys if keys is not None else [self.model.created_at, self.model.id]
+        keyset = tuple_(*keys)
+        is_prev = bool(cursor and cursor.is_prev)
+        if cursor:
+            position = tuple_(*cursor.values)
+            query = query.where(keyset > position if is_prev else keyset < position)
+
+        if is_prev:
+            query = query.order_by(*[key.asc() for key in keys])
+        else:
+            query = query.order_by(*[key.desc() for key in keys])
+
+        result = await self.exec_query(query.limit(per_page + 1))
+        rows = result.scalars().fetchall() if scalars else result.fetchall()
+        has_more = len(rows) > per_page
+        items = rows[:per_page]
+        if is_prev:
+            items.reverse()
+
+        page = KeysetPageType(items=items)
+        if not items:
+            return page
+
+        if has_more or is_prev:
+            page.next_cursor = cursor_type.from_instance(items[-1])
+        if (has_more and is_prev) or (cursor and not is_prev):
+            page.prev_cursor = cursor_type.from_instance(items[0], is_prev=True)
+        return page
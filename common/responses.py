@@ -0,0 +1,152 @@
+import os
+import re
+from email.utils import formatdate
+from mimetypes import guess_type
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Scope, Receive, Send
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive `(start, end)` of a single `bytes=` range, `None` when the whole file should be sent.
+    Multiple ranges are answered with the whole file, which RFC 7233 allows. Raises `ValueError` when the range
+    can not be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        suffix = int(end)
+        if suffix == 0 or size == 0:
+            raise ValueError(header)
+        return max(size - suffix, 0), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _opaque_tag(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Weak comparison of an `If-None-Match` list against `etag`."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque_tag(etag) in (_opaque_tag(tag) for tag in header.split(","))
+
+
+def etag_strongly_matches(header: Optional[str], etag: str) -> bool:
+    """
+    Strong comparison of the single `If-Range` validator against `etag` (RFC 7233 3.2): a weak tag on either side
+    never matches, neither does a date, which is not compared.
+    """
+    if not header:
+        return False
+    header, etag = header.strip(), etag.strip()
+    return not header.startswith("W/") and not etag.startswith("W/") and header == etag
+
+
+class RangeFileResponse(Response):
+    """
+    Sends a file from disk honouring `Range`, `If-Range` and `If-None-Match`.
+    The body goes through the ASGI `http.response.zerocopysend` extension (sendfile) when the server offers it,
+    otherwise it is read in `chunk_size` pieces off the event loop.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: str, stat_result: os.stat_result, request_headers: Headers, etag: str,
+                 method: str = "GET", cache_control: str = IMMUTABLE_CACHE_CONTROL, media_type: str = None):
+        self.path = path
+        self.background = None
+        self.media_type = media_type or guess_type(path)[0] or "application/octet-stream"
+        self.send_header_only = method.upper() == "HEAD"
+        self.offset, self.count = 0, 0
+        size = stat_result.st_size
+
+        headers = {
+            "etag": etag,
+            "cache-control": cache_control,
+            "accept-ranges": "bytes",
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        }
+        if etag_matches(request_headers.get("if-none-match"), etag):
+            self.status_code = 304
+            self.init_headers(headers)
+            self.send_header_only = True
+            return
+
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if if_range and not etag_strongly_matches(if_range, etag):
+            range_header = None
+
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            self.status_code = 416
+            headers["content-range"] = f"bytes */{size}"
+            headers["content-length"] = "0"
+            self.init_headers(headers)
+            self.send_header_only = True
+            return
+
+        if byte_range is None:
+            self.status_code = 200
+            self.offset, self.count = 0, size
+        else:
+            start, end = byte_range
+            self.status_code = 206
+            self.offset, self.count = start, end - start + 1
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+        headers["content-length"] = str(self.count)
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only or not self.count:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.wrapped.fileno(),
+                    "offset": self.offset,
+                    "count": self.count,
+                    "more_body": False,
+                })
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.offset)
+            remaining = self.count
+            while remaining:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": bool(remaining)})
+            if remaining:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
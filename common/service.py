@@ -1,13 +1,16 @@
+import hashlib
 import os
 import uuid
 from abc import ABC
-from typing import IO, Optional
+from typing import IO, Optional, AsyncIterator, Iterable, Set
 
-import aiofiles
 from slugify import slugify
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
-from grazhdane import config
+from common.errors import ValidationError
+from common.images import IMAGE_VARIANTS, variant_name
+from common.storage import StorageBackend, get_storage_backend, MB
 
 
 class BaseService(ABC):
@@ -32,6 +35,15 @@ class FileFormatService:
         AUDIO_FORMAT: ['mp3', 'cdr', 'mpga'],
     }
 
+    MAX_SIZES = {
+        VIDEO_FORMAT: 500 * MB,
+        IMAGE_FORMAT: 20 * MB,
+        ICON_FORMAT: 1 * MB,
+        DOCUMENT_FORMAT: 50 * MB,
+        AUDIO_FORMAT: 100 * MB,
+    }
+    DEFAULT_MAX_SIZE = 20 * MB
+
     def is_video(self, file_format: str):
         return file_format in self.FORMATS[self.VIDEO_FORMAT] or file_format == self.VIDEO_FORMAT
 
@@ -43,14 +55,23 @@ class FileFormatService:
 
         return None
 
+    def get_max_size(self, file_type: Optional[str]) -> int:
+        return self.MAX_SIZES.get(file_type, self.DEFAULT_MAX_SIZE)
+
 
 class AttachmentStorage:
+    CHUNK_SIZE = 1 * MB
+
     _file_type = None
+    name: Optional[str] = None
+    checksum: Optional[str] = None
+    size: int = 0
 
-    def __init__(self, file: IO, filename: str, dir_name: str):
+    def __init__(self, file: IO, filename: str, dir_name: str, backend: Optional[StorageBackend] = None):
         self.file = file
         self._filename = filename
         self.dir_name = dir_name
+        self.backend = backend or get_storage_backend()
 
     @property
     def file_type(self) -> str:
@@ -68,9 +89,100 @@ class AttachmentStorage:
         new_filename = slugify(f"{str(uuid.uuid4())}_{self._filename.replace(ext, '')}") + f".{ext}"
         return new_filename
 
+    async def _read_chunks(self) -> AsyncIterator[bytes]:
+        """Reads the upload in `CHUNK_SIZE` pieces in the threadpool, rejecting files over their format limit."""
+        max_size = FileFormatService().get_max_size(self.file_type)
+        size = 0
+        while chunk := await run_in_threadpool(self.file.read, self.CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                raise ValidationError(detail={"file": f"{self._filename} exceeds {max_size // MB} MB"})
+            yield chunk
+
+    async def _hashed_chunks(self) -> AsyncIterator[bytes]:
+        digest = hashlib.sha256()
+        size = 0
+        async for chunk in self._read_chunks():
+            size += len(chunk)
+            digest.update(chunk)
+            yield chunk
+
+        self.checksum = digest.hexdigest()
+        self.size = size
+
+    async def read(self) -> bytes:
+        """The whole upload again, after it was stored. Meant for files small enough to process in memory."""
+        await run_in_threadpool(self.file.seek, 0)
+        return await run_in_threadpool(self.file.read)
+
+    async def store(self):
+        """
+        Streams the upload to the storage backend chunk by chunk, so memory use does not depend on the file size.
+        The sha256 `checksum` and `size` are computed along the way, a file over its format limit is rejected.
+        """
+        name = os.path.join(self.dir_name, self.filename)
+        await self.backend.save(name, self._hashed_chunks())
+
+        self.name = name
+        return self.backend.url(name)
+
+    async def remove(self):
+        if self.name:
+            await self.backend.delete(self.name)
+            self.name = None
+
+    @classmethod
+    async def release(cls, links: Iterable[str], referenced_links: Set[str],
+                      backend: Optional[StorageBackend] = None) -> int:
+        """
+        Deletes the files of `links` which are no longer in `referenced_links` together with their image variants,
+        returns the number of files removed. Call it after commit, with the links of deleted attachments.
+        """
+        backend = backend or get_storage_backend()
+        removed = 0
+        for link in set(links) - referenced_links:
+            name = backend.name_of(link)
+            if not name:
+                continue
+            for variant in IMAGE_VARIANTS:
+                await backend.delete(variant_name(name, variant))
+            await backend.delete(name)
+            removed += 1
+        return removed
+
+
+class ContentAddressedStorage(AttachmentStorage):
+    """
+    Keeps a single copy of every distinct content under `cas/<sha256[:2]>/<sha256>.<ext>`.
+    The upload is hashed first and only written when no blob with that digest exists, so identical uploads
+    cost one write. Blobs are shared between attachments: one is deleted by `release` once no
+    `attachments` row links to it any more. Callers reusing a blob lock its link until commit, see
+    `AttachmentRepository.lock_links`.
+    """
+    DIR_NAME = "cas"
+
+    def __init__(self, file: IO, filename: str, dir_name: str = DIR_NAME, backend: Optional[StorageBackend] = None):
+        super().__init__(file=file, filename=filename, dir_name=self.DIR_NAME, backend=backend)
+
+    @classmethod
+    def blob_name(cls, checksum: str, ext: str) -> str:
+        return os.path.join(cls.DIR_NAME, checksum[:2], f"{checksum}.{ext.lower()}")
+
+    async def hash(self) -> str:
+        """Computes `checksum` once, without writing anything, returns the name of the blob for the content."""
+        if self.checksum is None:
+            async for _ in self._hashed_chunks():
+                pass
+            await run_in_threadpool(self.file.seek, 0)
+        return self.blob_name(self.checksum, ext=self._filename.split(".")[-1])
+
     async def store(self):
-        filename = self.filename
-        async with aiofiles.open(os.path.join(config.STORAGE_ROOT, self.dir_name, filename), mode='wb') as f:
-            await f.write(self.file.read())
+        name = await self.hash()
+        if not await self.backend.exists(name):
+            await self.backend.save(name, self._read_chunks())
+
+        self.name = name
+        return self.backend.url(name)
 
-        return os.path.join(config.STORAGE_URL, self.dir_name, filename)
+    async def remove(self):
+        """A blob may already be linked by another attachment, unreferenced ones are left to `release`."""
@@ -0,0 +1,275 @@
+import asyncio
+import os
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import AsyncExitStack
+from typing import AsyncIterable, Optional, Union, AsyncIterator, List, NamedTuple
+
+import aiofiles
+import aiofiles.os
+from aiobotocore.session import get_session
+from botocore.exceptions import ClientError
+from starlette.concurrency import run_in_threadpool
+
+from grazhdane import config
+
+MB = 1024 * 1024
+
+Content = Union[bytes, AsyncIterable[bytes]]
+
+
+class StoredFile(NamedTuple):
+    name: str
+    size: int
+    modified_at: float
+
+
+async def _iter_content(content: Content) -> AsyncIterable[bytes]:
+    if isinstance(content, bytes):
+        yield content
+        return
+    async for chunk in content:
+        yield chunk
+
+
+class StorageBackend(ABC):
+    """
+    Where uploaded files live. Files are addressed by a `name` relative to the storage root (`appeals/x.jpg`),
+    `url` turns it into the public link kept in the database and `name_of` turns a link back into a name.
+    """
+    base_url: str
+
+    @abstractmethod
+    async def save(self, name: str, content: Content) -> int:
+        """Stores `content` atomically under `name`, returns the number of bytes written."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def read(self, name: str) -> bytes:
+        """The whole content of `name`. Meant for files small enough to process in memory."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def exists(self, name: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, name: str) -> None:
+        """Deletes `name`, a missing file is not an error."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def iterate(self) -> AsyncIterator[StoredFile]:
+        """Every stored file, ordered by name in code point order (what `sorted` and `COLLATE "C"` give)."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+    def url(self, name: str) -> str:
+        return self.base_url.rstrip("/") + "/" + name
+
+    def name_of(self, link: str) -> Optional[str]:
+        prefix = self.base_url.rstrip("/") + "/"
+        if not link.startswith(prefix):
+            return None
+        return link[len(prefix):]
+
+    def local_path(self, name: str) -> Optional[str]:
+        """Path of `name` on the local disk, `None` when the backend keeps files elsewhere."""
+        return None
+
+
+class LocalStorageBackend(StorageBackend):
+    def __init__(self, root: str = config.STORAGE_ROOT, base_url: str = config.STORAGE_URL):
+        self.root = root
+        self.base_url = base_url
+
+    def local_path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    async def save(self, name: str, content: Content) -> int:
+        path = self.local_path(name)
+        await run_in_threadpool(os.makedirs, os.path.dirname(path), exist_ok=True)
+        # Written aside and renamed, so readers never see a partial file.
+        part_path = f"{path}.{uuid.uuid4()}.part"
+        size = 0
+        try:
+            async with aiofiles.open(part_path, mode='wb') as f:
+                async for chunk in _iter_content(content):
+                    size += len(chunk)
+                    await f.write(chunk)
+            await run_in_threadpool(os.replace, part_path, path)
+        except BaseException:
+            await self.delete(os.path.relpath(part_path, self.root))
+            raise
+        return size
+
+    async def read(self, name: str) -> bytes:
+        async with aiofiles.open(self.local_path(name), mode='rb') as f:
+            return await f.read()
+
+    async def exists(self, name: str) -> bool:
+        return await run_in_threadpool(os.path.exists, self.local_path(name))
+
+    async def delete(self, name: str) -> None:
+        try:
+            await aiofiles.os.remove(self.local_path(name))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _scan(directory: str) -> List[os.DirEntry]:
+        try:
+            with os.scandir(directory) as entries:
+                # A directory sorts as `name/`, so a depth first walk yields the full names in order.
+                return sorted(entries, key=lambda entry: entry.name + "/" if entry.is_dir() else entry.name)
+        except FileNotFoundError:
+            return []
+
+    async def iterate(self, prefix: str = "") -> AsyncIterator[StoredFile]:
+        """Walks one directory listing at a time, so memory is bounded by the largest directory."""
+        for entry in await run_in_threadpool(self._scan, os.path.join(self.root, prefix)):
+            name = prefix + entry.name
+            if entry.is_dir():
+                async for stored_file in self.iterate(prefix=name + "/"):
+                    yield stored_file
+            else:
+                stat_result = await run_in_threadpool(entry.stat)
+                yield StoredFile(name=name, size=stat_result.st_size, modified_at=stat_result.st_mtime)
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    S3 compatible object storage (AWS, MinIO, moto). Content is sent with a multipart upload in `PART_SIZE`
+    parts, so nothing bigger than a part is held in memory, small files go with a single `PutObject`.
+    """
+    PART_SIZE = 8 * MB
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: Optional[str] = None,
+                 access_key: Optional[str] = None, secret_key: Optional[str] = None,
+                 base_url: Optional[str] = None):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.base_url = base_url or f"{endpoint_url or 'https://s3.amazonaws.com'}/{bucket}"
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._client = None
+        # Made on first use, so it belongs to the loop the backend is used in.
+        self._client_lock: Optional[asyncio.Lock] = None
+
+    async def _get_client(self):
+        """The shared client, created once even when the first calls run concurrently."""
+        if self._client is None:
+            if self._client_lock is None:
+                self._client_lock = asyncio.Lock()
+            async with self._client_lock:
+                if self._client is None:
+                    exit_stack = AsyncExitStack()
+                    self._client = await exit_stack.enter_async_context(get_session().create_client(
+                        's3',
+                        endpoint_url=self.endpoint_url,
+                        region_name=self.region,
+                        aws_access_key_id=self.access_key,
+                        aws_secret_access_key=self.secret_key,
+                    ))
+                    self._exit_stack = exit_stack
+        return self._client
+
+    async def close(self) -> None:
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._exit_stack = None
+            self._client = None
+
+    async def save(self, name: str, content: Content) -> int:
+        client = await self._get_client()
+        buffer = bytearray()
+        size = 0
+        upload_id = None
+        parts = []
+        try:
+            async for chunk in _iter_content(content):
+                size += len(chunk)
+                buffer.extend(chunk)
+                while len(buffer) >= self.PART_SIZE:
+                    if upload_id is None:
+                        upload = await client.create_multipart_upload(Bucket=self.bucket, Key=name)
+                        upload_id = upload["UploadId"]
+                    part_number = len(parts) + 1
+                    part = await client.upload_part(Bucket=self.bucket, Key=name, UploadId=upload_id,
+                                                    PartNumber=part_number, Body=bytes(buffer[:self.PART_SIZE]))
+                    parts.append({"ETag": part["ETag"], "PartNumber": part_number})
+                    del buffer[:self.PART_SIZE]
+
+            if upload_id is None:
+                await client.put_object(Bucket=self.bucket, Key=name, Body=bytes(buffer))
+                return size
+
+            if buffer:
+                part_number = len(parts) + 1
+                part = await client.upload_part(Bucket=self.bucket, Key=name, UploadId=upload_id,
+                                                PartNumber=part_number, Body=bytes(buffer))
+                parts.append({"ETag": part["ETag"], "PartNumber": part_number})
+            await client.complete_multipart_upload(Bucket=self.bucket, Key=name, UploadId=upload_id,
+                                                   MultipartUpload={"Parts": parts})
+        except BaseException:
+            if upload_id is not None:
+                await client.abort_multipart_upload(Bucket=self.bucket, Key=name, UploadId=upload_id)
+            raise
+        return size
+
+    async def read(self, name: str) -> bytes:
+        client = await self._get_client()
+        response = await client.get_object(Bucket=self.bucket, Key=name)
+        async with response["Body"] as body:
+            return await body.read()
+
+    async def exists(self, name: str) -> bool:
+        client = await self._get_client()
+        try:
+            await client.head_object(Bucket=self.bucket, Key=name)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    async def delete(self, name: str) -> None:
+        client = await self._get_client()
+        await client.delete_object(Bucket=self.bucket, Key=name)
+
+    async def iterate(self) -> AsyncIterator[StoredFile]:
+        """`ListObjectsV2` pages, S3 returns keys in UTF-8 binary order."""
+        client = await self._get_client()
+        async for page in client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket):
+            for item in page.get("Contents", []):
+                yield StoredFile(name=item["Key"], size=item["Size"], modified_at=item["LastModified"].timestamp())
+
+
+_backend: Optional[StorageBackend] = None
+
+
+def get_storage_backend() -> StorageBackend:
+    """The backend chosen by `STORAGE_BACKEND` (`local` or `s3`), shared by the whole process."""
+    global _backend
+    if _backend is None:
+        if os.environ.get("STORAGE_BACKEND", "local") == "s3":
+            _backend = S3StorageBackend(bucket=os.environ["S3_BUCKET"],
+                                        endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None,
+                                        region=os.environ.get("S3_REGION") or None,
+                                        access_key=os.environ.get("S3_ACCESS_KEY") or None,
+                                        secret_key=os.environ.get("S3_SECRET_KEY") or None,
+                                        base_url=os.environ.get("S3_PUBLIC_URL") or None)
+        else:
+            _backend = LocalStorageBackend()
+    return _backend
+
+
+async def close_storage_backend():
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
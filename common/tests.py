@@ -0,0 +1,69 @@
+import logging
+import os
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import create_engine, text
+from starlette.datastructures import Headers
+
+from common.query_counter import QueryCounter, QueryCounterMiddleware
+from common.responses import etag_matches, etag_strongly_matches, RangeFileResponse
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_query_counter_n_plus_one(caplog):
+    engine = create_engine("sqlite://")
+    counter = QueryCounter(n_plus_one_threshold=3, max_queries=4)
+    counter.install(engine)
+
+    app = FastAPI()
+    app.add_middleware(QueryCounterMiddleware, counter=counter)
+
+    @app.get("/items/{item_id}")
+    def items(item_id: int, times: int):
+        with engine.connect() as conn:
+            for _ in range(times):
+                conn.execute(text("SELECT 1"))
+        return {}
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        with caplog.at_level(logging.WARNING, logger="common.query_counter"):
+            await client.get("/items/1", params={"times": 2})
+            assert not caplog.records
+            await client.get("/items/2", params={"times": 5})
+
+    assert counter.routes["GET /items/{item_id}"] == {"requests": 2, "queries": 7, "max_queries": 5, "n_plus_one": 1}
+    messages = [record.getMessage() for record in caplog.records]
+    assert any("Possible N+1 on GET /items/{item_id}: statement executed 5 times" in message for message in messages)
+    assert "GET /items/{item_id} executed 5 SQL statements" in messages
+
+    with caplog.at_level(logging.INFO, logger="common.query_counter"):
+        counter.log_summary()
+    assert "GET /items/{item_id}: 2 requests, 3.5 statements per request" in caplog.records[-1].getMessage()
+
+
+async def test_if_range_strong_comparison():
+    assert etag_strongly_matches('"abc"', '"abc"')
+    assert not etag_strongly_matches('W/"abc"', '"abc"')
+    assert not etag_strongly_matches('"abc"', 'W/"abc"')
+    assert not etag_strongly_matches("Wed, 21 Oct 2015 07:28:00 GMT", '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+
+
+async def test_range_file_response_zerocopysend(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"0123456789")
+    response = RangeFileResponse(str(path), stat_result=os.stat(path), etag='"v1"',
+                                 request_headers=Headers({"range": "bytes=2-5", "if-range": '"v1"'}))
+    messages = []
+
+    async def send(message):
+        if message["type"] == "http.response.zerocopysend":
+            message = {**message, "content": os.pread(message["file"], message["count"], message["offset"])}
+        messages.append(message)
+
+    await response({"type": "http", "extensions": {"http.response.zerocopysend": {}}}, None, send)
+    assert messages[0]["status"] == 206
+    assert messages[1]["content"] == b"2345"
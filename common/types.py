@@ -1,8 +1,24 @@
-from dataclasses import dataclass
-from typing import IO
+from dataclasses import dataclass, field
+from typing import IO, List, Any, Optional
 
 
 @dataclass
 class UploadedFileType:
     filename: str
     file: IO
+
+
+@dataclass
+class KeysetPageType:
+    items: List[Any] = field(default_factory=list)
+    next_cursor: Optional[Any] = None
+    prev_cursor: Optional[Any] = None
+
+
+@dataclass
+class StorageGCReportType:
+    scanned: int = 0
+    referenced: int = 0
+    deleted: int = 0
+    reclaimed_bytes: int = 0
+    dry_run: bool = False
@@ -1,7 +1,14 @@
+import base64
+from datetime import datetime
+from typing import TypeVar, Generic, List, Optional, Sequence, ClassVar, Tuple, Any, Type
+
+from fastapi import Query
+from fastapi_pagination.bases import AbstractPage, AbstractParams, RawParams
 from fastapi_pagination.default import Page
+from pydantic import BaseModel, conint
 from sqlalchemy import Column
-from typing import TypeVar, Generic, List
 
+from common.errors import ValidationError
 from grazhdane.models import BaseORMModel
 
 T = TypeVar("T")
@@ -15,6 +22,84 @@ class JsonApiPage(Page[T], Generic[T]):
         fields = {"items": {"alias": "data"}, "size": {"alias": "per_page"}}
 
 
+class BaseKeysetCursor(BaseModel):
+    """Position of a row in a keyset ordering, passed to clients as an opaque string."""
+
+    key_fields: ClassVar[Tuple[str, ...]] = ()
+    is_prev: bool = False
+
+    @classmethod
+    def from_instance(cls, instance: Any, is_prev: bool = False) -> 'BaseKeysetCursor':
+        return cls(is_prev=is_prev, **{field: getattr(instance, field) for field in cls.key_fields})
+
+    @property
+    def values(self) -> Tuple:
+        return tuple(getattr(self, field) for field in self.key_fields)
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(self.json().encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, cursor: str) -> 'BaseKeysetCursor':
+        try:
+            return cls.parse_raw(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        except (ValueError, TypeError):
+            raise ValidationError(detail={"cursor": "Invalid cursor"})
+
+
+class KeysetCursor(BaseKeysetCursor):
+    key_fields: ClassVar[Tuple[str, ...]] = ("created_at", "id")
+    created_at: datetime
+    id: int
+
+
+class RankCursor(BaseKeysetCursor):
+    key_fields: ClassVar[Tuple[str, ...]] = ("rank", "id")
+    rank: float
+    id: int
+
+
+class CursorParams(BaseModel, AbstractParams):
+    cursor: Optional[str] = Query(None, description="Opaque cursor returned in previous page")
+    size: int = Query(50, ge=1, le=100, description="Page size")
+
+    def get_cursor(self, cursor_type: Type[BaseKeysetCursor] = KeysetCursor) -> Optional[BaseKeysetCursor]:
+        if not self.cursor:
+            return None
+        return cursor_type.decode(self.cursor)
+
+    def to_raw_params(self) -> RawParams:
+        return RawParams(limit=self.size, offset=0)
+
+
+class JsonApiCursorPage(AbstractPage[T], Generic[T]):
+    """Keyset paginated page, client follows `next_cursor` / `prev_cursor` instead of page numbers."""
+
+    items: Sequence[T]
+    size: conint(ge=1)  # type: ignore
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+
+    __params_type__ = CursorParams
+
+    @classmethod
+    def create(cls,
+               items: Sequence[T],
+               params: CursorParams,
+               next_cursor: Optional[BaseKeysetCursor] = None,
+               prev_cursor: Optional[BaseKeysetCursor] = None) -> 'JsonApiCursorPage[T]':
+        return cls(
+            items=items,
+            size=params.size,
+            next_cursor=next_cursor.encode() if next_cursor else None,
+            prev_cursor=prev_cursor.encode() if prev_cursor else None,
+        )
+
+    class Config:
+        allow_population_by_field_name = True
+        fields = {"items": {"alias": "data"}, "size": {"alias": "per_page"}}
+
+
 class SetupModelAttributes:
     def __init__(self, instance: BaseORMModel, data: dict, fields: List[Column] = ()):
         self.instance = instance
@@ -7,6 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from grazhdane.app import app
 from grazhdane.database import async_session
+from users.cache import authenticated_user_cache, verified_token_cache
 from users.models import User
 from users.types import JwtData
 from users.usecases import AuthUseCase
@@ -19,6 +20,12 @@ def event_loop():
     loop.close()
 
 
+@pytest.fixture(autouse=True)
+def clear_auth_caches():
+    authenticated_user_cache.clear()
+    verified_token_cache.clear()
+
+
 @pytest.fixture
 async def db():
     async with async_session() as session:
@@ -1,10 +1,19 @@
 import logging
+import os
 
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi_pagination import add_pagination
+from fastapi_utils.tasks import repeat_every
 
+from appeals.jobs import purge_expired_uploads
+from common.images import shutdown_executor
+from common.query_counter import QueryCounter, QueryCounterMiddleware
+from common.storage import close_storage_backend
+from grazhdane.database import engine
 from grazhdane.router import main_router
+from users.jobs import refresh_token_revocations
+from users.passwords import shutdown_executor as shutdown_password_hash_workers
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -13,6 +22,44 @@ app = FastAPI()
 app.include_router(main_router)
 add_pagination(app)
 
+if os.environ.get("DETECT_N_PLUS_ONE", "").lower() in ("1", "true"):
+    query_counter = QueryCounter()
+    query_counter.install(engine.sync_engine)
+    app.add_middleware(QueryCounterMiddleware, counter=query_counter)
+    app.add_event_handler("shutdown", query_counter.log_summary)
+
+# Jobs here run in every worker. The appeal stats reconcile locks out appeal writes while it aggregates and
+# the storage GC walks the whole storage, so they run from one place instead, e.g. cron:
+# `python -m appeals.jobs` and `python -m users.jobs`.
+
+
+@app.on_event("startup")
+@repeat_every(seconds=int(os.environ.get("APPEAL_UPLOADS_PURGE_SECONDS", 3600)), wait_first=True, logger=logger)
+async def purge_expired_uploads_job():
+    await purge_expired_uploads()
+
+
+@app.on_event("startup")
+@repeat_every(seconds=int(os.environ.get("TOKEN_REVOCATIONS_REFRESH_SECONDS", 30)), logger=logger)
+async def refresh_token_revocations_job():
+    await refresh_token_revocations()
+
+
+@app.on_event("shutdown")
+async def shutdown_image_workers():
+    shutdown_executor()
+
+
+@app.on_event("shutdown")
+async def shutdown_password_hashing():
+    shutdown_password_hash_workers()
+
+
+@app.on_event("shutdown")
+async def shutdown_storage_backend():
+    await close_storage_backend()
+
+
 APPLICATIONS = [
     'common',
     'users',
@@ -6,3 +6,4 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
 STORAGE_ROOT = os.path.join(MEDIA_ROOT, "storage")
 STORAGE_URL = "/media/storage/"
+UPLOADS_ROOT = os.path.join(MEDIA_ROOT, "uploads")
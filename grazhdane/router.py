@@ -1,8 +1,13 @@
 from fastapi import APIRouter
 
+from appeals.handlers.appeal_upload_handlers import appeal_uploads_router
 from appeals.handlers.user_appeal_handlers import user_appeals_router
+from common.handlers import storage_router
+from grazhdane import config
 from users.handlers import users_router
 
 main_router = APIRouter()
 main_router.include_router(users_router, prefix="/users", tags=["users"])
+main_router.include_router(appeal_uploads_router, prefix="/appeals/uploads", tags=["appeals"])
 main_router.include_router(user_appeals_router, prefix="/appeals", tags=["appeals"])
+main_router.include_router(storage_router, prefix=config.STORAGE_URL.rstrip("/"), tags=["storage"])
@@ -12,6 +12,14 @@ class Point:
         self._lng = lng
         self._alt = alt
 
+    @property
+    def lat(self) -> float:
+        return float(self._lat)
+
+    @property
+    def lng(self) -> float:
+        return float(self._lng)
+
     def is_3d(self):
         return bool(self._alt)
 
@@ -0,0 +1,59 @@
+import copy
+import os
+from typing import Optional, Dict, Any
+
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from common.cache import TTLCache
+from users.models import User
+
+
+class AuthenticatedUserCache:
+    """
+    Users resolved by `get_authenticated_user`, keyed by id. Only column values are kept: on a hit a copy is merged
+    into the request session with `load=False`, so it behaves like a freshly loaded row without a query.
+    Use cases changing a user call `invalidate`, other processes see the change once the entry expires.
+    """
+
+    def __init__(self, cache: TTLCache):
+        self.cache = cache
+
+    @staticmethod
+    def _values(user: User) -> Dict[str, Any]:
+        return {attr.key: copy.deepcopy(getattr(user, attr.key)) for attr in inspect(User).column_attrs}
+
+    async def get(self, db: AsyncSession, user_id: int) -> Optional[User]:
+        values = self.cache.get(user_id)
+        if values is None:
+            return None
+
+        user = User(**copy.deepcopy(values))
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+    def set(self, user: User) -> None:
+        self.cache.set(user.id, self._values(user))
+
+    def invalidate(self, *user_ids: int) -> None:
+        for user_id in user_ids:
+            self.cache.delete(user_id)
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return self.cache.stats()
+
+
+authenticated_user_cache = AuthenticatedUserCache(TTLCache(
+    maxsize=int(os.environ.get("AUTH_USER_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("AUTH_USER_CACHE_TTL", 60)),
+))
+
+# Token digest -> decoded claims, entries never outlive the token `exp`.
+verified_token_cache = TTLCache(
+    maxsize=int(os.environ.get("JWT_CACHE_SIZE", 10000)),
+    ttl=float(os.environ.get("JWT_CACHE_TTL", 300)),
+)
@@ -1,33 +1,66 @@
+import copy
+import hashlib
 import os
-from typing import List
+import time
+from typing import List, Union
 
-from fastapi import HTTPException, Depends, Request
+from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from grazhdane.database import get_async_db
+from users.cache import authenticated_user_cache, verified_token_cache
 from users.models import User, UserRoles
 from users.repository.user_repository import UserRepository
+from users.revocations import token_revocations
 from users.types import JwtData
 
 security = HTTPBearer()
 
 
-async def get_authenticated_user(credentials: HTTPAuthorizationCredentials = Depends(security),
-                                 db: AsyncSession = Depends(get_async_db)):
-    jwt_token = credentials.credentials
+def _decode_token(token: str) -> JwtData:
+    """
+    `jwt.decode` with the result cached by token digest until `exp`, a session repeats the same token.
+    Callers get a deep copy, changing the claims or their `roles` list does not touch the cached ones.
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    claims = verified_token_cache.get(digest)
+    if claims is not None:
+        return copy.deepcopy(claims)
+
+    claims = jwt.decode(token, key=os.environ.get("SECRET_KEY"), algorithms=os.environ.get("ALGORITHM"))
+    ttl = min(claims["exp"] - time.time(), verified_token_cache.ttl) if "exp" in claims else verified_token_cache.ttl
+    if ttl > 0:
+        verified_token_cache.set(digest, claims, ttl=ttl)
+    return copy.deepcopy(claims)
+
+
+async def get_token_claims(credentials: HTTPAuthorizationCredentials = Depends(security)) -> JwtData:
     try:
-        decoded_jwt: JwtData = jwt.decode(jwt_token,
-                                          key=os.environ.get("SECRET_KEY"),
-                                          algorithms=os.environ.get("ALGORITHM"))
-        user = await UserRepository(db=db).get_by_id(pk=decoded_jwt.get('user_id'))
-        if not user:
-            raise JWTError("Undefined user")
-        return user
+        claims = _decode_token(credentials.credentials)
     except JWTError:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
+    # Only role claims can go stale, tokens without them are checked against the user row.
+    if "roles" in claims and token_revocations.is_revoked(claims.get("user_id"), claims.get("iat")):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return claims
+
+
+async def get_authenticated_user(claims: JwtData = Depends(get_token_claims),
+                                 db: AsyncSession = Depends(get_async_db)):
+    user_id = claims.get('user_id')
+    user = await authenticated_user_cache.get(db=db, user_id=user_id)
+    if user:
+        return user
+
+    user = await UserRepository(db=db).get_by_id(pk=user_id)
+    if not user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    authenticated_user_cache.set(user)
+    return user
+
 
 async def get_admin_authenticated_user(auth_user: User = Depends(get_authenticated_user)):
     if not auth_user.has_role(UserRoles.ADMIN_ROLE):
@@ -37,18 +70,34 @@ async def get_admin_authenticated_user(auth_user: User = Depends(get_authenticat
 
 
 class HTTPHeaderAuthentication:
-    def __init__(self, *, scopes: List[UserRoles] = None):
+    """
+    Checks the user has one of `scopes`. Tokens with role claims are checked from the claims alone, with
+    `load_user=False` such a request reaches the handler without touching the database and gets the claims.
+    """
+
+    def __init__(self, *, scopes: List[UserRoles] = None, load_user: bool = True):
         self.scopes = list(set(scopes))
+        self.load_user = load_user
+
+    def _check(self, roles: List[str], is_active: bool, identity: str):
+        if not is_active:
+            raise HTTPException(status_code=401, detail=f"{identity} is not active")
+        if self.scopes and not set(self.scopes) & set(roles or []):
+            raise HTTPException(status_code=401, detail=f"{identity} is not authorized to access this endpoint")
+
+    async def __call__(self, claims: JwtData = Depends(get_token_claims),
+                       db: AsyncSession = Depends(get_async_db)) -> Union[User, JwtData]:
+        if "roles" in claims:
+            self._check(roles=claims["roles"], is_active=claims.get("is_active", True),
+                        identity=f"User {claims.get('user_id')}")
+            if not self.load_user:
+                return claims
+            return await get_authenticated_user(claims=claims, db=db)
 
-    async def __call__(self, request: Request, auth_user: User = Depends(get_authenticated_user)) -> User:
-        if not self.scopes:
-            return auth_user
-        if not auth_user.has_any_role(self.scopes):
-            raise HTTPException(
-                status_code=401, detail=f"{auth_user.email} is not authorized to access this endpoint"
-            )
-        return auth_user
+        auth_user = await get_authenticated_user(claims=claims, db=db)
+        self._check(roles=auth_user.roles, is_active=auth_user.is_active, identity=auth_user.email)
+        return auth_user if self.load_user else claims
 
 
-def get_auth_dependency(roles: List[UserRoles]) -> Depends:
-    return Depends(HTTPHeaderAuthentication(scopes=roles))
+def get_auth_dependency(roles: List[UserRoles], load_user: bool = True) -> Depends:
+    return Depends(HTTPHeaderAuthentication(scopes=roles, load_user=load_user))
@@ -5,10 +5,11 @@ from fastapi_utils.cbv import cbv
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from grazhdane.database import get_async_db
+from users.cache import authenticated_user_cache
 from users.dependencies import get_authenticated_user, get_auth_dependency
 from users.entities import UserEntity
 from users.models import UserRoles
-from users.resources import AuthUserOutResource, UserOutResource
+from users.resources import AuthUserOutResource, UserOutResource, CacheStatsOutResource
 from users.usecases import (
     AuthUseCase, RegisterData, LoginData, CityHeadSetupUC, CityHeadSetupData, AddControlUserData,
     AddControlUserUC, AddEmployeeUserData, AddEmployeeUserUC, UpdateUserAvatarUC, UpdateUserAvatarData, ActivateUserUC,
@@ -47,7 +48,8 @@ class UserHandler:
         }
 
     @users_router.post("/set/city-head", response_model=UserOutResource)
-    async def set_city_head(self, data: CityHeadSetupData, admin_user=get_auth_dependency([UserRoles.ADMIN_ROLE])):
+    async def set_city_head(self, data: CityHeadSetupData,
+                            admin_user=get_auth_dependency([UserRoles.ADMIN_ROLE], load_user=False)):
         user = await CityHeadSetupUC(db=self.db, data=data).exec()
 
         return {
@@ -55,7 +57,8 @@ class UserHandler:
         }
 
     @users_router.post("/add/control-user", response_model=UserOutResource)
-    async def add_control_user(self, data: AddControlUserData, admin_user=get_auth_dependency([UserRoles.ADMIN_ROLE])):
+    async def add_control_user(self, data: AddControlUserData,
+                               admin_user=get_auth_dependency([UserRoles.ADMIN_ROLE], load_user=False)):
         user = await AddControlUserUC(db=self.db, data=data).exec()
 
         return {
@@ -64,7 +67,7 @@ class UserHandler:
 
     @users_router.post("/add/employee-user", response_model=UserOutResource)
     async def add_employee_user(self, data: AddEmployeeUserData,
-                                admin_user=get_auth_dependency([UserRoles.ADMIN_ROLE])):
+                                admin_user=get_auth_dependency([UserRoles.ADMIN_ROLE], load_user=False)):
         user = await AddEmployeeUserUC(db=self.db, data=data).exec()
 
         return {
@@ -73,7 +76,7 @@ class UserHandler:
 
     @users_router.post("/set/employee-user", response_model=UserOutResource)
     async def set_employee_user(self, data: AddEmployeeUserData,
-                                admin_user=get_auth_dependency([UserRoles.ADMIN_ROLE])):
+                                admin_user=get_auth_dependency([UserRoles.ADMIN_ROLE], load_user=False)):
         user = await AddEmployeeUserUC(db=self.db, data=data).exec()
 
         return {
@@ -91,9 +94,16 @@ class UserHandler:
 
     @users_router.post("/activate/user/{user_id}/{is_activated}", response_model=UserOutResource)
     async def user_activate(self, user_id: int, is_activated: int,
-                            auth_user=get_auth_dependency([UserRoles.ADMIN_ROLE, UserRoles.MODERATOR_ROLE])):
+                            auth_user=get_auth_dependency([UserRoles.ADMIN_ROLE, UserRoles.MODERATOR_ROLE],
+                                                          load_user=False)):
         user = await ActivateUserUC(db=self.db, user_id=user_id, is_activated=bool(is_activated)).exec()
 
         return {
             'data': UserEntity.from_orm(user)
         }
+
+    @users_router.get("/auth-cache/stats", response_model=CacheStatsOutResource)
+    async def auth_cache_stats(self, admin_user=get_auth_dependency([UserRoles.ADMIN_ROLE], load_user=False)):
+        return {
+            'data': authenticated_user_cache.stats()
+        }
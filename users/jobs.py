@@ -0,0 +1,33 @@
+import argparse
+import asyncio
+
+from common.storage import close_storage_backend
+from common.types import StorageGCReportType
+from grazhdane.database import async_session
+from users.revocations import token_revocations
+from users.services.storage_gc_service import StorageGCService
+
+
+async def collect_storage_garbage(dry_run: bool = False) -> StorageGCReportType:
+    async with async_session() as db:
+        return await StorageGCService(db=db).collect(dry_run=dry_run)
+
+
+async def refresh_token_revocations() -> int:
+    async with async_session() as db:
+        return await token_revocations.refresh(db=db)
+
+
+async def main(dry_run: bool):
+    try:
+        report = await collect_storage_garbage(dry_run=dry_run)
+    finally:
+        await close_storage_backend()
+    print(f"scanned={report.scanned} referenced={report.referenced} deleted={report.deleted} "
+          f"reclaimed_bytes={report.reclaimed_bytes} dry_run={report.dry_run}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deletes storage files no attachment or avatar links to.")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    asyncio.run(main(dry_run=parser.parse_args().dry_run))
@@ -5,7 +5,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy_utils import EmailType
 from typing import List
 
-from grazhdane.models import TimeStampedModel
+from grazhdane.models import TimeStampedModel, BaseORMModel
 
 
 class SocialGroup(TimeStampedModel):
@@ -77,7 +77,10 @@ class User(TimeStampedModel):
 class Attachment(TimeStampedModel):
     __tablename__ = 'attachments'
 
-    link = Column(String, nullable=False)
+    link = Column(String, nullable=False, index=True)
+    checksum = Column(String(64))
+    thumbnail_link = Column(String)
+    preview_link = Column(String)
     meta = Column(String)
     name = Column(String)
     creator_id = Column(Integer, ForeignKey(User.id, ondelete="CASCADE"))
@@ -155,3 +158,11 @@ class ServiceMember(TimeStampedModel):
     email = Column(EmailType, unique=True, nullable=False)
     member_id = Column(Integer, ForeignKey(User.id, ondelete="CASCADE"), nullable=False)
     member = relationship(User, back_populates="service_members")
+
+
+class UserTokenRevocation(BaseORMModel):
+    """Tokens of `user_id` carrying role claims and issued before `revoked_at` are no longer accepted."""
+    __tablename__ = 'user_token_revocations'
+
+    user_id = Column(Integer, ForeignKey(User.id, ondelete="CASCADE"), nullable=False, unique=True)
+    revoked_at = Column(DateTime, nullable=False, index=True)
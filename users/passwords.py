@@ -0,0 +1,41 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+# One context for the process, building a `CryptContext` parses its whole configuration.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    bcrypt releases the GIL while hashing, so threads run hashes in parallel with the event loop.
+    `PASSWORD_HASH_WORKERS` caps how many CPUs a login storm can take, the other hashes wait in the queue.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=int(os.environ.get("PASSWORD_HASH_WORKERS", 2)),
+                                       thread_name_prefix="password-hash")
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), pwd_context.hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: Optional[str]) -> bool:
+    if not hashed_password:
+        return False
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), pwd_context.verify,
+                                                            plain_password, hashed_password)
@@ -0,0 +1,72 @@
+from abc import abstractmethod
+from typing import Protocol, AsyncIterator, Iterable, Set
+
+from sqlalchemy import select, union, text
+from sqlalchemy.sql import Subquery
+
+from common.repository import BaseRepository
+from users.models import Attachment, User
+
+
+class IAttachmentRepository(Protocol):
+    @abstractmethod
+    def stream_stored_links(self, prefix: str, size: int = 1000) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_stored_links(self, links: Iterable[str]) -> Set[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def lock_links(self, links: Iterable[str]) -> None:
+        raise NotImplementedError
+
+
+class AttachmentRepository(BaseRepository, IAttachmentRepository):
+    model = Attachment
+    # Keys are taken in ascending order, so two transactions locking overlapping links can not deadlock.
+    LOCK_LINKS = text("SELECT pg_advisory_xact_lock(key) FROM ("
+                      "SELECT DISTINCT hashtext(link) AS key FROM unnest(CAST(:links AS text[])) AS link ORDER BY key"
+                      ") AS keys")
+
+    @staticmethod
+    def _stored_links() -> Subquery:
+        """Every link pointing into the storage: attachments, their image variants and user avatars."""
+        return union(
+            select(Attachment.link.label("link")),
+            select(Attachment.thumbnail_link).where(Attachment.thumbnail_link.isnot(None)),
+            select(Attachment.preview_link).where(Attachment.preview_link.isnot(None)),
+            select(User.avatar).where(User.avatar.isnot(None)),
+        ).subquery()
+
+    async def stream_stored_links(self, prefix: str, size: int = 1000) -> AsyncIterator[str]:
+        """
+        Distinct links starting with `prefix`, in code point order, so they can be merged with a sorted storage
+        listing. Read through a server-side cursor.
+        """
+        links = self._stored_links()
+        query = (select(links.c.link)
+                 .where(links.c.link.startswith(prefix, autoescape=True))
+                 .order_by(links.c.link.collate("C")))
+        async for partition in self.stream_partitions(query, size=size):
+            for row in partition:
+                yield row.link
+
+    async def get_stored_links(self, links: Iterable[str]) -> Set[str]:
+        links = set(links)
+        if not links:
+            return set()
+
+        stored_links = self._stored_links()
+        query = await self.exec_query(select(stored_links.c.link).where(stored_links.c.link.in_(links)))
+        return set(query.scalars().fetchall())
+
+    async def lock_links(self, links: Iterable[str]) -> None:
+        """
+        Transaction level advisory locks on the stored files of `links`, held until commit or rollback.
+        Taken by uploads reusing a stored file and by whatever deletes one after checking nothing links to it,
+        so the check can not miss a row of a transaction that has not committed yet.
+        """
+        links = sorted(set(links))
+        if links:
+            await self.db.execute(self.LOCK_LINKS, {"links": links})
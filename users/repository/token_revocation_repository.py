@@ -0,0 +1,48 @@
+from abc import abstractmethod
+from datetime import datetime
+from typing import Protocol, List
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row
+
+from common.repository import BaseRepository
+from users.models import UserTokenRevocation
+
+
+class ITokenRevocationRepository(Protocol):
+    @abstractmethod
+    async def revoke(self, user_ids: List[int], revoked_at: datetime) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_since(self, since: datetime) -> List[Row]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_before(self, before: datetime) -> int:
+        raise NotImplementedError
+
+
+class TokenRevocationRepository(BaseRepository, ITokenRevocationRepository):
+    model = UserTokenRevocation
+
+    async def revoke(self, user_ids: List[int], revoked_at: datetime) -> None:
+        if not user_ids:
+            return
+        insert_query = insert(UserTokenRevocation).values([
+            {"user_id": user_id, "revoked_at": revoked_at} for user_id in set(user_ids)
+        ])
+        await self.exec_query(insert_query.on_conflict_do_update(
+            index_elements=[UserTokenRevocation.user_id],
+            set_={"revoked_at": insert_query.excluded.revoked_at},
+        ))
+
+    async def get_since(self, since: datetime) -> List[Row]:
+        query = await self.exec_query(select(UserTokenRevocation.user_id, UserTokenRevocation.revoked_at)
+                                      .where(UserTokenRevocation.revoked_at > since))
+        return query.fetchall()
+
+    async def delete_before(self, before: datetime) -> int:
+        query = await self.exec_query(delete(UserTokenRevocation).where(UserTokenRevocation.revoked_at <= before))
+        return query.rowcount
@@ -1,3 +1,5 @@
+from typing import Dict
+
 from pydantic import BaseModel
 
 from users.entities import UserEntity
@@ -15,3 +17,7 @@ class AuthUserOutResource(BaseModel):
 
 class UserOutResource(BaseModel):
     data: UserEntity
+
+
+class CacheStatsOutResource(BaseModel):
+    data: Dict[str, int]
@@ -0,0 +1,66 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from users.repository.token_revocation_repository import TokenRevocationRepository
+
+
+def _timestamp(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class TokenRevocations:
+    """
+    In-memory copy of `user_token_revocations`: user id -> time before which its role-carrying tokens are revoked.
+    Only revocations younger than the token lifetime are kept, so it stays as small as the recent role changes.
+    `revoke` applies to this process at once, `refresh` brings in the ones made by the other processes.
+    """
+
+    def __init__(self, token_lifetime: timedelta):
+        self.token_lifetime = token_lifetime
+        self._revoked_at: Dict[int, float] = {}
+
+    def is_revoked(self, user_id: int, issued_at: Optional[float]) -> bool:
+        revoked_at = self._revoked_at.get(user_id)
+        return revoked_at is not None and (issued_at is None or issued_at <= revoked_at)
+
+    async def _store(self, db: AsyncSession, user_ids: List[int]) -> None:
+        revoked_at = datetime.utcnow()
+        await TokenRevocationRepository(db=db).revoke(user_ids=user_ids, revoked_at=revoked_at)
+        for user_id in user_ids:
+            self._revoked_at[user_id] = _timestamp(revoked_at)
+
+    async def revoke(self, db: AsyncSession, user_ids: List[int]) -> None:
+        """Stores the revocation in the current transaction, the caller commits and then calls `restamp`."""
+        await self._store(db=db, user_ids=user_ids)
+
+    async def restamp(self, db: AsyncSession, user_ids: List[int]) -> None:
+        """
+        Moves the revocation past the commit of the role change and commits it. A login that read the user row
+        before that commit signs the old roles with an `iat` taken before the read, so its token is revoked too.
+        """
+        await self._store(db=db, user_ids=user_ids)
+        await db.commit()
+
+    async def refresh(self, db: AsyncSession) -> int:
+        repository = TokenRevocationRepository(db=db)
+        expired_before = datetime.utcnow() - self.token_lifetime
+        await repository.delete_before(before=expired_before)
+        rows = await repository.get_since(since=expired_before)
+        await db.commit()
+
+        revoked_at = {row.user_id: _timestamp(row.revoked_at) for row in rows}
+        # Local revocations committed after the select above must survive the swap.
+        for user_id, timestamp in self._revoked_at.items():
+            if timestamp > _timestamp(expired_before) and timestamp > revoked_at.get(user_id, 0):
+                revoked_at[user_id] = timestamp
+        self._revoked_at = revoked_at
+        return len(self._revoked_at)
+
+    def __len__(self) -> int:
+        return len(self._revoked_at)
+
+
+token_revocations = TokenRevocations(token_lifetime=timedelta(days=int(os.environ.get("ACCESS_TOKEN_EXPIRE_DAYS", 5))))
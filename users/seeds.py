@@ -2,10 +2,10 @@ import random
 from random import choice
 
 from faker import Faker
-from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from users.models import User, SexTypes, SocialGroup, UserRoles, Department
+from users.passwords import hash_password
 from users.repository.departments_repository import IDepartmentRepository, DepartmentRepository
 from users.repository.social_groups_repository import SocialGroupRepository, ISocialGroupRepository
 
@@ -57,7 +57,7 @@ class UserSeeder:
         user.phone = self.faker.phone_number()
         user.sex = choice(list(SexTypes))
         user.position = self.faker.word()
-        user.password = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(self.faker.word() * 2)
+        user.password = await hash_password(self.faker.word() * 2)
         user.activate_token = None
         user.is_active = True
         user.social_group = social_group
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+import time
+from typing import List, AsyncIterator, Optional, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from common.service import BaseService
+from common.storage import StorageBackend, StoredFile, get_storage_backend
+from common.types import StorageGCReportType
+from grazhdane.database import async_session
+from users.repository.attachment_repository import IAttachmentRepository, AttachmentRepository
+
+logger = logging.getLogger(__name__)
+
+
+async def _next(iterator: AsyncIterator[str]) -> Optional[str]:
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+class StorageGCService(BaseService):
+    """
+    Deletes storage files no database row links to: leftovers of rolled back appeals, of deleted attachments
+    and interrupted `.part` writes. The storage listing and the stored links are both streamed in the same order
+    and merged, so memory does not grow with the number of files.
+    """
+    BATCH_SIZE = int(os.environ.get("STORAGE_GC_BATCH_SIZE", 100))
+    BATCH_PAUSE = float(os.environ.get("STORAGE_GC_BATCH_PAUSE", 0.5))
+    # Files younger than this may belong to a request that has not committed its attachment yet.
+    MIN_AGE = int(os.environ.get("STORAGE_GC_MIN_AGE_SECONDS", 3600))
+
+    attachment_repos: IAttachmentRepository
+    backend: StorageBackend
+
+    def __init__(self, db: AsyncSession, backend: StorageBackend = None,
+                 session_factory: Callable[[], AsyncSession] = async_session):
+        super().__init__(db)
+        self.attachment_repos = AttachmentRepository(db=self.db)
+        self.backend = backend or get_storage_backend()
+        self.session_factory = session_factory
+
+    async def _delete(self, batch: List[StoredFile], report: StorageGCReportType):
+        """
+        The links were read in one snapshot, a file may have been linked since, so the batch is checked again.
+        A reused content addressed blob keeps its old mtime, so the check runs under the locks uploads take
+        (`AttachmentRepository.lock_links`) and waits for rows not committed yet. Every batch has its own
+        short transaction: the links cursor stays open and the locks are not held for the whole run.
+        """
+        async with self.session_factory() as db:
+            attachment_repos = AttachmentRepository(db=db)
+            links = [self.backend.url(stored_file.name) for stored_file in batch]
+            if not report.dry_run:
+                await attachment_repos.lock_links(links)
+            stored_links = await attachment_repos.get_stored_links(links)
+            for stored_file, link in zip(batch, links):
+                if link in stored_links:
+                    continue
+                if not report.dry_run:
+                    await self.backend.delete(stored_file.name)
+                report.deleted += 1
+                report.reclaimed_bytes += stored_file.size
+            await db.commit()
+
+    async def collect(self, dry_run: bool = False) -> StorageGCReportType:
+        report = StorageGCReportType(dry_run=dry_run)
+        created_before = time.time() - self.MIN_AGE
+        prefix = self.backend.url("")
+        links = self.attachment_repos.stream_stored_links(prefix=prefix)
+        link = await _next(links)
+        batch = []
+
+        try:
+            async for stored_file in self.backend.iterate():
+                report.scanned += 1
+                current_link = self.backend.url(stored_file.name)
+                while link is not None and link < current_link:
+                    link = await _next(links)
+                if link == current_link:
+                    report.referenced += 1
+                    continue
+                if stored_file.modified_at > created_before:
+                    continue
+
+                batch.append(stored_file)
+                if len(batch) >= self.BATCH_SIZE:
+                    await self._delete(batch, report)
+                    batch = []
+                    await asyncio.sleep(self.BATCH_PAUSE)
+        finally:
+            await links.aclose()
+
+        if batch:
+            await self._delete(batch, report)
+
+        logger.info("Storage GC: %s", report)
+        return report
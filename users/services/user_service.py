@@ -2,6 +2,7 @@ from abc import ABC, abstractmethod
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from appeals.models import AppealStatuses
 from appeals.repository.appeal_user_repository import IAppealUserRepository, AppealUserRepository
 from appeals.repository.user_appeal_repository import UserAppealRepository, IUserAppealRepository
 from common.service import BaseService
@@ -11,7 +12,7 @@ from users.repository.departments_repository import IDepartmentRepository, Depar
 
 class IUserService(BaseService, ABC):
     @abstractmethod
-    async def connect_to_all_appeals(self, creator_id: int, user: User):
+    async def connect_to_all_appeals(self, creator_id: int, user: User) -> int:
         raise NotImplementedError
 
 
@@ -26,10 +27,9 @@ class UserService(IUserService):
         self.appeal_users_repos = AppealUserRepository(db=self.db)
         self.department_repos = DepartmentRepository(db=self.db)
 
-    async def connect_to_all_appeals(self, creator_id: int, user: User):
-        user_appeals_ids = await self.appeal_users_repos.get_user_appeals_ids(user_id=user.id)
-        appeals_ids = await self.user_appeal_repos.get_all_ids_for_connect_employee(
-            exclude_appeals_ids=user_appeals_ids)
-        await self.appeal_users_repos.connect_user_to_appeals(creator_id=creator_id,
-                                                              user_id=user.id,
-                                                              exists_appeals_ids=appeals_ids)
+    async def connect_to_all_appeals(self, creator_id: int, user: User) -> int:
+        return await self.appeal_users_repos.connect_user_to_all_appeals(
+            creator_id=creator_id,
+            user_id=user.id,
+            statuses=[AppealStatuses.MODERATION, AppealStatuses.CONSIDERATION],
+        )
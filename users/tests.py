@@ -1,25 +1,42 @@
+import asyncio
+import io
 import os
+import time
+import uuid
+from datetime import timedelta
 
 import pytest
+from fastapi import HTTPException
 from faker import Faker
+from fastapi.security import HTTPAuthorizationCredentials
 from httpx import AsyncClient, Response
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from appeals.models import AppealStatus, AppealStatuses
-from appeals.repository.appeal_user_repository import AppealUserRepository
-from appeals.repository.user_appeal_repository import UserAppealRepository
+from appeals.models import AppealStatus, AppealStatuses, AppealUser, UserAppeal
 from appeals.seeds import UserAppealSeeder
+from appeals.services.user_appeal_service import UserAppealService
 from conftest import authorize_client
+from common.service import ContentAddressedStorage
+from common.storage import LocalStorageBackend
 from grazhdane import config
-from users.models import UserRoles, User
+from grazhdane.database import async_session
+from users.cache import authenticated_user_cache, verified_token_cache
+from users.dependencies import get_authenticated_user, get_token_claims, HTTPHeaderAuthentication
+from users.models import UserRoles, User, Attachment
+from users.passwords import hash_password, verify_password
 from users.repository.departments_repository import DepartmentRepository
 from users.repository.employee_repository import EmployeeRepository
 from users.repository.user_repository import UserRepository
+from users.revocations import token_revocations
 from users.seeds import UserSeeder, DepartmentSeeder, SocialGroupSeeder
+from users.services.storage_gc_service import StorageGCService
+from users.services.user_service import UserService
 from users.usecases import (
     CityHeadSetupUC, CityHeadSetupData, AddControlUserUC, AddControlUserData,
-    AddEmployeeUserData, AddEmployeeUserUC, UpdateAdminUserData, UpdateAdminUserUC, ActivateUserUC,
+    AddEmployeeUserData, AddEmployeeUserUC, UpdateAdminUserData, UpdateAdminUserUC, ActivateUserUC, AuthUseCase,
 )
+from users.types import JwtData
 
 pytestmark = pytest.mark.asyncio
 
@@ -146,15 +163,18 @@ async def test_update_admin_user(db: AsyncSession):
     )
 
     await UpdateAdminUserUC(auth_user_id=auth_user.id, data=data, db=db).exec()
-    user_appeal_repository = UserAppealRepository(db=db)
-    appeal_user_repository = AppealUserRepository(db=db)
     updated_new_user = await UserRepository(db=db).get_by_id(pk=new_user.id)
 
     assert updated_new_user.roles == [UserRoles.ADMIN_ROLE, UserRoles.EMPLOYEE_ROLE]
 
-    all_appeal_ids = await user_appeal_repository.get_all_ids_for_connect_employee(exclude_appeals_ids=[])
-    user_appeals_ids = await appeal_user_repository.get_user_appeals_ids(user_id=new_user.id)
-    assert len(all_appeal_ids) == len(user_appeals_ids)
+    open_appeals = await db.scalar(
+        select(func.count(UserAppeal.id))
+        .join(UserAppeal.status)
+        .where(AppealStatus.status_const.in_([AppealStatuses.MODERATION, AppealStatuses.CONSIDERATION])))
+    connected_appeals = await db.scalar(
+        select(func.count(AppealUser.id)).where(AppealUser.employee_id == new_user.id))
+    assert connected_appeals == open_appeals
+    assert await UserService(db=db).connect_to_all_appeals(creator_id=auth_user.id, user=updated_new_user) == 0
 
     updated_user = await UserRepository(db=db).get_by_id(pk=new_user.id)
     assert data.first_name == updated_user.first_name
@@ -196,3 +216,185 @@ async def test_user_activation(db: AsyncSession):
     await ActivateUserUC(db=db, user_id=user.id, is_activated=True).exec()
     db_user = await UserRepository(db).get_by_id(pk=user.id)
     assert db_user.is_active
+
+
+async def test_storage_gc(db: AsyncSession, tmp_path):
+    backend = LocalStorageBackend(root=str(tmp_path), base_url=f"/gc-{uuid.uuid4().hex}/")
+    old = time.time() - 2 * StorageGCService.MIN_AGE
+    files = {
+        "appeals/kept.pdf": b"kept",
+        "appeals/orphan.pdf": b"orphan",
+        "appeals/fresh.pdf": b"fresh",
+        "appeals/stale.pdf.1234.part": b"part",
+        "avatars/avatar.png": b"avatar",
+        "cas/ab/ab12.png": b"blob",
+        "cas/ab/ab12_thumbnail.jpg": b"thumb",
+    }
+    for name, content in files.items():
+        await backend.save(name, content)
+        if name != "appeals/fresh.pdf":
+            os.utime(backend.local_path(name), (old, old))
+
+    user = await UserSeeder(db=db).seed()
+    user.avatar = backend.url("avatars/avatar.png")
+    db.add(user)
+    db.add_all([
+        Attachment(link=backend.url("appeals/kept.pdf"), creator=user),
+        Attachment(link=backend.url("cas/ab/ab12.png"), thumbnail_link=backend.url("cas/ab/ab12_thumbnail.jpg"),
+                   creator=user),
+    ])
+    await db.commit()
+
+    service = StorageGCService(db=db, backend=backend)
+    service.BATCH_SIZE = 1
+    service.BATCH_PAUSE = 0
+    report = await service.collect(dry_run=True)
+    assert report.scanned == len(files)
+    assert report.referenced == 4
+    assert report.deleted == 2
+    assert all(await backend.exists(name) for name in files)
+
+    report = await service.collect()
+    assert report.deleted == 2
+    assert report.reclaimed_bytes == len(b"orphan") + len(b"part")
+    assert not await backend.exists("appeals/orphan.pdf")
+    assert not await backend.exists("appeals/stale.pdf.1234.part")
+    assert all(await backend.exists(name) for name in files
+               if name not in ("appeals/orphan.pdf", "appeals/stale.pdf.1234.part"))
+
+
+async def test_storage_gc_waits_for_blob_reuse(db: AsyncSession, tmp_path):
+    backend = LocalStorageBackend(root=str(tmp_path), base_url=f"/gc-{uuid.uuid4().hex}/")
+    content = uuid.uuid4().bytes
+    orphan = ContentAddressedStorage(file=io.BytesIO(content), filename="orphan.pdf", backend=backend)
+    link = await orphan.store()
+    old = time.time() - 2 * StorageGCService.MIN_AGE
+    os.utime(backend.local_path(orphan.name), (old, old))
+    user = await UserSeeder(db=db).seed()
+    db.add(user)
+    await db.commit()
+
+    async with async_session() as uploading:
+        storage = ContentAddressedStorage(file=io.BytesIO(content), filename="upload.pdf", backend=backend)
+        assert await UserAppealService(db=uploading)._store_files([storage]) == [link]
+
+        service = StorageGCService(db=db, backend=backend)
+        service.BATCH_PAUSE = 0
+        collect = asyncio.create_task(service.collect())
+        await asyncio.sleep(0.5)
+        assert not collect.done()
+
+        uploading.add(Attachment(link=link, checksum=storage.checksum, creator_id=user.id))
+        await uploading.commit()
+        report = await collect
+    assert report.scanned == 1
+    assert report.deleted == 0
+    assert await backend.exists(orphan.name)
+
+
+async def test_authenticated_user_cache(db: AsyncSession):
+    user = await UserSeeder(db=db).seed()
+    db.add(user)
+    await db.commit()
+    claims = JwtData(user_id=user.id)
+    # The counters outlive `clear`, earlier tests count too.
+    hits, misses = authenticated_user_cache.stats()["hits"], authenticated_user_cache.stats()["misses"]
+
+    async with async_session() as session:
+        assert (await get_authenticated_user(claims=claims, db=session)).id == user.id
+    stats = authenticated_user_cache.stats()
+    assert stats["misses"] == misses + 1 and stats["hits"] == hits
+
+    async with async_session() as session:
+        cached_user = await get_authenticated_user(claims=claims, db=session)
+        assert cached_user.email == user.email
+        assert cached_user.roles == user.roles
+        assert cached_user in session
+    assert authenticated_user_cache.stats()["hits"] == hits + 1
+
+    await ActivateUserUC(db=db, user_id=user.id, is_activated=False).exec()
+    async with async_session() as session:
+        assert not (await get_authenticated_user(claims=claims, db=session)).is_active
+    assert authenticated_user_cache.stats()["misses"] == misses + 2
+
+
+async def test_password_hashing():
+    hashed_password = await hash_password("secret-password")
+    assert hashed_password != "secret-password"
+    assert await verify_password("secret-password", hashed_password)
+    assert not await verify_password("other-password", hashed_password)
+    assert not await verify_password("secret-password", None)
+
+
+async def test_role_claims_token_revocation(db: AsyncSession):
+    user = await UserSeeder(db=db).seed_admin()
+    db.add(user)
+    await db.commit()
+    auth = AuthUseCase(db=db)
+    credentials = HTTPAuthorizationCredentials(
+        scheme="Bearer", credentials=auth.create_access_token(data=JwtData(user_id=user.id), user=user))
+
+    claims = await get_token_claims(credentials=credentials)
+    assert UserRoles.ADMIN_ROLE in claims["roles"] and claims["is_active"]
+    # Role checks are answered from the claims, no session is needed.
+    assert await HTTPHeaderAuthentication(scopes=[UserRoles.ADMIN_ROLE], load_user=False)(claims=claims, db=None)
+    with pytest.raises(HTTPException):
+        await HTTPHeaderAuthentication(scopes=[UserRoles.CONTROL_ROLE], load_user=False)(claims=claims, db=None)
+
+    await ActivateUserUC(db=db, user_id=user.id, is_activated=False).exec()
+    with pytest.raises(HTTPException) as e:
+        await get_token_claims(credentials=credentials)
+    assert e.value.status_code == 401
+
+    async with async_session() as session:
+        await token_revocations.refresh(db=session)
+    assert token_revocations.is_revoked(user.id, claims["iat"])
+
+    fresh_credentials = HTTPAuthorizationCredentials(
+        scheme="Bearer", credentials=auth.create_access_token(data=JwtData(user_id=user.id), user=user))
+    fresh_claims = await get_token_claims(credentials=fresh_credentials)
+    assert fresh_claims["is_active"] is False
+    with pytest.raises(HTTPException):
+        await HTTPHeaderAuthentication(scopes=[UserRoles.ADMIN_ROLE], load_user=False)(claims=fresh_claims, db=None)
+
+
+async def test_login_overlapping_role_change_is_revoked(db: AsyncSession):
+    user = await UserSeeder(db=db).seed_admin()
+    db.add(user)
+    await db.commit()
+
+    async with async_session() as logging_in:
+        # A login reads the user row, the role change commits while the password is being checked.
+        issued_at = time.time()
+        stale_user = await UserRepository(db=logging_in).get_by_id(pk=user.id)
+        async with async_session() as session:
+            await ActivateUserUC(db=session, user_id=user.id, is_activated=False).exec()
+        token = AuthUseCase(db=logging_in).create_access_token(data=JwtData(user_id=user.id), user=stale_user,
+                                                               issued_at=issued_at)
+
+    assert stale_user.is_active
+    with pytest.raises(HTTPException) as e:
+        await get_token_claims(credentials=HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+    assert e.value.status_code == 401
+
+
+async def test_verified_token_cache():
+    auth = AuthUseCase(db=None)
+    token = auth.create_access_token(data=JwtData(user_id=1))
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    hits = verified_token_cache.stats()["hits"]
+
+    claims = await get_token_claims(credentials=credentials)
+    claims["user_id"] = 2
+    assert (await get_token_claims(credentials=credentials))["user_id"] == 1
+    assert verified_token_cache.stats()["hits"] == hits + 1
+
+    role_credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=auth.create_access_token(
+        data=JwtData(user_id=1), user=User(roles=[UserRoles.SIMPLE_USER_ROLE], is_active=True)))
+    (await get_token_claims(credentials=role_credentials))["roles"].append(UserRoles.ADMIN_ROLE)
+    assert (await get_token_claims(credentials=role_credentials))["roles"] == [UserRoles.SIMPLE_USER_ROLE]
+
+    expired = auth.create_access_token(data=JwtData(user_id=1), expires_delta=timedelta(seconds=-1))
+    with pytest.raises(HTTPException):
+        await get_token_claims(credentials=HTTPAuthorizationCredentials(scheme="Bearer", credentials=expired))
+    assert len(verified_token_cache) == 2
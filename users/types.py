@@ -1,7 +1,11 @@
 from datetime import datetime
-from typing import TypedDict
+from typing import TypedDict, List
 
 
 class JwtData(TypedDict, total=False):
     user_id: int
     expire: datetime
+    iat: float
+    # Present in tokens with role claims only.
+    roles: List[str]
+    is_active: bool
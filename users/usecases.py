@@ -1,23 +1,25 @@
 import os
+import time
 import uuid
 from datetime import timedelta, datetime
 from typing import Optional, Tuple, List
 
-import aiofiles
 from fastapi import HTTPException
 from jose import jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel, constr, EmailStr, validator
 from slugify import slugify
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from appeals.repository.appeal_user_repository import IAppealUserRepository, AppealUserRepository
+from common.storage import StorageBackend, get_storage_backend
 from common.usecases import BaseUseCase
-from grazhdane import config
+from users.cache import authenticated_user_cache
 from users.models import User, SexTypes, UserRoles, Department, Employee
+from users.passwords import hash_password, verify_password
 from users.repository.departments_repository import IDepartmentRepository, DepartmentRepository
 from users.repository.social_groups_repository import SocialGroupRepository
 from users.repository.user_repository import IUserRepository, UserRepository
+from users.revocations import token_revocations
 from users.services.user_service import UserService, IUserService
 from users.types import JwtData
 
@@ -46,43 +48,43 @@ class LoginData(BaseModel):
 
 
 class AuthUseCase(BaseUseCase):
+    ROLE_CLAIMS = os.environ.get("JWT_ROLE_CLAIMS", "true").lower() in ("1", "true")
 
     repository: IUserRepository
-    __pwd_context: CryptContext = None
 
     def __init__(self, db: AsyncSession):
         super().__init__(db)
         self.repository = UserRepository(db=self.db)
 
-    @property
-    def pwd_context(self):
-        if self.__pwd_context:
-            return self.__pwd_context
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        return await verify_password(plain_password, hashed_password)
 
-        self.__pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-        return self.__pwd_context
-
-    def verify_password(self, plain_password, hashed_password):
-        return self.pwd_context.verify(plain_password, hashed_password)
-
-    def get_password_hash(self, password):
-        return self.pwd_context.hash(password)
+    async def get_password_hash(self, password: str) -> str:
+        return await hash_password(password)
 
     async def authenticate_user(self, email: str, password: str):
         user = await self.repository.get_by_email(email=email)
         if not user:
             return False
-        if not self.verify_password(password, user.password):
+        if not await self.verify_password(password, user.password):
             return False
         return user
 
-    def create_access_token(self, data: JwtData, expires_delta: Optional[timedelta] = None) -> str:
+    def create_access_token(self, data: JwtData, expires_delta: Optional[timedelta] = None,
+                            user: Optional[User] = None, issued_at: Optional[float] = None) -> str:
+        """
+        With `user` the token also carries its roles and `is_active`, role checks then need no user row.
+        `issued_at` must not be later than the read of `user`, otherwise a role change committed in between
+        is not revoked by the token's `iat`.
+        """
         to_encode = data.copy()
         if expires_delta:
             expire = datetime.utcnow() + expires_delta
         else:
             expire = datetime.utcnow() + timedelta(minutes=15)
-        to_encode.update({"exp": expire})
+        to_encode.update({"exp": expire, "iat": issued_at or time.time()})
+        if user is not None:
+            to_encode.update({"roles": list(user.roles or []), "is_active": bool(user.is_active)})
         encoded_jwt = jwt.encode(to_encode, os.environ.get("SECRET_KEY"), algorithm=os.environ.get("ALGORITHM"))
         return encoded_jwt
 
@@ -102,7 +104,7 @@ class AuthUseCase(BaseUseCase):
         user.email = data.email
         user.phone = data.phone
         user.sex = data.sex
-        user.password = self.get_password_hash(data.password)
+        user.password = await self.get_password_hash(data.password)
         user.social_group = social_group
 
         self.db.add(user)
@@ -110,16 +112,21 @@ class AuthUseCase(BaseUseCase):
 
         return user, self.create_access_token(data=JwtData(user_id=user.id),
                                               expires_delta=timedelta(
-                                                  days=int(os.environ.get("ACCESS_TOKEN_EXPIRE_DAYS"))))
+                                                  days=int(os.environ.get("ACCESS_TOKEN_EXPIRE_DAYS"))),
+                                              user=user if self.ROLE_CLAIMS else None)
 
     async def login(self, data: LoginData) -> Tuple[User, str]:
+        # Taken before the user row is read, not after the slow password check.
+        issued_at = time.time()
         user = await self.authenticate_user(email=data.email, password=data.password)
         if not user:
             raise HTTPException(status_code=401, detail="Invalid user data")
 
         return user, self.create_access_token(data=JwtData(user_id=user.id),
                                               expires_delta=timedelta(
-                                                  days=int(os.environ.get("ACCESS_TOKEN_EXPIRE_DAYS"))))
+                                                  days=int(os.environ.get("ACCESS_TOKEN_EXPIRE_DAYS"))),
+                                              user=user if self.ROLE_CLAIMS else None,
+                                              issued_at=issued_at)
 
 
 class CityHeadSetupData(BaseModel):
@@ -142,8 +149,11 @@ class CityHeadSetupUC(BaseUseCase):
             u.remove_role(UserRoles.CITY_HEAD_ROLE)
         user.assign_role(UserRoles.CITY_HEAD_ROLE)
         user.position = self.data.position
+        await token_revocations.revoke(db=self.db, user_ids=[user.id, *(u.id for u in old_users)])
 
         await self.db.commit()
+        authenticated_user_cache.invalidate(user.id, *(u.id for u in old_users))
+        await token_revocations.restamp(db=self.db, user_ids=[user.id, *(u.id for u in old_users)])
 
         return user
 
@@ -165,7 +175,10 @@ class AddControlUserUC(BaseUseCase):
         user = await self.repository.get_by_email(self.data.email, raise_exception=True)
         user.assign_role(role=UserRoles.CONTROL_ROLE)
         user.position = self.data.position
+        await token_revocations.revoke(db=self.db, user_ids=[user.id])
         await self.db.commit()
+        authenticated_user_cache.invalidate(user.id)
+        await token_revocations.restamp(db=self.db, user_ids=[user.id])
 
         return user
 
@@ -208,8 +221,11 @@ class AddEmployeeUserUC(BaseUseCase):
         else:
             user.assign_role(UserRoles.EMPLOYEE_ROLE)
             self._create_employee(user=user, department=department)
+        await token_revocations.revoke(db=self.db, user_ids=[user.id])
 
         await self.db.commit()
+        authenticated_user_cache.invalidate(user.id)
+        await token_revocations.restamp(db=self.db, user_ids=[user.id])
 
         return user
 
@@ -280,8 +296,11 @@ class UpdateAdminUserUC(BaseUseCase):
         await self._setup_roles()
         await self._setup_appeal_connections()
         await self._update_user_data()
+        await token_revocations.revoke(db=self.db, user_ids=[self.data.user_id])
 
         await self.db.commit()
+        authenticated_user_cache.invalidate(self.data.user_id)
+        await token_revocations.restamp(db=self.db, user_ids=[self.data.user_id])
         return await self.get_user()
 
 
@@ -292,10 +311,12 @@ class UpdateUserAvatarData(BaseModel):
 
 class UpdateUserAvatarUC(BaseUseCase):
     repository: IUserRepository
+    storage_backend: StorageBackend
 
     def __init__(self, db: AsyncSession, user: User, data: UpdateUserAvatarData):
         super().__init__(db)
         self.repository = UserRepository(db=self.db)
+        self.storage_backend = get_storage_backend()
         self.data = data
         self.user = user
 
@@ -303,15 +324,15 @@ class UpdateUserAvatarUC(BaseUseCase):
         splited_filename = self.data.filename.split(".")
         ext = splited_filename[-1]
         new_filename = slugify(f"{str(uuid.uuid4())}_{self.data.filename.replace(ext, '')}") + f".{ext}"
-        avatar_pub_path = os.path.join("storage", "avatars", new_filename)
-        async with aiofiles.open(os.path.join(config.MEDIA_ROOT, avatar_pub_path), mode='wb') as f:
-            await f.write(self.data.file)
+        avatar_name = os.path.join("avatars", new_filename)
+        await self.storage_backend.save(avatar_name, self.data.file)
 
-        return os.path.join(config.MEDIA_URL, avatar_pub_path)
+        return self.storage_backend.url(avatar_name)
 
     async def exec(self) -> User:
         self.user.avatar = await self.store_avatar()
         await self.db.commit()
+        authenticated_user_cache.invalidate(self.user.id)
         return self.user
 
 
@@ -328,6 +349,9 @@ class ActivateUserUC(BaseUseCase):
     async def exec(self) -> User:
         user = await self.user_repos.get_by_id(pk=self.user_id, raise_exception=True)
         user.is_active = self.is_activated
+        await token_revocations.revoke(db=self.db, user_ids=[user.id])
         await self.db.commit()
+        authenticated_user_cache.invalidate(user.id)
+        await token_revocations.restamp(db=self.db, user_ids=[user.id])
 
         return user